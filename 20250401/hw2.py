@@ -1,23 +1,58 @@
 import requests
-import html
 import pandas as pd
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
-def get_stop_info(stop_link: str) -> dict:
+from cycu11022119.endpoints import PDA5284_BASE_URL
+from cycu11022119.pda5284_route_parser import parse_route_stops
+
+# Stop pages fetched at the same time for one route
+MAX_WORKERS = 8
+REQUEST_TIMEOUT = 10
+
+_session = None
+
+
+def get_session() -> requests.Session:
+    """
+    Return the shared keep-alive session, so every request to pda5284 reuses a pooled
+    connection instead of opening a new TCP/TLS connection.
+
+    Returns:
+        requests.Session: Session whose pool holds up to MAX_WORKERS connections per host.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_WORKERS)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def get_stop_info(stop_link: str, session: requests.Session = None) -> dict:
     """
     Retrieve real-time information for a specific bus stop.
 
     Args:
         stop_link (str): The relative URL of the bus stop.
+        session (requests.Session): Session to send the request with. Defaults to get_session().
 
     Returns:
-        dict: A dictionary containing real-time information for the bus stop.
+        dict: A dictionary containing real-time information for the bus stop. If the
+            request fails (timeout, connection error), real_time_info is empty, so one
+            bad stop does not abort the whole route.
     """
-    url = f'https://pda5284.gov.taipei/MQS/{stop_link}'
+    url = f'{PDA5284_BASE_URL}/MQS/{stop_link}'
     stop_id = stop_link.split("=")[1]  # Extract stop ID from the link
 
     # Send GET request
-    response = requests.get(url)
+    try:
+        response = (session or get_session()).get(url, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"無法下載站點 {stop_id}: {e}")
+        return {"stop_id": stop_id, "real_time_info": []}
     if response.status_code == 200:
         # Parse the HTML content
         soup = BeautifulSoup(response.text, "html.parser")
@@ -39,56 +74,62 @@ def get_stop_info(stop_link: str) -> dict:
         return {"stop_id": stop_id, "real_time_info": []}
 
 
-def get_bus_route(rid: str):
+def get_stop_infos(stop_links: list, max_workers: int = MAX_WORKERS) -> list:
+    """
+    Retrieve the real-time information of many stops with a bounded thread pool.
+
+    Each distinct stop page is requested once, and the results are returned in the
+    order of `stop_links`.
+
+    Args:
+        stop_links (list): Relative URLs of the bus stops.
+        max_workers (int): Maximum number of requests in flight.
+
+    Returns:
+        list: One get_stop_info() dictionary per entry of `stop_links`.
+    """
+    unique_links = list(dict.fromkeys(stop_links))
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        infos = dict(zip(unique_links,
+                         executor.map(lambda link: get_stop_info(link, session), unique_links)))
+    return [infos[link] for link in stop_links]
+
+
+def get_bus_route(rid: str, max_workers: int = MAX_WORKERS):
     """
     Retrieve two DataFrames containing bus stop names and their corresponding URLs based on the route ID (rid).
 
+    The stop pages of the route are fetched concurrently (see get_stop_infos) and
+    reported in stop order.
+
     Args:
         rid (str): Bus route ID.
+        max_workers (int): Maximum number of stop pages fetched at the same time.
 
     Returns:
         tuple: Two Pandas DataFrames, each corresponding to one direction of the bus route.
     """
-    url = f'https://pda5284.gov.taipei/MQS/route.jsp?rid={rid}'
+    url = f'{PDA5284_BASE_URL}/MQS/route.jsp?rid={rid}'
 
     # Send GET request
-    response = requests.get(url)
+    response = get_session().get(url, timeout=REQUEST_TIMEOUT)
     if response.status_code == 200:
-        # Parse HTML using BeautifulSoup
-        soup = BeautifulSoup(response.text, "html.parser")
+        # Classify the ttego (go) and tteback (back) rows in one pass; the tables are
+        # nested, so searching every table for rows would return the same stops twice
+        go_stops, back_stops = parse_route_stops(response.text)
 
-        # Find all tables
-        tables = soup.find_all("table")
-
-        # Initialize DataFrame list
-        dataframes = []
-
-        # Iterate through tables
-        for table in tables:
-            rows = []
-            # Find all tr tags with the specified classes
-            for tr in table.find_all("tr", class_=["ttego1", "ttego2"]):
-                # Extract stop name and link
-                td = tr.find("td")
-                if td:
-                    stop_name = html.unescape(td.text.strip())  # Decode stop name
-                    stop_link = td.find("a")["href"] if td.find("a") else None
-
-                    if stop_link:
-                        # Call get_stop_info function to get stop information
-                        stop_info = get_stop_info(stop_link)
-                        print(f"站點: {stop_name}, 即時資訊: {stop_info['real_time_info']}")
-
-                    # Append to rows
-                    rows.append({"stop_name": stop_name, "stop_link": stop_link})
-            # If data exists, convert to DataFrame
-            if rows:
-                df = pd.DataFrame(rows)
-                dataframes.append(df)
+        # Fetch the real-time information of every stop at once, then report in stop order
+        stops = [stop for stop in go_stops + back_stops if stop.stop_link]
+        stop_infos = get_stop_infos([stop.stop_link for stop in stops], max_workers)
+        for stop, stop_info in zip(stops, stop_infos):
+            print(f"站點: {stop.stop_name}, 即時資訊: {stop_info['real_time_info']}")
 
         # Return two DataFrames
-        if len(dataframes) >= 2:
-            return dataframes[0], dataframes[1]
+        if go_stops and back_stops:
+            return tuple(pd.DataFrame([(stop.stop_name, stop.stop_link) for stop in direction_stops],
+                                      columns=["stop_name", "stop_link"])
+                         for direction_stops in (go_stops, back_stops))
         else:
             raise ValueError("Insufficient table data found.")
     else:
@@ -102,10 +143,10 @@ def get_all_routes():
     Returns:
         None
     """
-    url = 'https://pda5284.gov.taipei/MQS/routelist.jsp'
+    url = f'{PDA5284_BASE_URL}/MQS/routelist.jsp'
 
     # Send GET request
-    response = requests.get(url)
+    response = get_session().get(url, timeout=REQUEST_TIMEOUT)
     if response.status_code == 200:
         # Parse HTML using BeautifulSoup
         soup = BeautifulSoup(response.text, "html.parser")
@@ -130,7 +171,7 @@ def get_all_routes():
                     # Append data to the list
                     all_routes_data.append(df1)
                     all_routes_data.append(df2)
-                except ValueError as e:
+                except (ValueError, requests.RequestException) as e:
                     print(f"Error processing route {route_name}: {e}")
 
         # Combine all data and save to CSV
@@ -1,130 +1,201 @@
 import requests
-import html
 import pandas as pd
-from bs4 import BeautifulSoup
 from playwright.sync_api import sync_playwright
 import os
-import time
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+from cycu11022119.endpoints import PDA5284_BASE_URL
+from cycu11022119.pda5284_route_parser import parse_route_stops
+from cycu11022119.rate_limit import token_bucket
+from cycu11022119.snapshot_archive import snapshot_archive
 
 # 全域設定
 DATA_DIR = "bus_data"
+# 快照模式：
+#   'http'    以共用連線池的 requests 抓 stop.jsp 原始 HTML（站牌結構是靜態的，
+#             到站時間由頁面 JS 另外以 StopLocationDyna 載入，不在原始 HTML 內）
+#   'browser' 用同一個 Chromium context 依序渲染每個站點頁面
+SNAPSHOT_MODES = ('http', 'browser')
+REQUESTS_PER_SECOND = 5.0  # 對 pda5284 的禮貌速率上限，取代固定的 time.sleep(1)
+MAX_WORKERS = 4
+REQUEST_TIMEOUT = 10
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Encoding': 'gzip, deflate'
+}
+# 每次存檔的頁面也壓縮去重後留存歷史，檔案本身每次執行都會被覆寫
+ARCHIVE_PATH = os.path.join(DATA_DIR, "snapshot_archive.sqlite3")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def get_stop_info(stop_link: str) -> dict:
+_session = None
+_archive = None
+
+
+def get_session() -> requests.Session:
+    """
+    取得共用的 keep-alive session，所有請求重複使用連線池中的連線。
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_WORKERS)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def get_archive() -> snapshot_archive:
+    """
+    取得共用的頁面快照封存（可跨執行緒共用）。
+    """
+    global _archive
+    if _archive is None:
+        _archive = snapshot_archive(ARCHIVE_PATH)
+    return _archive
+
+
+def save_stop_html(stop_id: str, content: str) -> str:
+    filename = os.path.join(DATA_DIR, f"bus_stop_{stop_id}.html")
+    with open(filename, "w", encoding="utf-8") as file:
+        file.write(content)
+    get_archive().put('stop', stop_id, content)
+    return filename
+
+
+def get_stop_info(stop_link: str, mode: str = 'http', page=None, limiter: token_bucket = None) -> dict:
     """
     抓取指定站點的 HTML 並儲存為本地檔案。
 
     Args:
         stop_link (str): 站點的相對 URL。
+        mode (str): 'http' 或 'browser'，見 SNAPSHOT_MODES。
+        page (playwright.sync_api.Page): browser 模式下重複使用的頁面；未提供時會
+            為這一個站點啟動一個 Chromium。
+        limiter (token_bucket): 共用的速率限制器；未提供時不限速。
 
     Returns:
         dict: 包含站點 ID 和 HTML 檔案名稱的字典。
     """
+    if mode not in SNAPSHOT_MODES:
+        raise ValueError(f"mode 必須是 {SNAPSHOT_MODES} 之一")
+
     stop_id = stop_link.split("=")[-1]  # 修正參數解析
-    url = f'https://pda5284.gov.taipei/MQS/{stop_link}'
-    
+    url = f'{PDA5284_BASE_URL}/MQS/{stop_link}'
+
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
+        if limiter is not None:
+            limiter.acquire()
+
+        if mode == 'http':
+            response = get_session().get(url, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            content = response.text
+        elif page is not None:
             page.goto(url)
             content = page.content()
-            
-            # 儲存檔案到資料夾
-            filename = os.path.join(DATA_DIR, f"bus_stop_{stop_id}.html")
-            with open(filename, "w", encoding="utf-8") as file:
-                file.write(content)
-            browser.close()
-            
-        return {"stop_id": stop_id, "html_file": filename}
+        else:
+            with sync_playwright() as p:
+                browser = p.chromium.launch(headless=True)
+                page = browser.new_page()
+                page.goto(url)
+                content = page.content()
+                browser.close()
+
+        # 儲存檔案到資料夾
+        return {"stop_id": stop_id, "html_file": save_stop_html(stop_id, content)}
     except Exception as e:
         print(f"抓取站點失敗: {stop_id} - {str(e)}")
         return {"stop_id": stop_id, "html_file": None}
 
-def get_bus_route(rid: str):
+
+def snapshot_stops(stop_links: list, mode: str = 'http', rate: float = REQUESTS_PER_SECOND) -> list:
+    """
+    將多個站點頁面存成快照，依 stop_links 的順序回傳結果。
+
+    http 模式以最多 MAX_WORKERS 個執行緒平行抓取；browser 模式只啟動一個 Chromium、
+    一個 context，依序重複使用同一個頁面。兩種模式都由同一個 token_bucket 控制速率。
+
+    Args:
+        stop_links (list): 站點的相對 URL。
+        mode (str): 'http' 或 'browser'。
+        rate (float): 每秒最多送出的請求數；0 表示不限速。
+
+    Returns:
+        list: 每個站點一個 get_stop_info() 字典。
+    """
+    # 容量 1：請求平均間隔 1/rate 秒，不允許瞬間爆量
+    limiter = token_bucket(rate, capacity=1) if rate > 0 else None
+
+    if mode == 'http':
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            return list(executor.map(lambda link: get_stop_info(link, 'http', limiter=limiter),
+                                     stop_links))
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context()
+        page = context.new_page()
+        try:
+            return [get_stop_info(link, 'browser', page=page, limiter=limiter) for link in stop_links]
+        finally:
+            context.close()
+            browser.close()
+
+
+def stops_dataframe(stops: list) -> pd.DataFrame:
+    """
+    將 parse_route_stops() 回傳的 route_stop 串列轉成 stop_name、stop_link 兩欄的 DataFrame。
+    """
+    return pd.DataFrame([(stop.stop_name, stop.stop_link) for stop in stops],
+                        columns=["stop_name", "stop_link"])
+
+
+def get_bus_route(rid: str, mode: str = 'http', rate: float = REQUESTS_PER_SECOND):
     """
     抓取指定路線的站點資訊，並返回去程和回程的 DataFrame。
 
     Args:
         rid (str): 公車路線 ID。
+        mode (str): 站點快照模式，'http' 或 'browser'（見 SNAPSHOT_MODES）。
+        rate (float): 抓取站點頁面時每秒最多送出的請求數。
 
     Returns:
         tuple: 包含去程和回程站點資訊的兩個 DataFrame。
     """
-    url = f'https://pda5284.gov.taipei/MQS/route.jsp?rid={rid}'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        'Accept-Encoding': 'gzip, deflate'
-    }
+    url = f'{PDA5284_BASE_URL}/MQS/route.jsp?rid={rid}'
 
     try:
         # 發送 GET 請求
-        response = requests.get(url, headers=headers)
+        response = get_session().get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         
         # 儲存主檔案
         main_filename = os.path.join(DATA_DIR, f"bus_route_{rid}.html")
         with open(main_filename, "w", encoding="utf-8") as file:
             file.write(response.text)
+        get_archive().put('route', rid, response.text)
+
+        # 一次走訪所有 ttego/tteback 列，同時分出去程和回程（表格是巢狀的，逐表 find_all 會重複）
+        go_stops, back_stops = parse_route_stops(response.text)
+
+        # 確保兩個方向都有站點資料
+        if go_stops and back_stops:
+            go_dataframe = stops_dataframe(go_stops)
+            back_dataframe = stops_dataframe(back_stops)
 
-        # 使用 BeautifulSoup 解析 HTML
-        soup = BeautifulSoup(response.text, "html.parser")
-        tables = soup.find_all("table")
-
-        # 初始化 DataFrame 列表
-        dataframes = []
-
-        # 遍歷表格，提取去程和回程的站點資訊
-        for table in tables:
-            # 去程站點
-            trs = table.find_all("tr", class_=["ttego1", "ttego2"])
-            if trs:
-                rows = []
-                for tr in trs:
-                    td = tr.find("td")
-                    if td:
-                        stop_name = html.unescape(td.text.strip())
-                        stop_link = td.find("a")["href"] if td.find("a") else None
-                        rows.append({"stop_name": stop_name, "stop_link": stop_link})
-                if rows:
-                    df = pd.DataFrame(rows)
-                    dataframes.append(df)
-
-            # 回程站點
-            trs = table.find_all("tr", class_=["tteback1", "tteback2"])
-            if trs:
-                rows = []
-                for tr in trs:
-                    td = tr.find("td")
-                    if td:
-                        stop_name = html.unescape(td.text.strip())
-                        stop_link = td.find("a")["href"] if td.find("a") else None
-                        rows.append({"stop_name": stop_name, "stop_link": stop_link})
-                if rows:
-                    df = pd.DataFrame(rows)
-                    dataframes.append(df)
-
-        # 確保有足夠的表格資料
-        if len(dataframes) >= 2:
-            go_dataframe = dataframes[0]
-            back_dataframe = dataframes[1]
-
-            # 抓取去程站點的即時資訊
-            for index, row in go_dataframe.iterrows():
-                stop_link = row['stop_link']
-                if stop_link:
-                    stop_info = get_stop_info(stop_link)
-                    print(f"去程站點: {row['stop_name']}, 資訊已儲存至 {stop_info['html_file']}")
-                    time.sleep(1)  # 防止過快請求
-
-            # 抓取回程站點的即時資訊
-            for index, row in back_dataframe.iterrows():
-                stop_link = row['stop_link']
-                if stop_link:
-                    stop_info = get_stop_info(stop_link)
-                    print(f"回程站點: {row['stop_name']}, 資訊已儲存至 {stop_info['html_file']}")
-                    time.sleep(1)
+            # 一次抓取兩個方向所有站點的快照（相同站點只抓一次），再依站序輸出
+            stops = [(label, stop.stop_name, stop.stop_link)
+                     for label, direction_stops in (("去程", go_stops), ("回程", back_stops))
+                     for stop in direction_stops if stop.stop_link]
+            stop_links = list(dict.fromkeys(stop_link for _, _, stop_link in stops))
+            stop_infos = dict(zip(stop_links, snapshot_stops(stop_links, mode, rate)))
+            for label, stop_name, stop_link in stops:
+                print(f"{label}站點: {stop_name}, 資訊已儲存至 {stop_infos[stop_link]['html_file']}")
 
             return go_dataframe, back_dataframe
         else:
@@ -135,8 +206,9 @@ def get_bus_route(rid: str):
 # 測試函數
 if __name__ == "__main__":
     rid = "10417"
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'http'  # python hw3.py [http|browser]
     try:
-        df1, df2 = get_bus_route(rid)
+        df1, df2 = get_bus_route(rid, mode)
         print("\n去程站點 DataFrame:")
         print(df1.head(5))
         print("\n回程站點 DataFrame:")
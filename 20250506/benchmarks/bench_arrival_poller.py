@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: sustained throughput and lag of the arrival_poller against the local
+replay_server. The recorded pages cover one route only, so the poller gets `locations`
+synthetic stop locations, each answered by the replay server with the estimates of a
+recorded stop page (about 20 routes per location). Reports stops stored per minute,
+schedule/fetch/write lag and the bytes per stored row.
+
+Usage:
+    python benchmarks/bench_arrival_poller.py [--locations 500] [--interval 10]
+        [--duration 30] [--rate 100] [--workers 32] [--latency 0.03]
+"""
+
+import argparse
+import os
+import tempfile
+
+from cycu11022119.arrival_poller import (arrival_poller, create_session, format_metrics,
+                                         parse_stop_dyna)
+from cycu11022119.arrival_store import arrival_store
+from cycu11022119.replay_server import replay_server
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+FIRST_LOCATION = 900000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--locations', type=int, default=500)
+    parser.add_argument('--interval', type=float, default=10.0)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--rate', type=float, default=100.0)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.03)
+    args = parser.parse_args()
+
+    with replay_server(REPO_ROOT, latency=args.latency, jitter=args.latency / 2, seed=0) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        session = create_session(args.workers)
+        # Unrecorded locations fall back to one recorded page, so every location reports
+        # the same stops; map them to their routes as discovery would
+        sample = session.get(f'{server.base_url}/MQS/StopLocationDyna?stoplocationid={FIRST_LOCATION}')
+        _, estimates = parse_stop_dyna(sample.json())
+        stops = {stop_id: index for index, (stop_id, _, _) in enumerate(estimates)}
+        targets = {FIRST_LOCATION + index: stops for index in range(args.locations)}
+        print(f"{args.locations} locations x {len(stops)} stops every {args.interval:g}s "
+              f"(target {args.locations * len(stops) * 60 / args.interval:.0f} stops/min), "
+              f"rate limit {args.rate:g}/s, {args.workers} workers, "
+              f"server latency {args.latency * 1000:.0f}ms")
+
+        with arrival_store(directory) as store:
+            poller = arrival_poller(targets, store, interval=args.interval, rate=args.rate,
+                                    workers=args.workers, session=session, base_url=server.base_url)
+            metrics = poller.run(args.duration, report_every=args.interval,
+                                 report=lambda metrics: print('  ' + format_metrics(metrics)))
+            store.close()
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+        print(format_metrics(metrics))
+        print(f"polls/min {metrics['polls_per_min']:.0f}, schedule lag max "
+              f"{metrics['schedule_lag_max']:.2f}s, rate limit wait {metrics['rate_limit_wait']:.1f}s, "
+              f"store {size / 1024:.0f} KiB = {size / max(1, metrics['rows_written']):.1f} bytes/row")
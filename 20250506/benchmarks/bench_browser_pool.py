@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: fetching route pages with one browser per route versus a shared browser_pool.
+
+Usage:
+    python benchmarks/bench_browser_pool.py [route_id ...]
+"""
+
+import sys
+import time
+
+from cycu11022119.browser_pool import browser_pool
+from cycu11022119.ebus_taipei import taipei_route_info
+
+DEFAULT_ROUTES = ['0161000900', '0161001500', '0100000200', '0100000A00']
+
+
+def run(route_ids, pool=None) -> float:
+    start = time.perf_counter()
+    for route_id in route_ids:
+        for direction in ('go', 'come'):
+            taipei_route_info(route_id, direction=direction, pool=pool)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    route_ids = sys.argv[1:] or DEFAULT_ROUTES
+    fetches = len(route_ids) * 2
+
+    elapsed = run(route_ids)
+    print(f"one browser per route: {elapsed:.1f}s ({elapsed / fetches:.2f}s/page)")
+
+    with browser_pool(pool_size=1, max_navigations=50) as pool:
+        elapsed = run(route_ids, pool=pool)
+        print(f"shared browser_pool:   {elapsed:.1f}s ({elapsed / fetches:.2f}s/page), "
+              f"{pool.pages_created} pages created, {pool.pages_recycled} recycled")
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: rows/sec of taipei_route_info.save_to_database() with per-row merge versus
+bulk upsert, and of save_route_infos_to_database() for a whole batch.
+
+The saved route page in data/ is parsed once and relabelled as many synthetic routes,
+so the benchmark runs offline against a throw-away database.
+
+Usage:
+    python benchmarks/bench_bulk_upsert.py [number_of_routes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from cycu11022119.ebus_taipei import save_route_infos_to_database, taipei_route_info
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+SAMPLE_PAGE = os.path.join(REPO_ROOT, 'data', 'ebus_taipei_0100000200.html')
+
+
+def make_routes(count: int, working_directory: str) -> list:
+    with open(SAMPLE_PAGE, encoding='utf-8') as file:
+        content = file.read()
+
+    routes = []
+    for i in range(count):
+        route_info = taipei_route_info(f'bench{i:05d}', working_directory=working_directory,
+                                       content=content)
+        route_info.parse_route_info()
+        # The sample page holds both directions; keep stop numbers unique per key
+        route_info.dataframe = route_info.dataframe.drop_duplicates("stop_number")
+        routes.append(route_info)
+    return routes
+
+
+def timed(label: str, rows: int, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows:>7} rows in {elapsed:6.2f}s  ({rows / elapsed:>9.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    for label, bulk, batch in [("merge per row", False, False),
+                               ("bulk upsert per route", True, False),
+                               ("bulk upsert whole batch", True, True)]:
+        with tempfile.TemporaryDirectory() as working_directory:
+            routes = make_routes(count, working_directory)
+            rows = sum(len(route.dataframe) for route in routes)
+
+            if batch:
+                timed(label, rows, lambda: save_route_infos_to_database(routes, working_directory))
+            else:
+                timed(label, rows, lambda: [route.save_to_database(bulk=bulk) for route in routes])
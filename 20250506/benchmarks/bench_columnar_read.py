@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: loading data_route_info_busstop through `pd.read_sql` (what
+read_from_database() does) versus the sorted Parquet export read back with memory
+mapping and Arrow-backed dtypes. A speed-up below 1x means SQLite is faster; that is
+the case for lookups of a few routes, which the stop indexes serve directly.
+
+A network-sized table is synthesised from the saved route page in data/, relabelled
+as many routes, in a throw-away database.
+
+Usage:
+    python benchmarks/bench_columnar_read.py [number_of_routes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from cycu11022119.columnar_store import export_parquet, read_bus_stops
+from cycu11022119.ebus_taipei import taipei_route_info
+from cycu11022119.repository import bus_stop_orm, get_repository
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+SAMPLE_PAGE = os.path.join(REPO_ROOT, 'data', 'ebus_taipei_0100000200.html')
+RUNS = 5
+
+
+def load(working_directory: str, count: int):
+    with open(SAMPLE_PAGE, encoding='utf-8') as file:
+        content = file.read()
+
+    dataframes = []
+    for i in range(count):
+        for direction in ('go', 'come'):
+            dataframe = taipei_route_info(f'bench{i:05d}', direction=direction,
+                                          content=content).parse_route_info()
+            dataframe["stop_id"] = dataframe["stop_id"].astype("int64") + i * 1000
+            dataframes.append(dataframe)
+    get_repository(working_directory).upsert_bus_stops(dataframes)
+
+
+def best_of(function) -> tuple:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        dataframe = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), dataframe
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+
+    with tempfile.TemporaryDirectory() as working_directory:
+        load(working_directory, count)
+        engine = get_repository(working_directory).engine
+
+        start = time.perf_counter()
+        export_parquet(working_directory)
+        print(f"export of {count} routes: {time.perf_counter() - start:.2f}s")
+
+        some_routes = [f'bench{i:05d}' for i in range(0, count, max(1, count // 20))]
+        cases = {
+            "whole network": (
+                lambda: pd.read_sql(bus_stop_orm.__table__.select(), engine),
+                lambda: read_bus_stops(working_directory),
+            ),
+            "2 columns": (
+                lambda: pd.read_sql("SELECT route_id, stop_name FROM data_route_info_busstop", engine),
+                lambda: read_bus_stops(working_directory, columns=['route_id', 'stop_name']),
+            ),
+            f"{len(some_routes)} routes, go": (
+                lambda: pd.read_sql(
+                    bus_stop_orm.__table__.select()
+                    .where(bus_stop_orm.route_id.in_(some_routes))
+                    .where(bus_stop_orm.direction == 'go'), engine),
+                lambda: read_bus_stops(working_directory, route_ids=some_routes, direction='go'),
+            ),
+        }
+
+        print(f"{'read':<18}{'sqlite':>10}{'parquet':>10}{'speed-up':>10}"
+              f"{'sqlite MiB':>12}{'parquet MiB':>13}")
+        for label, (sqlite_read, parquet_read) in cases.items():
+            sqlite_time, sqlite_df = best_of(sqlite_read)
+            parquet_time, parquet_df = best_of(parquet_read)
+            assert len(sqlite_df) == len(parquet_df)
+            sqlite_mib = sqlite_df.memory_usage(deep=True).sum() / 2 ** 20
+            parquet_mib = parquet_df.memory_usage(deep=True).sum() / 2 ** 20
+            print(f"{label:<18}{sqlite_time * 1000:>8.0f}ms{parquet_time * 1000:>8.0f}ms"
+                  f"{sqlite_time / parquet_time:>9.1f}x{sqlite_mib:>12.1f}{parquet_mib:>13.1f}")
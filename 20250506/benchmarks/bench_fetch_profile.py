@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: bytes transferred and load time per route page with every resource loaded
+versus the default fetch_profile, which blocks what the parser does not need.
+Each profile gets a fresh browser, so neither run profits from the other's cache.
+Both runs must parse the same stops.
+
+Usage:
+    python benchmarks/bench_fetch_profile.py [route_id ...]
+"""
+
+import sys
+
+from cycu11022119.browser_pool import browser_pool
+from cycu11022119.ebus_taipei import fetch_route_info_both
+from cycu11022119.fetch_profile import fetch_profile
+
+DEFAULT_ROUTES = ['0161000900', '0161001500', '0100000200', '0100000A00']
+
+
+def run(route_ids, profile: fetch_profile) -> list:
+    stop_counts = []
+    with browser_pool(pool_size=1) as pool:
+        for route_id in route_ids:
+            go, come = fetch_route_info_both(route_id, pool=pool, profile=profile)
+            stop_counts.append((len(go), len(come) if come is not None else 0))
+    return stop_counts
+
+
+if __name__ == "__main__":
+    route_ids = sys.argv[1:] or DEFAULT_ROUTES
+
+    results = {}
+    for label, block in (('load everything', False), ('blocking profile', True)):
+        profile = fetch_profile(block=block, measure=True)
+        stop_counts = run(route_ids, profile)
+        results[label] = stop_counts
+        summary = profile.stats.summary()
+        print(f"{label:<18} {summary['mean_bytes'] / 1024:8.0f} KiB/page "
+              f"{summary['mean_requests']:5.0f} requests/page "
+              f"{summary['blocked']:5d} blocked "
+              f"{summary['mean_seconds']:6.2f}s/page")
+
+    if results['load everything'] != results['blocking profile']:
+        print(f"Parsed stops differ: {results}")
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: start-up cost of the package, i.e. what a cron-driven query script pays
+before doing any work.
+
+For each target a fresh interpreter is started with `python -X importtime`; the
+cumulative import time of the module and of pandas, Playwright and SQLAlchemy (if
+they were loaded at all) is reported, together with the wall time of a CLI query
+against a temporary copy of data/hermes_ebus_taipei.sqlite3 (time to first query), so
+the committed database is never touched.
+
+Usage:
+    python benchmarks/bench_import_time.py [runs]
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from cycu11022119.repository import DATABASE_FILE
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+HEAVY_MODULES = ['pandas', 'playwright', 'sqlalchemy']
+IMPORT_TARGETS = [
+    'cycu11022119.ebus_taipei',
+    'cycu11022119.repository',
+    'cycu11022119.cli',
+]
+QUERY_COMMAND = ['-m', 'cycu11022119.cli', '-d', '{working_directory}', 'routes', '--limit', '1']
+IMPORTTIME_LINE = re.compile(r'import time:\s+\d+ \|\s+(\d+) \| *(\S+)')
+
+
+def import_times(module: str) -> dict:
+    """
+    Returns {module name: cumulative microseconds} of the top-level imports made
+    while importing `module` in a fresh interpreter.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative, name = match.groups()
+            # Every module is imported once, so each name appears on one line
+            times.setdefault(name, int(cumulative))
+    return times
+
+
+def time_to_first_query(working_directory: str) -> float:
+    command = [argument.format(working_directory=working_directory) for argument in QUERY_COMMAND]
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + command, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"{'module':<28}{'import':>10}" + ''.join(f"{name:>12}" for name in HEAVY_MODULES))
+    for module in IMPORT_TARGETS:
+        samples = [import_times(module) for _ in range(runs)]
+        best = min(samples, key=lambda times: times[module])
+        columns = ''.join(
+            f"{best[name] / 1000:>10.0f}ms" if name in best else f"{'-':>12}"
+            for name in HEAVY_MODULES
+        )
+        print(f"{module:<28}{best[module] / 1000:>8.0f}ms{columns}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(os.path.join(REPO_ROOT, 'data', DATABASE_FILE), directory)
+        query_times = sorted(time_to_first_query(directory) for _ in range(runs))
+    print(f"time to first query (cli routes --limit 1): "
+          f"median {query_times[len(query_times) // 2] * 1000:.0f}ms, "
+          f"best {query_times[0] * 1000:.0f}ms")
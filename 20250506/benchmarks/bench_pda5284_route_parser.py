@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: the go/back stop extraction of 20250401/hw3.py (BeautifulSoup with
+html.parser, two find_all passes per table) versus the single-pass
+pda5284_route_parser backends, on a saved pda5284 route page. Reports parse time and
+whether every parser returns the same stops.
+
+Usage:
+    python benchmarks/bench_pda5284_route_parser.py [iterations] [route_page]
+"""
+
+import html
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from cycu11022119.pda5284_route_parser import PARSER_BACKENDS
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+DEFAULT_PAGE = os.path.join(REPO_ROOT, 'bus_data', 'bus_route_10417.html')
+
+
+def parse_bs4_find_all(content: str) -> tuple:
+    # The loop of hw3.get_bus_route before it used pda5284_route_parser
+    soup = BeautifulSoup(content, "html.parser")
+    directions = []
+    for table in soup.find_all("table"):
+        for classes in (["ttego1", "ttego2"], ["tteback1", "tteback2"]):
+            rows = []
+            for tr in table.find_all("tr", class_=classes):
+                td = tr.find("td")
+                if td:
+                    stop_name = html.unescape(td.text.strip())
+                    stop_link = td.find("a")["href"] if td.find("a") else None
+                    rows.append((stop_name, stop_link))
+            if rows:
+                directions.append(rows)
+    return directions[0], directions[1]
+
+
+def names_and_links(backend):
+    # Reduces route_stop records to the (stop_name, stop_link) pairs bs4 returns
+    def parse(content: str) -> tuple:
+        go, back = backend(content)
+        return ([(stop.stop_name, stop.stop_link) for stop in go],
+                [(stop.stop_name, stop.stop_link) for stop in back])
+    return parse
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PAGE
+
+    with open(path, encoding='utf-8') as file:
+        content = file.read()
+    print(f"{os.path.basename(path)} ({len(content) / 1024:.0f} KiB), {iterations} iterations")
+
+    parsers = {'bs4 find_all': parse_bs4_find_all}
+    parsers.update({name: names_and_links(backend) for name, backend in PARSER_BACKENDS.items()})
+
+    results = {}
+    baseline = None
+    for name, parse in parsers.items():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            go, back = parse(content)
+        elapsed = (time.perf_counter() - start) / iterations
+        baseline = baseline or elapsed
+        results[name] = (go, back)
+        print(f"  {name:<13} go {len(go):>3}  back {len(back):>3}  {elapsed * 1000:7.2f} ms/parse"
+              f"  {baseline / elapsed:6.1f}x")
+
+    expected = names_and_links(PARSER_BACKENDS['lxml'])(content)
+    for name, result in results.items():
+        print(f"  {name:<13} same stops as lxml: {result == expected}")
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark harness: runs each crawler of the repository against the local
+replay_server and reports pages/sec, p50/p99 response latency and the crawler's
+peak RSS.
+
+Every crawler runs as its own process in a scratch directory (with a copy of the
+hermes database), with EBUS_BASE_URL and PDA5284_BASE_URL pointing at the server.
+The scratch database starts with an empty stop table and a crawler only counts as
+passing if it exits 0 *and* wrote rows to its output (CSV files or the stop table),
+so a crawler that swallows every per-route error cannot pass. Latency percentiles
+are measured by the server per response, injected delay included. Peak RSS is the
+crawler process itself, reported by a small shim the crawler runs under; Chromium
+child processes of Playwright-based crawlers are not included.
+
+Usage:
+    python benchmarks/bench_replay_crawlers.py [--latency 0.05] [--jitter 0.02]
+        [--error-rate 0.0] [--timeout 300] [crawler ...]
+"""
+
+import argparse
+import csv
+import glob
+import os
+import shutil
+import subprocess
+import sqlite3
+import sys
+import tempfile
+import time
+
+from cycu11022119.ebus_taipei import page_latency_stats
+from cycu11022119.repository import DATABASE_FILE
+from cycu11022119.replay_server import replay_server
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CRAWLERS = {
+    'hw2': [os.path.join(REPO_ROOT, '20250401', 'hw2.py')],
+    'hw3': [os.path.join(REPO_ROOT, '20250401', 'hw3.py')],
+    'test3': [os.path.join(REPO_ROOT, '20250603', 'test3.py')],
+    'ebus_taipei': ['-m', 'cycu11022119.ebus_taipei'],
+}
+# Runs a crawler (script path or `-m module`) like the interpreter would and writes its
+# peak RSS in KiB to BENCH_RSS_FILE at exit; a crawler killed on timeout reports none
+RSS_SHIM = """
+import atexit, os, resource, runpy, sys
+def report():
+    with open(os.environ['BENCH_RSS_FILE'], 'w') as file:
+        file.write(str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+atexit.register(report)
+if sys.argv[1] == '-m':
+    sys.argv = sys.argv[2:]
+    runpy.run_module(sys.argv[0], run_name='__main__', alter_sys=True)
+else:
+    sys.argv = sys.argv[1:]
+    sys.path[0] = os.path.dirname(sys.argv[0])
+    runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+
+def _csv_rows(*patterns):
+    def count(scratch: str) -> int:
+        rows = 0
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(scratch, pattern)):
+                with open(path, encoding='utf-8-sig', newline='') as file:
+                    rows += max(sum(1 for _ in csv.reader(file)) - 1, 0)
+        return rows
+    return count
+
+
+def _stop_rows(scratch: str) -> int:
+    with sqlite3.connect(os.path.join(scratch, 'data', DATABASE_FILE)) as connection:
+        return connection.execute("SELECT COUNT(*) FROM data_route_info_busstop").fetchone()[0]
+
+
+# How many rows each crawler wrote into its scratch directory
+ROWS_WRITTEN = {
+    'hw2': _csv_rows('all_routes_real_time_info.csv'),
+    'hw3': _csv_rows(os.path.join('bus_data', 'go_*.csv'), os.path.join('bus_data', 'back_*.csv')),
+    'test3': _csv_rows(os.path.join('20250603', 'taipei_bus_routes_with_stops.csv')),
+    'ebus_taipei': _stop_rows,
+}
+
+
+def run_crawler(name: str, server: replay_server, timeout: float) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        os.makedirs(os.path.join(scratch, 'data'))
+        database = os.path.join(scratch, 'data', DATABASE_FILE)
+        shutil.copy(os.path.join(REPO_ROOT, 'data', DATABASE_FILE), database)
+        # Stops must be written by the crawler under test, not inherited from the copy
+        with sqlite3.connect(database) as connection:
+            connection.execute("DELETE FROM data_route_info_busstop")
+        rss_path = os.path.join(scratch, 'peak_rss')
+        env = dict(os.environ, EBUS_BASE_URL=server.base_url, PDA5284_BASE_URL=server.base_url,
+                   BENCH_RSS_FILE=rss_path)
+
+        server.reset()
+        log_path = os.path.join(scratch, 'crawler.log')
+        with open(log_path, 'wb') as log:
+            start = time.perf_counter()
+            try:
+                exit_code = subprocess.run([sys.executable, '-c', RSS_SHIM] + CRAWLERS[name],
+                                           cwd=scratch, env=env, stdout=log,
+                                           stderr=subprocess.STDOUT, timeout=timeout).returncode
+            except subprocess.TimeoutExpired:
+                exit_code = None
+            elapsed = time.perf_counter() - start
+
+        with open(log_path, encoding='utf-8', errors='replace') as log:
+            lines = log.read().strip().splitlines()
+        peak_rss_kib = None
+        if os.path.exists(rss_path):
+            with open(rss_path) as file:
+                peak_rss_kib = int(file.read())
+        rows = ROWS_WRITTEN[name](scratch)
+
+    requests = server.reset()
+    latency = page_latency_stats()
+    for request in requests:
+        latency.record(request["seconds"])
+    pages = sum(1 for request in requests if request["status"] == 200)
+
+    return {
+        "exit": exit_code,
+        "passed": exit_code == 0 and rows > 0,
+        "rows": rows,
+        "elapsed": elapsed,
+        "pages": pages,
+        "errors": sum(1 for request in requests if request["status"] != 200),
+        "pages_per_sec": pages / elapsed if elapsed > 0 else 0.0,
+        "p50": latency.percentile(50),
+        "p99": latency.percentile(99),
+        "peak_rss_mib": peak_rss_kib / 1024 if peak_rss_kib is not None else None,
+        "last_line": lines[-1] if lines else '',
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('crawlers', nargs='*', metavar='crawler',
+                        help=f"crawlers to run (default: all of {', '.join(CRAWLERS)})")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=300.0)
+    args = parser.parse_args()
+    unknown = [name for name in args.crawlers if name not in CRAWLERS]
+    if unknown:
+        parser.error(f"unknown crawler(s): {', '.join(unknown)} (choose from {', '.join(CRAWLERS)})")
+
+    with replay_server(REPO_ROOT, latency=args.latency, jitter=args.jitter,
+                       error_rate=args.error_rate, seed=0) as server:
+        print(f"replay server {server.base_url}: latency {args.latency}s "
+              f"+ jitter {args.jitter}s, error rate {args.error_rate}")
+        print(f"{'crawler':<13}{'exit':>5}{'rows':>7}{'pages':>7}{'errors':>7}{'pages/s':>9}"
+              f"{'p50':>8}{'p99':>8}{'RSS MiB':>9}")
+        failed = []
+        for name in args.crawlers or list(CRAWLERS):
+            result = run_crawler(name, server, args.timeout)
+            exit_code = 'kill' if result['exit'] is None else result['exit']
+            rss = '-' if result['peak_rss_mib'] is None else f"{result['peak_rss_mib']:.1f}"
+            print(f"{name:<13}{exit_code:>5}{result['rows']:>7}{result['pages']:>7}"
+                  f"{result['errors']:>7}{result['pages_per_sec']:>9.1f}"
+                  f"{result['p50'] * 1000:>6.0f}ms{result['p99'] * 1000:>6.0f}ms{rss:>9}")
+            if not result['passed']:
+                failed.append(name)
+                reason = 'timed out' if result['exit'] is None else (
+                    f"exit {result['exit']}" if result['exit'] != 0 else 'no rows written')
+                print(f"    FAILED ({reason}): {result['last_line'][:200]}")
+
+    if failed:
+        sys.exit(f"failed: {', '.join(failed)}")
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: regex versus lxml route_parser backends on the saved StopsOfRoute pages in
+data/ and bus_data/, comparing parse time and whether both return the same stops, and
+how each copes with reordered input attributes. The regex is the faster backend; lxml
+is the one that still parses the reordered markup.
+
+Usage:
+    python benchmarks/bench_route_parser.py [iterations]
+"""
+
+import glob
+import os
+import re
+import sys
+import time
+
+from cycu11022119.route_parser import PARSER_BACKENDS, direction_section
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+PAGES = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'ebus_taipei_*.html')) +
+               glob.glob(os.path.join(REPO_ROOT, 'bus_data', 'ebus_taipei_*.html')))
+REORDERED_STOPS = 8
+
+
+def first_stops(section: str, count: int) -> str:
+    end = 0
+    for _ in range(count):
+        end = section.index('</li>', end) + len('</li>')
+    return section[:end]
+
+
+def reorder_attributes(content: str) -> str:
+    # Same page with value="..." written before name="...", as another renderer might emit
+    return re.sub(r'<input ([^>]*?)name="([^"]+)"([^>]*?)value="([^"]*)"',
+                  r'<input \1value="\4"\3name="\2"', content)
+
+
+def normalise(stops: list) -> list:
+    # Compare parsed values, not raw markup: the regex keeps entities and inner whitespace
+    return [tuple(' '.join(field.split()) for field in stop) for stop in stops]
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for path in PAGES:
+        with open(path, encoding='utf-8') as file:
+            content = file.read()
+        print(f"{os.path.basename(path)} ({len(content) / 1024:.0f} KiB)")
+
+        results = {}
+        for name, backend in PARSER_BACKENDS.items():
+            for direction in ('go', 'come'):
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    stops = backend(content, direction)
+                elapsed = (time.perf_counter() - start) / iterations
+                results[name, direction] = normalise(stops)
+                print(f"  {name:<6} {direction:<5} {len(stops):>3} stops  {elapsed * 1000:7.2f} ms/parse")
+
+        for direction in ('go', 'come'):
+            same = results['regex', direction] == results['lxml', direction]
+            print(f"  {direction:<5} backends agree: {same}")
+
+        # The regex backtracks super-linearly when it cannot match, so the reordered
+        # check runs on the first REORDERED_STOPS stops only
+        sample = first_stops(direction_section(content, 'go'), REORDERED_STOPS)
+        expected = normalise(PARSER_BACKENDS['lxml'](sample, 'go'))
+        reordered = reorder_attributes(sample)
+        for name, backend in PARSER_BACKENDS.items():
+            start = time.perf_counter()
+            stops = normalise(backend(reordered, 'go'))
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<6} reordered attributes: {len(stops)}/{len(expected)} stops, "
+                  f"identical: {stops == expected}, {elapsed * 1000:.1f} ms")
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: storage of a month of page snapshots as HTML files, as gzip-compressed files
+and in the snapshot_archive, plus random access and re-parsing from the archive.
+
+The month is simulated from the recorded pages in bus_data/ and data/: every run
+re-saves each of them, with the live parts (arrival estimates on stop and eBus route
+pages) redrawn at random; pda5284 route pages and the eBus route list do not change.
+
+Usage:
+    python benchmarks/bench_snapshot_archive.py [--days 30] [--runs-per-day 4]
+        [--codec zstd|zlib]
+"""
+
+import argparse
+import glob
+import os
+import random
+import re
+import tempfile
+import time
+import zlib
+
+from cycu11022119.pda5284_route_parser import parse_route_stops
+from cycu11022119.route_parser import parse_stops
+from cycu11022119.snapshot_archive import available_codec, snapshot_archive, snapshot_file_key
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+STOP_ETA_CELL = re.compile(r'(id="tte\d+"[^>]*>)[^<]*(<)')
+EBUS_ARRIVAL = re.compile(r'(auto-list-stationlist-position[^"]*">)(.*?)(</span>)', re.DOTALL)
+RANDOM_LOOKUPS = 1000
+
+
+def recorded_pages() -> dict:
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(REPO_ROOT, 'bus_data', '*.html')) +
+                       glob.glob(os.path.join(REPO_ROOT, 'data', '*.html'))):
+        kind_key = snapshot_file_key(os.path.basename(path))
+        if kind_key is not None:
+            with open(path, encoding='utf-8') as file:
+                pages[kind_key] = file.read()
+    return pages
+
+
+def random_eta(rng: random.Random) -> str:
+    return rng.choice(['未發車', '末班已過', '將到站', '進站中', f'{rng.randint(3, 40)}分',
+                       f'{rng.randint(5, 22):02d}:{rng.choice(["00", "15", "30", "45"])} 發車'])
+
+
+def live_variant(kind: str, content: str, rng: random.Random) -> str:
+    if kind == 'stop':
+        return STOP_ETA_CELL.sub(lambda match: match.group(1) + random_eta(rng) + match.group(2),
+                                 content)
+    if kind == 'ebus_route':
+        return EBUS_ARRIVAL.sub(lambda match: match.group(1) + random_eta(rng) + match.group(3),
+                                content)
+    return content
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--runs-per-day', type=int, default=4)
+    parser.add_argument('--codec', choices=['zstd', 'zlib'], default=available_codec())
+    args = parser.parse_args()
+
+    pages = recorded_pages()
+    rng = random.Random(0)
+    start = time.time() - args.days * 86400
+    runs = args.days * args.runs_per_day
+
+    file_bytes = gzip_bytes = 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'archive.sqlite3')
+        with snapshot_archive(path, codec=args.codec) as archive:
+            began = time.perf_counter()
+            for run in range(runs):
+                taken_at = start + run * 86400 / args.runs_per_day
+                for (kind, key), content in pages.items():
+                    content = live_variant(kind, content, rng)
+                    data = content.encode('utf-8')
+                    file_bytes += len(data)
+                    gzip_bytes += len(zlib.compress(data, 9))
+                    archive.put(kind, key, content, taken_at)
+            put_seconds = time.perf_counter() - began
+            archive.vacuum()
+            stats = archive.stats()
+
+            keys = list(pages)
+            began = time.perf_counter()
+            for _ in range(RANDOM_LOOKUPS):
+                kind, key = rng.choice(keys)
+                archive.get(kind, key, at=start + rng.uniform(0, args.days * 86400))
+            lookup_seconds = (time.perf_counter() - began) / RANDOM_LOOKUPS
+
+            began = time.perf_counter()
+            reparsed = stops = 0
+            for _, _, content in archive.history('route'):
+                go, back = parse_route_stops(content)
+                stops += len(go) + len(back)
+                reparsed += 1
+            for _, _, content in archive.history('ebus_route'):
+                stops += len(parse_stops(content, 'go', 'lxml')) + len(parse_stops(content, 'come', 'lxml'))
+                reparsed += 1
+            reparse_seconds = time.perf_counter() - began
+        archive_bytes = os.path.getsize(path)
+
+    print(f"{args.days} days x {args.runs_per_day} runs x {len(pages)} pages = "
+          f"{stats['snapshots']} snapshots, {stats['objects']} distinct bodies ({stats['deltas']} deltas), codec {args.codec}")
+    print(f"  HTML files          {file_bytes / 2 ** 20:9.1f} MiB")
+    print(f"  gzip -9 per file    {gzip_bytes / 2 ** 20:9.1f} MiB  {file_bytes / gzip_bytes:6.1f}x")
+    print(f"  archive file        {archive_bytes / 2 ** 20:9.1f} MiB  {file_bytes / archive_bytes:6.1f}x "
+          f"({stats['stored_bytes'] / 2 ** 20:.1f} MiB compressed bodies and "
+          f"{stats['dictionaries']} dictionaries)")
+    print(f"  archiving           {put_seconds / stats['snapshots'] * 1000:9.2f} ms/snapshot")
+    print(f"  random get(at=...)  {lookup_seconds * 1000:9.2f} ms")
+    print(f"  re-parse            {reparsed} route pages, {stops} stops in {reparse_seconds:.2f}s "
+          f"({reparse_seconds / reparsed * 1000:.1f} ms/page incl. decompression)")
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: typical stop lookups against data_route_info_busstop with the plain SQLite
+setup (no secondary indexes, rollback journal) versus the 'performance' storage profile
+(WAL, cache pragmas, indexes, ANALYZE).
+
+A network-sized table is synthesised from the saved route page in data/, relabelled
+as many routes, in a throw-away database.
+
+Usage:
+    python benchmarks/bench_sqlite_profile.py [number_of_routes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from cycu11022119.ebus_taipei import taipei_route_info
+from cycu11022119.repository import bus_stop_orm, hermes_repository
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+SAMPLE_PAGE = os.path.join(REPO_ROOT, 'data', 'ebus_taipei_0100000200.html')
+LOOKUPS = 300
+
+QUERIES = {
+    "by stop_id": ("SELECT route_id, direction, stop_number FROM data_route_info_busstop "
+                   "WHERE stop_id = :stop_id", "stop_id"),
+    "by route_id + direction": ("SELECT * FROM data_route_info_busstop "
+                                "WHERE route_id = :route_id AND direction = :direction "
+                                "ORDER BY stop_number", "route"),
+    "by stop_name": ("SELECT DISTINCT route_id FROM data_route_info_busstop "
+                     "WHERE stop_name = :stop_name", "stop_name"),
+}
+
+
+def load(repository: hermes_repository, count: int):
+    with open(SAMPLE_PAGE, encoding='utf-8') as file:
+        content = file.read()
+
+    dataframes = []
+    for i in range(count):
+        for direction in ('go', 'come'):
+            dataframe = taipei_route_info(f'bench{i:05d}', direction=direction,
+                                          content=content).parse_route_info()
+            # Give every route its own stop IDs and names, as in the real network
+            dataframe["stop_id"] = dataframe["stop_id"].astype("int64") + i * 1000
+            dataframe["stop_name"] = dataframe["stop_name"] + f"#{i % 400}"
+            dataframes.append(dataframe)
+    repository.upsert_bus_stops(dataframes)
+
+
+def run_lookups(repository: hermes_repository, count: int) -> dict:
+    samples = {
+        "stop_id": [{"stop_id": 1117401420 + (i * 7 % count) * 1000} for i in range(LOOKUPS)],
+        "route": [{"route_id": f'bench{i * 13 % count:05d}', "direction": 'go'} for i in range(LOOKUPS)],
+        "stop_name": [{"stop_name": f"富洲里#{i % 400}"} for i in range(LOOKUPS)],
+    }
+
+    timings = {}
+    with repository.engine.connect() as connection:
+        for label, (sql, kind) in QUERIES.items():
+            statement = text(sql)
+            start = time.perf_counter()
+            for parameters in samples[kind]:
+                connection.execute(statement, parameters).fetchall()
+            timings[label] = (time.perf_counter() - start) / LOOKUPS
+    return timings
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+
+    results = {}
+    for profile in ('default', 'performance'):
+        with tempfile.TemporaryDirectory() as working_directory:
+            repository = hermes_repository(working_directory, profile=profile)
+            if profile == 'default':
+                # The historical schema had no secondary indexes
+                for index in bus_stop_orm.__table__.indexes:
+                    index.drop(repository.engine)
+
+            start = time.perf_counter()
+            load(repository, count)
+            if profile == 'performance':
+                repository.analyze()
+            load_time = time.perf_counter() - start
+
+            results[profile] = run_lookups(repository, count)
+            print(f"{profile:<12} load {load_time:6.1f}s")
+            repository.dispose()
+
+    print(f"{'query':<26}{'default':>12}{'performance':>14}{'speed-up':>10}")
+    for label in QUERIES:
+        before, after = results['default'][label], results['performance'][label]
+        print(f"{label:<26}{before * 1000:>10.3f}ms{after * 1000:>12.3f}ms{before / after:>9.0f}x")
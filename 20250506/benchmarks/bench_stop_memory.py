@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: memory and parse time of the all-string stop DataFrames versus the typed
+frames of parse_route_info(typed=True), per 1000 routes (both directions).
+
+Routes are synthesised from the saved route page in data/, relabelled with new IDs.
+
+Usage:
+    python benchmarks/bench_stop_memory.py [number_of_routes]
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+from cycu11022119.ebus_taipei import combine_stop_frames, taipei_route_info
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+SAMPLE_PAGE = os.path.join(REPO_ROOT, 'data', 'ebus_taipei_0100000200.html')
+
+
+def parse_all(content: str, count: int, typed: bool) -> tuple:
+    start = time.perf_counter()
+    frames = [
+        taipei_route_info(f'{i:010d}', direction=direction, content=content).parse_route_info(typed=typed)
+        for i in range(count) for direction in ('go', 'come')
+    ]
+    return frames, time.perf_counter() - start
+
+
+def mib(frames) -> float:
+    return sum(frame.memory_usage(deep=True).sum() for frame in frames) / 2 ** 20
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    scale = 1000 / count
+
+    with open(SAMPLE_PAGE, encoding='utf-8') as file:
+        content = file.read()
+
+    strings, strings_time = parse_all(content, count, typed=False)
+    typed, typed_time = parse_all(content, count, typed=True)
+    strings_combined = pd.concat(strings, ignore_index=True)
+    typed_combined = combine_stop_frames(typed)
+
+    print(f"{len(strings_combined)} stops in {count} routes; figures per 1000 routes")
+    print(f"{'':<16}{'parse':>9}{'frames MiB':>12}{'combined MiB':>14}")
+    print(f"{'all strings':<16}{strings_time * scale:>8.2f}s{mib(strings) * scale:>12.1f}"
+          f"{mib([strings_combined]) * scale:>14.1f}")
+    print(f"{'typed':<16}{typed_time * scale:>8.2f}s{mib(typed) * scale:>12.1f}"
+          f"{mib([typed_combined]) * scale:>14.1f}")
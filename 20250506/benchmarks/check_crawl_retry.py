@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Regression check: a route whose stops failed to write is written on its retry.
+
+The crawl queue runs crawl_route over one route against a temporary copy of the hermes
+database, whose stop table is emptied first. The browser is replaced by the saved
+data/ebus_taipei_<route_id>.html and the first sync_bus_stops call fails like a locked
+database. The retry must parse the page again instead of finding its snapshot
+unchanged: the route ends up done and its stops are in data_route_info_busstop.
+Exits nonzero if not.
+
+Usage:
+    python benchmarks/check_crawl_retry.py [route_id]
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from cycu11022119.crawl_queue import DONE, PENDING, crawl_queue, crawl_route, run_queue
+from cycu11022119.repository import DATABASE_FILE, bus_route_orm, get_repository
+from cycu11022119.snapshot_store import snapshot_store
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_ROUTE = '0100000200'
+
+
+class saved_page:
+    """
+    Stands in for a Playwright page that always renders the same saved HTML.
+    """
+
+    def __init__(self, content: str):
+        self._content = content
+
+    @contextmanager
+    def expect_response(self, url, timeout=None):
+        yield
+
+    def goto(self, url):
+        pass
+
+    def click(self, selector):
+        pass
+
+    def route(self, pattern, handler):
+        pass
+
+    def content(self) -> str:
+        return self._content
+
+
+class saved_pool:
+    """
+    Stands in for a browser_pool that lends one saved_page.
+    """
+
+    def __init__(self, content: str):
+        self._page = saved_page(content)
+
+    @contextmanager
+    def page(self):
+        yield self._page
+
+
+if __name__ == "__main__":
+    route_id = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ROUTE
+    with open(os.path.join(REPO_ROOT, 'data', f'ebus_taipei_{route_id}.html'), encoding='utf-8') as file:
+        pool = saved_pool(file.read())
+
+    with tempfile.TemporaryDirectory() as working_directory:
+        database = os.path.join(working_directory, DATABASE_FILE)
+        shutil.copy(os.path.join(REPO_ROOT, 'data', DATABASE_FILE), database)
+        with sqlite3.connect(database) as connection:
+            connection.execute("DELETE FROM data_route_info_busstop")
+
+        repository = get_repository(working_directory)
+        queue = crawl_queue(working_directory, base_delay=0.0)
+        queue.session.query(bus_route_orm).update({"route_data_updated": DONE})
+        queue.session.query(bus_route_orm).filter_by(route_id=route_id).update(
+            {"route_data_updated": PENDING})
+        queue.session.commit()
+
+        sync_bus_stops = repository.sync_bus_stops
+        calls = []
+
+        def locked_once(records, *args, **kwargs):
+            calls.append(route_id)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            return sync_bus_stops(records, *args, **kwargs)
+
+        repository.sync_bus_stops = locked_once
+        with snapshot_store(working_directory) as snapshots:
+            counts = run_queue(queue, lambda route: crawl_route(route, pool, snapshots, repository))
+
+        flag = queue.session.get(bus_route_orm, route_id).route_data_updated
+        queue.close()
+        with sqlite3.connect(database) as connection:
+            rows = connection.execute("SELECT COUNT(*) FROM data_route_info_busstop WHERE route_id = ?",
+                                      (route_id,)).fetchone()[0]
+        repository.engine.dispose()
+
+    print(f"route {route_id}: {counts}, route_data_updated={flag}, {rows} stop rows")
+    if counts != {"done": 1, "failed": 1} or flag != DONE or rows == 0:
+        sys.exit("FAILED: the retry did not write the route's stops")
+    print("OK")
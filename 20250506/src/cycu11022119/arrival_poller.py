@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""
+This module polls the real-time arrival estimates of pda5284 stops continuously and
+appends them to an arrival_store.
+
+The unit of polling is the stop location (a physical stop pole): its stop.jsp page
+loads the estimates of every route serving it from one JSON call,
+MQS/StopLocationDyna?stoplocationid=<id>. So a route set is first resolved, once, into
+stop locations (route.jsp -> stop IDs, stop.jsp -> location ID), and each location is
+polled once per interval however many of the configured routes stop there.
+
+When a location is polled next is up to its poll_schedule: every `interval` seconds,
+or adaptively from the ETAs just read. Requests go through a shared token_bucket and a
+bounded thread pool, and a single writer thread appends the estimates in batches. The
+`metrics` of a running poller report throughput, lag and staleness:
+
+    schedule lag   how late a poll was sent relative to its due time (rate limit included)
+    fetch          request latency
+    data age       polled_at minus the server's UpdateTime
+    write lag      time a polled estimate waited before it was committed
+    refresh        time between two polls of a location; "imminent" only counts the
+                   refreshes of locations whose last poll showed a bus about to arrive
+
+Requires requests (pip install requests).
+"""
+
+import heapq
+import html
+import json
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cycu11022119.arrival_store import TAIPEI, arrival_store
+from cycu11022119.endpoints import PDA5284_BASE_URL
+from cycu11022119.pda5284_route_parser import parse_route_stops
+from cycu11022119.poll_schedule import fixed_schedule, is_imminent
+from cycu11022119.rate_limit import token_bucket
+
+STOP_LOCATION_PATTERN = re.compile(r'StopLocationDyna\?stoplocationid=(\d+)')
+DEPARTURE_PATTERN = re.compile(r'(\d{1,2}):(\d{2})')
+DEFAULT_INTERVAL = 60.0
+DEFAULT_RATE = 20.0
+DEFAULT_WORKERS = 16
+REQUEST_TIMEOUT = 10.0
+LAG_WINDOW = 4096
+THROUGHPUT_WINDOW = 60.0
+
+
+def create_session(pool_size: int = DEFAULT_WORKERS):
+    """
+    Returns a keep-alive requests.Session whose pool holds `pool_size` connections.
+
+    Raises:
+        ImportError: If requests is not installed.
+    """
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+    except ImportError as e:
+        raise ImportError("The arrival poller requires requests: pip install requests") from e
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_eta(text: str) -> int:
+    """
+    Returns seconds until arrival, or the ETA_STATUS code of an empty or non-numeric value.
+    """
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return -1
+
+
+def parse_departure(text: str) -> int:
+    """
+    Returns an HH:MM departure time (HTML-escaped as the service sends it) as minutes
+    after midnight, or None.
+    """
+    match = DEPARTURE_PATTERN.fullmatch(html.unescape(text or '').strip())
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else None
+
+
+def parse_stop_dyna(data: dict) -> tuple:
+    """
+    Parses a StopLocationDyna response.
+
+    Each entry of data["Stop"] carries a comma-separated "n1" record; like the stop page
+    script, only field 1 (stop ID), 3 (departure time) and 7 (seconds to arrival) are read.
+
+    Returns:
+        tuple: (updated_at epoch seconds or None, [(stop_id, eta, departure), ...]).
+    """
+    updated_at = None
+    if data.get('UpdateTime'):
+        try:
+            updated = datetime.strptime(data['UpdateTime'][:19], '%Y-%m-%d %H:%M:%S')
+            updated_at = int(updated.replace(tzinfo=TAIPEI).timestamp())
+        except ValueError:
+            pass
+
+    estimates = []
+    for stop in data.get('Stop') or []:
+        if not stop.get('n1'):
+            continue
+        fields = stop['n1'].split(',')
+        if len(fields) < 8 or not fields[1].isdigit():
+            continue
+        estimates.append((int(fields[1]), parse_eta(fields[7]), parse_departure(fields[3])))
+    return updated_at, estimates
+
+
+def discover_stop_locations(route_ids: list, session=None, base_url: str = PDA5284_BASE_URL,
+                            bucket: token_bucket = None, workers: int = DEFAULT_WORKERS,
+                            timeout: float = REQUEST_TIMEOUT) -> dict:
+    """
+    Resolves routes into the stop locations to poll.
+
+    Args:
+        route_ids (list): pda5284 route IDs (rid).
+        session (requests.Session): Session to fetch with. Defaults to a new one.
+        base_url (str): pda5284 base URL.
+        bucket (token_bucket): Rate limit of the page fetches; None fetches unthrottled.
+        workers (int): Pages fetched at the same time.
+        timeout (float): Request timeout in seconds.
+
+    Returns:
+        dict: {route_id: {stop_id: location_id}}, IDs as strings. Routes and stops
+            whose page could not be read are logged and left out.
+    """
+    session = session or create_session(workers)
+
+    def fetch(url: str) -> str:
+        if bucket is not None:
+            bucket.acquire()
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+        return response.text
+
+    def route_stop_ids(route_id):
+        try:
+            go, back = parse_route_stops(fetch(f'{base_url}/MQS/route.jsp?rid={route_id}'))
+        except Exception as e:
+            print(f"Failed to read route {route_id}: {e}")
+            return None
+        return [str(stop.stop_id) for stop in go + back if stop.stop_id is not None]
+
+    def location_of(stop_id):
+        try:
+            match = STOP_LOCATION_PATTERN.search(fetch(f'{base_url}/MQS/stop.jsp?sid={stop_id}'))
+        except Exception as e:
+            print(f"Failed to read stop {stop_id}: {e}")
+            return None
+        return match.group(1) if match else None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        stops = {route_id: ids
+                 for route_id, ids in zip(route_ids, executor.map(route_stop_ids, route_ids))
+                 if ids is not None}
+        stop_ids = list(dict.fromkeys(stop_id for ids in stops.values() for stop_id in ids))
+        locations = dict(zip(stop_ids, executor.map(location_of, stop_ids)))
+
+    return {route_id: {stop_id: locations[stop_id] for stop_id in ids if locations[stop_id]}
+            for route_id, ids in stops.items()}
+
+
+def poll_targets(route_locations: dict) -> dict:
+    """
+    Inverts discover_stop_locations() output into {location_id: {stop_id: route_id}},
+    with integer IDs.
+    """
+    targets = {}
+    for route_id, stops in route_locations.items():
+        for stop_id, location_id in stops.items():
+            targets.setdefault(int(location_id), {})[int(stop_id)] = int(route_id)
+    return targets
+
+
+class lag_window:
+    """
+    The most recent `size` samples of a lag, for percentiles that follow the current load.
+    """
+
+    def __init__(self, size: int = LAG_WINDOW):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns the q-th percentile (0-100) of the window, in seconds.
+        """
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class arrival_poller:
+    """
+    Polls a set of stop locations on a schedule and stores every estimate.
+    """
+
+    def __init__(self, targets: dict, store: arrival_store, interval: float = DEFAULT_INTERVAL,
+                 schedule=None, rate: float = DEFAULT_RATE, workers: int = DEFAULT_WORKERS,
+                 bucket: token_bucket = None, session=None, base_url: str = PDA5284_BASE_URL,
+                 timeout: float = REQUEST_TIMEOUT, batch_size: int = 5000,
+                 flush_interval: float = 1.0):
+        """
+        Args:
+            targets (dict): {location_id: {stop_id: route_id}}, see poll_targets().
+            store (arrival_store): Store the estimates are appended to.
+            interval (float): Seconds over which the first polls are spread, and between
+                two polls of a location when no schedule is given.
+            schedule (fixed_schedule | adaptive_schedule): Decides when a location is
+                polled next. Defaults to fixed_schedule(interval).
+            rate (float): Requests per second, when no bucket is given.
+            workers (int): Requests in flight at most.
+            bucket (token_bucket): Shared rate limit, e.g. with other pollers of the site.
+            session (requests.Session): Session to poll with. Defaults to a new one.
+            base_url (str): pda5284 base URL.
+            timeout (float): Request timeout in seconds.
+            batch_size (int): Rows per store append at most.
+            flush_interval (float): Seconds the writer collects rows before appending.
+
+        Raises:
+            ValueError: If there is nothing to poll.
+        """
+        if not targets:
+            raise ValueError("No stop locations to poll")
+
+        self.targets = targets
+        self.store = store
+        self.interval = interval
+        self.schedule = schedule or fixed_schedule(interval)
+        self.workers = workers
+        self.bucket = bucket or token_bucket(rate)
+        self.session = session or create_session(workers)
+        self.base_url = base_url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.schedule_lag = lag_window()
+        self.fetch_latency = lag_window()
+        self.data_age = lag_window()
+        self.write_lag = lag_window()
+        self.refresh = lag_window()
+        self.imminent_refresh = lag_window()
+
+        self._counts = {"polls": 0, "errors": 0, "rows_written": 0}
+        self._recent = deque()
+        self._last_error = None
+        self._write_error = None
+        self._last_poll = {}
+        self._in_flight = set()
+        self._pending = []
+        self._started = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._rows = queue.Queue()
+
+    def stop(self):
+        """
+        Ends `run` after the polls in flight; safe to call from a signal handler.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+
+    def _poll(self, location_id: int, due: float) -> tuple:
+        """
+        Polls one location.
+
+        Returns:
+            tuple: (time the request was sent, ETAs of the configured stops or None
+                if the poll failed).
+        """
+        self.bucket.acquire()
+        sent = time.monotonic()
+        self.schedule_lag.record(sent - due)
+        polled_at = time.time()
+
+        try:
+            response = self.session.get(
+                f'{self.base_url}/MQS/StopLocationDyna?stoplocationid={location_id}',
+                timeout=self.timeout)
+            response.raise_for_status()
+            updated_at, estimates = parse_stop_dyna(response.json())
+        except Exception as e:
+            with self._lock:
+                self._counts["errors"] += 1
+                self._last_error = f"location {location_id}: {e}"
+            return sent, None
+        finally:
+            self.fetch_latency.record(time.monotonic() - sent)
+
+        if updated_at is not None:
+            self.data_age.record(polled_at - updated_at)
+        stops = self.targets[location_id]
+        rows = [(int(polled_at), stop_id, stops[stop_id], eta, departure, updated_at)
+                for stop_id, eta, departure in estimates if stop_id in stops]
+        self._rows.put((time.monotonic(), rows))
+        etas = [eta for stop_id, eta, _ in estimates if stop_id in stops]
+
+        with self._lock:
+            self._counts["polls"] += 1
+            self._recent.append((sent, len(rows)))
+            previous = self._last_poll.get(location_id)
+            self._last_poll[location_id] = (sent, is_imminent(etas))
+        if previous is not None:
+            self.refresh.record(sent - previous[0])
+            if previous[1]:
+                self.imminent_refresh.record(sent - previous[0])
+        return sent, etas
+
+    def _done(self, future, location_id: int, due: float):
+        try:
+            sent, etas = future.result()
+        except Exception as e:
+            sent, etas = time.monotonic(), None
+            with self._lock:
+                self._counts["errors"] += 1
+                self._last_error = f"location {location_id}: {e}"
+
+        with self._lock:
+            self._in_flight.discard(location_id)
+            self._pending.append((self.schedule.next_poll(due, sent, etas), location_id))
+        self._wakeup.set()
+
+    def _write_loop(self):
+        finished = False
+        while not finished:
+            item = self._rows.get()
+            batch, queued_at = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    finished = True
+                    break
+                queued_at.append(item[0])
+                batch.extend(item[1])
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._rows.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self.store.append(batch)
+                except Exception as e:
+                    # Polling on without a store would only queue rows forever; run() re-raises
+                    with self._lock:
+                        self._write_error = e
+                        self._last_error = f"store: {e}"
+                    self.stop()
+                    return
+            now = time.monotonic()
+            for queued in queued_at:
+                self.write_lag.record(now - queued)
+            with self._lock:
+                self._counts["rows_written"] += len(batch)
+
+    def run(self, duration: float = None, report_every: float = None, report=print) -> dict:
+        """
+        Polls until `stop` is called or `duration` seconds have passed.
+
+        The first polls are spread evenly over `interval`. Each later poll of a location
+        is due when the schedule says, counted from the poll before it; a location is
+        never polled twice at the same time.
+
+        Args:
+            duration (float): Seconds to run; None runs until `stop`.
+            report_every (float): Seconds between calls of `report` with `metrics()`.
+            report (callable): Receives the metrics dictionary.
+
+        Returns:
+            dict: Final `metrics()`.
+
+        Raises:
+            Exception: Whatever the store raised if appending estimates failed; polling
+                stops at the first failed append.
+        """
+        self._stopping.clear()
+        self._write_error = None
+        self._started = time.monotonic()
+        end = self._started + duration if duration is not None else None
+        next_report = self._started + report_every if report_every else None
+        step = self.interval / len(self.targets)
+        heap = [(self._started + index * step, location_id)
+                for index, location_id in enumerate(self.targets)]
+
+        writer = threading.Thread(target=self._write_loop, daemon=True)
+        writer.start()
+        slots = threading.BoundedSemaphore(self.workers)
+
+        def finished(future, location_id, due):
+            self._done(future, location_id, due)
+            slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self._stopping.is_set():
+                with self._lock:
+                    for entry in self._pending:
+                        heapq.heappush(heap, entry)
+                    self._pending.clear()
+                    self._wakeup.clear()
+
+                now = time.monotonic()
+                if next_report is not None and now >= next_report:
+                    report(self.metrics())
+                    next_report += report_every
+                if end is not None and now >= end:
+                    break
+
+                if not heap or heap[0][0] > now:
+                    wake = [moment for moment in (heap[0][0] if heap else None, end, next_report)
+                            if moment is not None]
+                    self._wakeup.wait(max(0.0, min(wake) - now) if wake else None)
+                    continue
+
+                due, location_id = heapq.heappop(heap)
+                with self._lock:
+                    self._in_flight.add(location_id)
+                slots.acquire()
+                executor.submit(self._poll, location_id, due).add_done_callback(
+                    lambda future, location_id=location_id, due=due:
+                        finished(future, location_id, due))
+
+        self._rows.put(None)
+        writer.join()
+        if self._write_error is not None:
+            raise self._write_error
+        return self.metrics()
+
+    def metrics(self) -> dict:
+        """
+        Returns counters, throughput over the last minute and lag and refresh percentiles
+        (seconds).
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW:
+                self._recent.popleft()
+            recent_polls = len(self._recent)
+            recent_stops = sum(rows for _, rows in self._recent)
+            counts = dict(self._counts)
+            in_flight = len(self._in_flight)
+            last_error = self._last_error
+
+        window = min(THROUGHPUT_WINDOW, now - self._started) if self._started else 0.0
+        per_minute = 60.0 / window if window > 0 else 0.0
+        return {
+            "locations": len(self.targets),
+            "stops": sum(len(stops) for stops in self.targets.values()),
+            **counts,
+            "skipped": self.schedule.skipped,
+            "polls_per_min": recent_polls * per_minute,
+            "stops_per_min": recent_stops * per_minute,
+            "schedule_lag_p50": self.schedule_lag.percentile(50),
+            "schedule_lag_p99": self.schedule_lag.percentile(99),
+            "schedule_lag_max": self.schedule_lag.percentile(100),
+            "fetch_p50": self.fetch_latency.percentile(50),
+            "fetch_p99": self.fetch_latency.percentile(99),
+            "data_age_p50": self.data_age.percentile(50),
+            "write_lag_p99": self.write_lag.percentile(99),
+            "refresh_p50": self.refresh.percentile(50),
+            "imminent_refresh_p50": self.imminent_refresh.percentile(50),
+            "imminent_refresh_p95": self.imminent_refresh.percentile(95),
+            "write_queue": self._rows.qsize(),
+            "in_flight": in_flight,
+            "rate_limit_wait": self.bucket.waited,
+            "last_error": last_error,
+        }
+
+    def serve_metrics(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """
+        Serves `metrics()` as JSON on http://host:port/ from a background thread.
+
+        Returns:
+            ThreadingHTTPServer: Call shutdown() on it to stop serving.
+        """
+        poller = self
+
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(poller.metrics()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def format_metrics(metrics: dict) -> str:
+    """
+    Returns the metrics as one log line.
+    """
+    return (f"{metrics['polls']} polls, {metrics['errors']} errors, {metrics['skipped']} skipped, "
+            f"{metrics['rows_written']} rows | {metrics['stops_per_min']:.0f} stops/min | "
+            f"lag p50 {metrics['schedule_lag_p50']:.2f}s p99 {metrics['schedule_lag_p99']:.2f}s | "
+            f"fetch p99 {metrics['fetch_p99'] * 1000:.0f}ms | "
+            f"write lag p99 {metrics['write_lag_p99']:.2f}s | "
+            f"refresh p50 {metrics['refresh_p50']:.0f}s, "
+            f"imminent p95 {metrics['imminent_refresh_p95']:.0f}s")
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps the arrival estimates collected by the arrival_poller as an
+append-only time series, one SQLite file per service day (Taipei time):
+
+    <directory>/arrivals_<YYYYMMDD>.sqlite3
+
+Every value is stored as an integer, so a row takes a few varint-encoded bytes:
+
+    polled_at    epoch seconds the estimate was fetched
+    stop_id      pda5284 stop ID (sid)
+    route_id     pda5284 route ID (rid)
+    eta          seconds until the bus arrives, or one of the ETA_STATUS codes
+    departure    scheduled departure from the terminal, minutes after midnight, or NULL
+    updated_at   epoch seconds of the server's data, or NULL
+
+A day is written only while it is current and can be archived or deleted as a whole
+file afterwards.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Taiwan has no daylight saving time, so a fixed offset is exact
+TAIPEI = timezone(timedelta(hours=8))
+ARRIVAL_COLUMNS = ["polled_at", "stop_id", "route_id", "eta", "departure", "updated_at"]
+# Negative eta values, as the pda5284 stop page labels them
+ETA_STATUS = {
+    -1: '未發車',
+    -2: '交管不停',
+    -3: '末班已過',
+    -4: '今日未營運',
+}
+OPEN_DAYS = 2
+
+_DAY_FILE = re.compile(r'arrivals_(\d{8})\.sqlite3$')
+
+
+def service_day(epoch_seconds: float) -> str:
+    """
+    Returns the Taipei date of a timestamp as YYYYMMDD.
+    """
+    return datetime.fromtimestamp(epoch_seconds, TAIPEI).strftime('%Y%m%d')
+
+
+class arrival_store:
+    """
+    Day-partitioned, append-only store of arrival estimates.
+    """
+
+    def __init__(self, directory: str = os.path.join('data', 'arrivals')):
+        """
+        Args:
+            directory (str): Directory holding one SQLite file per day.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def path(self, day: str) -> str:
+        return os.path.join(self.directory, f'arrivals_{day}.sqlite3')
+
+    def days(self) -> list:
+        """
+        Returns the stored days (YYYYMMDD), oldest first.
+        """
+        return sorted(match.group(1) for match in map(_DAY_FILE.match, os.listdir(self.directory))
+                      if match)
+
+    def _connection(self, day: str) -> sqlite3.Connection:
+        connection = self._connections.get(day)
+        if connection is not None:
+            return connection
+
+        connection = sqlite3.connect(self.path(day), check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS arrival ('
+            'polled_at INTEGER NOT NULL, stop_id INTEGER NOT NULL, route_id INTEGER, '
+            'eta INTEGER, departure INTEGER, updated_at INTEGER)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_arrival_stop_polled '
+                           'ON arrival (stop_id, polled_at)')
+        self._connections[day] = connection
+
+        # Only the current day (and the one before, around midnight) is still written
+        for old_day in sorted(self._connections)[:-OPEN_DAYS]:
+            self._connections.pop(old_day).close()
+        return connection
+
+    def append(self, rows) -> int:
+        """
+        Appends rows in ARRIVAL_COLUMNS order, each to the file of its polled_at day.
+
+        Returns:
+            int: Number of rows written.
+        """
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(service_day(row[0]), []).append(row)
+
+        with self._lock:
+            for day, day_rows in by_day.items():
+                connection = self._connection(day)
+                with connection:
+                    connection.executemany('INSERT INTO arrival VALUES (?, ?, ?, ?, ?, ?)', day_rows)
+        return sum(len(day_rows) for day_rows in by_day.values())
+
+    def read(self, day: str, stop_ids: list = None, since: float = None,
+             until: float = None) -> 'pd.DataFrame':
+        """
+        Returns the stored estimates of one day, ordered by polled_at.
+
+        Args:
+            day (str): YYYYMMDD.
+            stop_ids (list): Only these stops.
+            since (float): Only rows with polled_at >= since (epoch seconds).
+            until (float): Only rows with polled_at < until.
+
+        Raises:
+            FileNotFoundError: If nothing was stored for the day.
+        """
+        import pandas as pd
+
+        path = self.path(day)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No arrivals stored for {day}: {path}")
+
+        conditions, params = [], []
+        if stop_ids:
+            conditions.append(f"stop_id IN ({', '.join('?' * len(stop_ids))})")
+            params.extend(int(stop_id) for stop_id in stop_ids)
+        if since is not None:
+            conditions.append('polled_at >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('polled_at < ?')
+            params.append(until)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            return pd.read_sql_query(f"SELECT * FROM arrival{where} ORDER BY polled_at",
+                                     connection, params=params)
+        finally:
+            connection.close()
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
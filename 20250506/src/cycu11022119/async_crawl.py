@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+This module crawls many Taipei eBus routes concurrently with Playwright's async API.
+Pages are rendered in one shared browser, parsed with taipei_route_info and written
+to the SQLite database, with a global and a per-host cap on in-flight requests.
+"""
+
+import asyncio
+import functools
+import time
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+
+from cycu11022119.ebus_taipei import (
+    COME_TAB_SELECTOR, ROUTE_URL, default_readiness, readiness_strategy, route_snapshot_key,
+    station_list_fingerprint, taipei_route_info, taipei_route_list
+)
+from cycu11022119.fetch_profile import default_profile, fetch_profile
+from cycu11022119.repository import get_repository
+from cycu11022119.route_parser import DIRECTION_CONTAINERS
+from cycu11022119.snapshot_store import snapshot_store
+
+
+class crawl_report:
+    """
+    Collects per-route outcomes and throughput for one crawl.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.succeeded = []
+        self.failed = {}
+        self.unchanged = []
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def routes_per_sec(self) -> float:
+        done = len(self.succeeded) + len(self.failed)
+        return done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"{len(self.succeeded)} routes ok ({len(self.unchanged)} unchanged), "
+                f"{len(self.failed)} failed in {self.elapsed:.1f}s "
+                f"({self.routes_per_sec:.2f} routes/sec)")
+
+
+class _host_limiter:
+    """
+    Hands out one semaphore per host so no single site sees more than `per_host` requests.
+    """
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._semaphores[host]
+
+
+async def _render_route(context, url: str, directions, readiness: readiness_strategy,
+                        profile: fetch_profile) -> dict:
+    # One page load serves every requested direction. The come list is read after its
+    # tab is clicked, since the page only fills in the arrival times of the visible
+    # list; one-way and loop routes have no come list to switch to.
+    page = await context.new_page()
+    try:
+        await profile.prepare_async(page)
+        token = profile.begin(page)
+        await readiness.load_async(page, lambda: page.goto(url))
+
+        contents = {'go': await page.content()}
+        if 'come' in directions and DIRECTION_CONTAINERS['come'] in contents['go']:
+            await readiness.load_async(page, lambda: page.click(COME_TAB_SELECTOR))
+            contents['come'] = await page.content()
+        profile.end(page, url, token)
+        return contents
+    finally:
+        await page.close()
+
+
+async def _crawl_route(route_id, directions, context, slots, host_limit, readiness, profile,
+                       write_lock, working_directory, route_list, snapshots, report):
+    try:
+        url = ROUTE_URL.format(route_id=route_id)
+        async with slots, host_limit(url):
+            contents = await _render_route(context, url, directions, readiness, profile)
+
+        # One fingerprint per page; only a changed page is parsed
+        marker = None
+        if snapshots is not None:
+            marker = snapshots.check(route_snapshot_key(route_id), contents['go'],
+                                     station_list_fingerprint)
+        unchanged = snapshots is not None and marker is None
+        if not unchanged:
+            for direction in directions:
+                if direction not in contents:
+                    continue  # no come list on the page, so it was not rendered
+                route_info = taipei_route_info(route_id, direction=direction,
+                                               working_directory=working_directory,
+                                               content=contents[direction])
+                # One-way and loop routes have no come direction; that is not a failure
+                if route_info.parse_route_info(required=direction == 'go') is None:
+                    continue
+
+                # SQLite allows one writer, so writes are serialized but kept off the event loop
+                async with write_lock:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, functools.partial(route_info.save_to_database, diff=True))
+
+            # Snapshotted only once the stops are written, so a failed write is retried
+            if snapshots is not None:
+                snapshots.put(route_snapshot_key(route_id), contents['go'], station_list_fingerprint,
+                              marker=marker)
+                if 'come' in contents:
+                    snapshots.put(route_snapshot_key(route_id, 'come'), contents['come'],
+                                  station_list_fingerprint)
+
+        # route_list's session belongs to the loop thread, so status flags are set inline
+        if route_list is not None:
+            async with write_lock:
+                route_list.set_route_data_updated(route_id)
+        report.succeeded.append(route_id)
+        if unchanged:
+            report.unchanged.append(route_id)
+    except Exception as e:
+        report.failed[route_id] = str(e)
+        if route_list is not None:
+            async with write_lock:
+                route_list.set_route_data_unexcepted(route_id)
+
+
+async def crawl_routes(route_ids, directions=('go', 'come'), concurrency: int = 8,
+                       per_host: int = 4, working_directory: str = 'data',
+                       route_list: taipei_route_list = None, headless: bool = True,
+                       readiness: readiness_strategy = None,
+                       snapshots: snapshot_store = None,
+                       profile: fetch_profile = None) -> crawl_report:
+    """
+    Fetches, parses and stores many routes at once.
+
+    Args:
+        route_ids (iterable): Route IDs to crawl.
+        directions (tuple): Directions to fetch for every route.
+        concurrency (int): Maximum number of pages rendering at the same time.
+        per_host (int): Maximum number of in-flight requests against a single host.
+        working_directory (str): Directory holding the SQLite database.
+        route_list (taipei_route_list): If given, route_data_updated is set to 1 on success
+            and 2 on failure for every crawled route.
+        headless (bool): Whether Chromium runs headless.
+        readiness (readiness_strategy): How to decide a page has rendered. Defaults to
+            `default_readiness`, whose stats then cover this crawl.
+        snapshots (snapshot_store): If given, every render is snapshotted and routes
+            whose station lists are unchanged are neither parsed nor written.
+        profile (fetch_profile): Which requests pages may make. Defaults to
+            `default_profile`.
+
+    Returns:
+        crawl_report: Outcome and throughput of the crawl.
+    """
+    report = crawl_report()
+    slots = asyncio.Semaphore(concurrency)
+    host_limit = _host_limiter(per_host)
+    write_lock = asyncio.Lock()
+    readiness = readiness or default_readiness
+    profile = profile or default_profile
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        context = await browser.new_context()
+        try:
+            await asyncio.gather(*(
+                _crawl_route(route_id, directions, context, slots, host_limit, readiness, profile,
+                             write_lock, working_directory, route_list, snapshots, report)
+                for route_id in route_ids
+            ))
+        finally:
+            await context.close()
+            await browser.close()
+            if snapshots is not None:
+                snapshots.flush()
+
+    get_repository(working_directory).analyze()
+
+    report.stop()
+    return report
+
+
+def crawl(route_ids, **kwargs) -> crawl_report:
+    """
+    Synchronous wrapper around `crawl_routes`.
+    """
+    return asyncio.run(crawl_routes(route_ids, **kwargs))
+
+
+if __name__ == "__main__":
+    route_list = taipei_route_list()
+    route_list.parse_route_list()
+    route_list.save_to_database()
+
+    report = crawl(route_list.dataframe["route_id"].tolist(), route_list=route_list,
+                   snapshots=snapshot_store())
+    print(report)
+    print(f"Page readiness latency: {default_readiness.stats.summary()}")
+    for route_id, error in report.failed.items():
+        print(f"Error processing route {route_id}: {error}")
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps a long-lived Playwright Chromium instance and a small pool of
+browser contexts, so that route objects can borrow a ready page instead of
+launching and tearing down a whole browser for every fetch.
+"""
+
+from contextlib import contextmanager
+
+
+class browser_pool:
+    """
+    Owns one Chromium browser and hands out pages from a bounded pool of contexts.
+
+    Each slot is a (context, page) pair. A slot is recycled (its context closed and
+    a fresh one opened) once its page has served `max_navigations` navigations, which
+    keeps memory growth and stale cookies/caches bounded during long crawls.
+    """
+
+    def __init__(self, pool_size: int = 2, max_navigations: int = 50, headless: bool = True):
+        """
+        Initializes the pool. The browser itself is started lazily on first use.
+
+        Args:
+            pool_size (int): Maximum number of contexts/pages kept alive at once.
+            max_navigations (int): Number of navigations after which a page is recycled.
+            headless (bool): Whether Chromium runs headless.
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        if max_navigations < 1:
+            raise ValueError("max_navigations must be at least 1")
+
+        self.pool_size = pool_size
+        self.max_navigations = max_navigations
+        self.headless = headless
+
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._in_use = {}
+        self.pages_created = 0
+        self.pages_recycled = 0
+
+    def start(self):
+        """
+        Starts Playwright and launches the shared Chromium browser.
+        """
+        if self._browser is None:
+            from playwright.sync_api import sync_playwright
+
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=self.headless)
+        return self
+
+    def _new_slot(self) -> dict:
+        context = self._browser.new_context()
+        page = context.new_page()
+        self.pages_created += 1
+        return {"context": context, "page": page, "navigations": 0}
+
+    def acquire(self):
+        """
+        Borrows a page from the pool, opening a new context if the pool is not full.
+
+        Returns:
+            playwright.sync_api.Page: A page ready for navigation.
+
+        Raises:
+            RuntimeError: If all `pool_size` pages are already borrowed.
+        """
+        self.start()
+
+        if self._idle:
+            slot = self._idle.pop()
+        elif len(self._in_use) < self.pool_size:
+            slot = self._new_slot()
+        else:
+            raise RuntimeError(f"Browser pool exhausted ({self.pool_size} pages in use)")
+
+        self._in_use[id(slot["page"])] = slot
+        return slot["page"]
+
+    def release(self, page):
+        """
+        Returns a borrowed page to the pool, recycling it after `max_navigations` uses.
+
+        Args:
+            page (playwright.sync_api.Page): A page previously returned by `acquire`.
+        """
+        slot = self._in_use.pop(id(page))
+        slot["navigations"] += 1
+
+        if slot["navigations"] >= self.max_navigations or page.is_closed():
+            slot["context"].close()
+            self.pages_recycled += 1
+            return
+
+        self._idle.append(slot)
+
+    @contextmanager
+    def page(self):
+        """
+        Context manager that borrows a page and always hands it back.
+
+        Yields:
+            playwright.sync_api.Page: A page ready for navigation.
+        """
+        page = self.acquire()
+        try:
+            yield page
+        finally:
+            self.release(page)
+
+    def close(self):
+        """
+        Closes every context, the browser and the Playwright driver.
+        """
+        for slot in self._idle + list(self._in_use.values()):
+            slot["context"].close()
+        self._idle = []
+        self._in_use = {}
+
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
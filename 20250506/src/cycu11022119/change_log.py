@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+This module compares a freshly parsed stop list of one route direction with the rows
+stored for it. It yields the change events for data_route_change_log and the minimal
+writes that bring data_route_info_busstop up to date, so an unchanged route costs a
+read and no write.
+
+Stops are matched by stop_id. A stop that appears twice in a direction (loop routes)
+is matched by occurrence, the first with the first and so on.
+"""
+
+from collections import defaultdict
+
+INSERTED, REMOVED, MOVED, UPDATED = 'inserted', 'removed', 'moved', 'updated'
+
+# Fields that define a stop; arrival_info is live data and not a change of the route
+STOP_IDENTITY_FIELDS = ["stop_id", "stop_name", "latitude", "longitude"]
+
+
+def _by_occurrence(rows: list) -> dict:
+    seen = defaultdict(int)
+    keyed = {}
+    for row in sorted(rows, key=lambda row: row["stop_number"]):
+        keyed[(row["stop_id"], seen[row["stop_id"]])] = row
+        seen[row["stop_id"]] += 1
+    return keyed
+
+
+def _event(change: str, row: dict, old_stop_number: int = None) -> dict:
+    return {
+        "route_id": row["route_id"],
+        "direction": row["direction"],
+        "change": change,
+        "stop_id": row["stop_id"],
+        "stop_name": row["stop_name"],
+        "old_stop_number": old_stop_number,
+        "stop_number": None if change == REMOVED else row["stop_number"],
+        "latitude": row["latitude"],
+        "longitude": row["longitude"],
+    }
+
+
+def diff_route_stops(stored: list, fresh: list) -> tuple:
+    """
+    Diffs the stops of one route direction.
+
+    Args:
+        stored (list): Row dictionaries currently in data_route_info_busstop.
+        fresh (list): Row dictionaries of the new parse, as from bus_stop_records().
+
+    Returns:
+        tuple: (events, upserts, deleted_stop_numbers)
+            events: change-log rows ('inserted', 'removed', 'moved' when the stop
+                changed position, 'updated' when its name or coordinates changed).
+            upserts: fresh rows whose stop_number slot holds a different stop now.
+            deleted_stop_numbers: stored stop_numbers past the end of the new list.
+    """
+    old, new = _by_occurrence(stored), _by_occurrence(fresh)
+
+    events = []
+    for key, row in new.items():
+        previous = old.get(key)
+        if previous is None:
+            events.append(_event(INSERTED, row))
+        elif previous["stop_number"] != row["stop_number"]:
+            events.append(_event(MOVED, row, previous["stop_number"]))
+        elif any(previous[field] != row[field] for field in STOP_IDENTITY_FIELDS):
+            events.append(_event(UPDATED, row, previous["stop_number"]))
+    for key, row in old.items():
+        if key not in new:
+            events.append(_event(REMOVED, row, row["stop_number"]))
+
+    old_slots = {row["stop_number"]: row for row in stored}
+    new_slots = {row["stop_number"]: row for row in fresh}
+    upserts = [
+        row for number, row in new_slots.items()
+        if number not in old_slots
+        or any(old_slots[number][field] != row[field] for field in STOP_IDENTITY_FIELDS)
+    ]
+    deleted_stop_numbers = sorted(set(old_slots) - set(new_slots))
+    return events, upserts, deleted_stop_numbers
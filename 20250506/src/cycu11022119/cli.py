@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line entry point (`cycu11022119`) for querying the hermes database, running
+crawls and polling arrival estimates. Query commands only load SQLAlchemy; pandas and
+Playwright are imported by the crawl command alone, so cron-driven lookups start quickly.
+"""
+
+import argparse
+import sys
+
+
+def _routes(args):
+    from cycu11022119.repository import bus_route_orm, get_repository
+
+    session = get_repository(args.working_directory, readonly=True).session()
+    query = session.query(bus_route_orm.route_id, bus_route_orm.route_name,
+                          bus_route_orm.route_data_updated).order_by(bus_route_orm.route_id)
+    if args.status is not None:
+        query = query.filter(bus_route_orm.route_data_updated == args.status)
+    if args.limit is not None:
+        query = query.limit(args.limit)
+
+    for route_id, route_name, route_data_updated in query:
+        print(f"{route_id}\t{route_name}\t{route_data_updated}")
+    session.close()
+
+
+def _stops(args):
+    from cycu11022119.repository import bus_stop_orm, get_repository
+
+    session = get_repository(args.working_directory, readonly=True).session()
+    query = (
+        session.query(bus_stop_orm.direction, bus_stop_orm.stop_number, bus_stop_orm.stop_id,
+                      bus_stop_orm.stop_name, bus_stop_orm.latitude, bus_stop_orm.longitude)
+        .filter(bus_stop_orm.route_id == args.route_id)
+        .order_by(bus_stop_orm.direction.desc(), bus_stop_orm.stop_number)
+    )
+    if args.direction is not None:
+        query = query.filter(bus_stop_orm.direction == args.direction)
+
+    rows = query.all()
+    session.close()
+    if not rows:
+        print(f"No stops stored for route ID {args.route_id}", file=sys.stderr)
+        return 1
+
+    for row in rows:
+        print('\t'.join(str(value) for value in row))
+
+
+def _find_stop(args):
+    from cycu11022119.repository import bus_stop_orm, get_repository
+
+    session = get_repository(args.working_directory, readonly=True).session()
+    query = (
+        session.query(bus_stop_orm.route_id, bus_stop_orm.direction, bus_stop_orm.stop_number)
+        .filter(bus_stop_orm.stop_name == args.stop_name)
+        .order_by(bus_stop_orm.route_id, bus_stop_orm.direction)
+    )
+    for route_id, direction, stop_number in query:
+        print(f"{route_id}\t{direction}\t{stop_number}")
+    session.close()
+
+
+def _changes(args):
+    from cycu11022119.repository import get_repository, route_change_orm
+
+    repository = get_repository(args.working_directory, readonly=True)
+    if not repository.has_table(route_change_orm):
+        return  # no crawl has logged changes into this database yet
+    session = repository.session()
+    query = session.query(route_change_orm).order_by(route_change_orm.id)
+    if args.route_id is not None:
+        query = query.filter(route_change_orm.route_id == args.route_id)
+    if args.since is not None:
+        query = query.filter(route_change_orm.crawled_at >= args.since)
+
+    for event in query:
+        print(f"{event.crawled_at}\t{event.route_id}\t{event.direction}\t{event.change}\t"
+              f"{event.stop_id}\t{event.stop_name}\t{event.old_stop_number}\t{event.stop_number}")
+    session.close()
+
+
+def _export_parquet(args):
+    from cycu11022119.columnar_store import export_parquet
+
+    counts = export_parquet(args.working_directory, args.target)
+    print(f"Exported {counts['routes']} routes and {counts['stops']} stops.")
+
+
+def _crawl(args):
+    import functools
+
+    from cycu11022119.browser_pool import browser_pool
+    from cycu11022119.crawl_queue import crawl_queue, crawl_route, run_queue
+    from cycu11022119.repository import get_repository
+    from cycu11022119.snapshot_store import snapshot_store
+
+    queue = crawl_queue(args.working_directory)
+    if queue.begin_cycle():
+        print("Starting a new refresh cycle.")
+    else:
+        print("Resuming the unfinished refresh cycle.")
+
+    snapshots = snapshot_store(args.working_directory)
+    repository = get_repository(args.working_directory)
+
+    with browser_pool(pool_size=1) as pool, snapshots:
+        process_route = functools.partial(crawl_route, pool=pool, snapshots=snapshots,
+                                          repository=repository)
+        print(run_queue(queue, process_route, wait_for_retries=not args.no_wait))
+    repository.analyze()
+    queue.close()
+
+
+def _poll(args):
+    import json
+    import os
+    import signal
+
+    from cycu11022119.arrival_poller import (arrival_poller, create_session,
+                                             discover_stop_locations, format_metrics,
+                                             poll_targets)
+    from cycu11022119.arrival_store import arrival_store
+    from cycu11022119.poll_schedule import adaptive_schedule, fixed_schedule
+    from cycu11022119.rate_limit import token_bucket
+
+    # Discovery and polling share one rate limit and one connection pool
+    bucket = token_bucket(args.rate)
+    session = create_session(args.workers)
+
+    store_directory = os.path.join(args.working_directory, 'arrivals')
+    os.makedirs(store_directory, exist_ok=True)
+    locations_file = os.path.join(store_directory, 'stop_locations.json')
+    route_locations = {}
+    if os.path.exists(locations_file):
+        with open(locations_file, encoding='utf-8') as file:
+            route_locations = json.load(file)
+
+    missing = [route_id for route_id in args.route_ids if route_id not in route_locations]
+    if missing:
+        print(f"Resolving the stop locations of {len(missing)} routes...")
+        route_locations.update(discover_stop_locations(missing, session, bucket=bucket,
+                                                       workers=args.workers))
+        with open(locations_file, 'w', encoding='utf-8') as file:
+            json.dump(route_locations, file)
+
+    # Routes that failed to resolve are not cached, so the next run tries them again
+    targets = poll_targets({route_id: route_locations[route_id] for route_id in args.route_ids
+                            if route_id in route_locations})
+    if not targets:
+        print("No stop locations found for the given routes.", file=sys.stderr)
+        return 1
+
+    if args.adaptive:
+        schedule = adaptive_schedule(args.min_interval, args.max_interval)
+    else:
+        schedule = fixed_schedule(args.interval)
+
+    with arrival_store(store_directory) as store:
+        poller = arrival_poller(targets, store, interval=args.interval, schedule=schedule,
+                                workers=args.workers, bucket=bucket, session=session)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: poller.stop())
+        if args.metrics_port is not None:
+            poller.serve_metrics(args.metrics_port)
+
+        every = (f"every {args.min_interval:g}-{args.max_interval:g}s by ETA" if args.adaptive
+                 else f"every {args.interval:g}s")
+        print(f"Polling {len(targets)} stop locations "
+              f"({sum(len(stops) for stops in targets.values())} stops) {every}.")
+        metrics = poller.run(args.duration, args.report_every,
+                             lambda metrics: print(format_metrics(metrics), flush=True))
+    print(format_metrics(metrics))
+
+
+def _archive_import(args):
+    import glob
+    import os
+
+    from cycu11022119.snapshot_archive import snapshot_archive
+
+    paths = []
+    for path in args.paths:
+        paths.extend(sorted(glob.glob(os.path.join(path, '*.html'))) if os.path.isdir(path) else [path])
+    with snapshot_archive(os.path.join(args.working_directory, 'snapshot_archive.sqlite3')) as archive:
+        archived = archive.import_files(paths)
+        stats = archive.stats()
+    print(f"Archived {archived} of {len(paths)} files; {stats['snapshots']} snapshots, "
+          f"{stats['raw_bytes'] / 2 ** 20:.1f} MiB stored in {stats['stored_bytes'] / 2 ** 20:.1f} MiB "
+          f"({stats['ratio']:.1f}x)")
+
+
+def _archive_get(args):
+    import os
+
+    from cycu11022119.snapshot_archive import snapshot_archive
+
+    with snapshot_archive(os.path.join(args.working_directory, 'snapshot_archive.sqlite3')) as archive:
+        content = archive.get(args.kind, args.key, args.at)
+    if content is None:
+        print(f"No {args.kind} snapshot of {args.key}", file=sys.stderr)
+        return 1
+    sys.stdout.write(content)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Returns the argument parser of the `cycu11022119` command.
+    """
+    parser = argparse.ArgumentParser(prog='cycu11022119',
+                                     description="Query and refresh the Taipei eBus database.")
+    parser.add_argument('-d', '--working-directory', default='data',
+                        help="Directory holding the SQLite database (default: data)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    routes = commands.add_parser('routes', help="List stored routes")
+    routes.add_argument('--status', type=int, choices=[0, 1, 2],
+                        help="Only routes with this route_data_updated value")
+    routes.add_argument('--limit', type=int)
+    routes.set_defaults(handler=_routes)
+
+    stops = commands.add_parser('stops', help="List the stops of a route")
+    stops.add_argument('route_id')
+    stops.add_argument('--direction', choices=['go', 'come'])
+    stops.set_defaults(handler=_stops)
+
+    find_stop = commands.add_parser('find-stop', help="List routes serving a stop name")
+    find_stop.add_argument('stop_name')
+    find_stop.set_defaults(handler=_find_stop)
+
+    changes = commands.add_parser('changes', help="Show the logged stop changes")
+    changes.add_argument('--route-id')
+    changes.add_argument('--since', help="ISO timestamp, e.g. 2025-05-06 or 2025-05-06T08:00")
+    changes.set_defaults(handler=_changes)
+
+    export = commands.add_parser('export-parquet',
+                                 help="Export the tables to Parquet, stops partitioned by route")
+    export.add_argument('--target', help="Output directory (default: <working directory>/parquet)")
+    export.set_defaults(handler=_export_parquet)
+
+    crawl = commands.add_parser('crawl', help="Run or resume a refresh cycle over all routes")
+    crawl.add_argument('--no-wait', action='store_true',
+                       help="Return instead of sleeping until failed routes are due again")
+    crawl.set_defaults(handler=_crawl)
+
+    poll = commands.add_parser('poll', help="Poll the arrival estimates of pda5284 routes into "
+                                            "<working directory>/arrivals until interrupted")
+    poll.add_argument('route_ids', nargs='+', metavar='RID', help="pda5284 route ID, e.g. 10417")
+    poll.add_argument('--interval', type=float, default=60.0,
+                      help="Seconds between two polls of a stop (default: 60); with "
+                           "--adaptive, the spread of the first round")
+    poll.add_argument('--adaptive', action='store_true',
+                      help="Poll imminent arrivals often and distant ones rarely")
+    poll.add_argument('--min-interval', type=float, default=20.0,
+                      help="Adaptive: interval while a bus is imminent (default: 20)")
+    poll.add_argument('--max-interval', type=float, default=300.0,
+                      help="Adaptive: longest interval while a bus is on its way (default: 300)")
+    poll.add_argument('--rate', type=float, default=20.0,
+                      help="Requests per second at most (default: 20)")
+    poll.add_argument('--workers', type=int, default=16, help="Requests in flight at most")
+    poll.add_argument('--duration', type=float, help="Stop after this many seconds")
+    poll.add_argument('--report-every', type=float, default=60.0,
+                      help="Seconds between metric lines (default: 60)")
+    poll.add_argument('--metrics-port', type=int, help="Serve the metrics as JSON on this port")
+    poll.set_defaults(handler=_poll)
+
+    archive_import = commands.add_parser(
+        'archive-import', help="Archive saved HTML pages into <working directory>/snapshot_archive.sqlite3")
+    archive_import.add_argument('paths', nargs='+', metavar='PATH',
+                                help="Page file, or directory of them (e.g. bus_data)")
+    archive_import.set_defaults(handler=_archive_import)
+
+    archive_get = commands.add_parser('archive-get', help="Print an archived page")
+    archive_get.add_argument('kind', choices=['stop', 'route', 'ebus_route', 'ebus_route_list'])
+    archive_get.add_argument('key', nargs='?', default='', help="Stop or route ID")
+    archive_get.add_argument('--at', type=float,
+                             help="Epoch seconds: the page as of then (default: latest)")
+    archive_get.set_defaults(handler=_archive_get)
+
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+This module exports the hermes tables to Parquet and reads them back with Arrow, so
+analyses memory-map only the columns and row groups they need and get Arrow-backed
+DataFrames instead of re-running `pd.read_sql` over the whole SQLite table.
+
+data_route_info_busstop is written as one file sorted by route_id, direction and
+stop_number, whose row-group statistics let route filters skip unrelated row groups.
+The export pays off for network-wide reads and column subsets; looking up a few routes
+is still faster through the indexed SQLite table (see benchmarks/bench_columnar_read.py).
+
+pyarrow is optional: pip install cycu11022119[parquet]
+"""
+
+import os
+import shutil
+from typing import TYPE_CHECKING
+
+from cycu11022119.repository import BUS_STOP_COLUMNS, bus_route_orm, bus_stop_orm, get_repository
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PARQUET_DIRECTORY = 'parquet'
+ROUTE_LIST_FILE = 'data_route_list.parquet'
+BUS_STOP_FILE = 'data_route_info_busstop.parquet'
+# Hive-partitioned copy of the stops written by earlier exports; removed on export
+LEGACY_BUS_STOP_DATASET = 'data_route_info_busstop'
+SORT_COLUMNS = ['route_id', 'direction', 'stop_number']
+# About 60 routes per row group, the unit that route filters can skip
+ROW_GROUP_SIZE = 8192
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet export requires pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _schemas(pa) -> tuple:
+    route_list = pa.schema([
+        ('route_id', pa.string()),
+        ('route_name', pa.string()),
+        ('route_data_updated', pa.int64()),
+    ])
+    bus_stops = pa.schema([
+        ('stop_id', pa.int64()),
+        ('arrival_info', pa.string()),
+        ('stop_number', pa.int64()),
+        ('stop_name', pa.string()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('direction', pa.string()),
+        ('route_id', pa.string()),
+    ])
+    return route_list, bus_stops
+
+
+def _table(pa, connection, orm, schema):
+    rows = connection.execute(orm.__table__.select()).fetchall()
+    columns = list(zip(*rows)) if rows else [[] for _ in schema.names]
+    names = [column.name for column in orm.__table__.columns]
+    arrays = dict(zip(names, columns))
+    return pa.table({name: arrays[name] for name in schema.names}, schema=schema)
+
+
+def export_parquet(working_directory: str = 'data', target: str = None) -> dict:
+    """
+    Writes data_route_list and data_route_info_busstop (sorted by route, direction and
+    stop number) to one Parquet file each. An existing export is replaced.
+
+    Args:
+        working_directory (str): Directory holding the SQLite database.
+        target (str): Output directory. Defaults to `<working_directory>/parquet`.
+
+    Returns:
+        dict: Number of 'routes' and 'stops' rows exported.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    pa = _pyarrow()
+    route_list_schema, bus_stop_schema = _schemas(pa)
+    target = target or os.path.join(working_directory, PARQUET_DIRECTORY)
+
+    with get_repository(working_directory, readonly=True).engine.connect() as connection:
+        routes = _table(pa, connection, bus_route_orm, route_list_schema)
+        stops = _table(pa, connection, bus_stop_orm, bus_stop_schema)
+    stops = stops.sort_by([(name, 'ascending') for name in SORT_COLUMNS])
+
+    legacy_dataset = os.path.join(target, LEGACY_BUS_STOP_DATASET)
+    if os.path.exists(legacy_dataset):
+        shutil.rmtree(legacy_dataset)
+    os.makedirs(target, exist_ok=True)
+
+    pa.parquet.write_table(routes, os.path.join(target, ROUTE_LIST_FILE))
+    pa.parquet.write_table(stops, os.path.join(target, BUS_STOP_FILE),
+                           row_group_size=ROW_GROUP_SIZE)
+    return {"routes": routes.num_rows, "stops": stops.num_rows}
+
+
+def read_route_list(working_directory: str = 'data', source: str = None) -> 'pd.DataFrame':
+    """
+    Reads the exported route list into an Arrow-backed DataFrame.
+
+    Args:
+        working_directory (str): Directory holding the export.
+        source (str): Export directory. Defaults to `<working_directory>/parquet`.
+    """
+    import pandas as pd
+
+    pa = _pyarrow()
+    source = source or os.path.join(working_directory, PARQUET_DIRECTORY)
+    table = pa.parquet.read_table(os.path.join(source, ROUTE_LIST_FILE), memory_map=True)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def read_bus_stops(working_directory: str = 'data', route_ids: list = None,
+                   direction: str = None, columns: list = None,
+                   source: str = None) -> 'pd.DataFrame':
+    """
+    Reads exported stops into an Arrow-backed DataFrame. Only `columns` are decoded,
+    and row groups holding none of the requested routes are skipped. For a handful of
+    routes, a query of the indexed SQLite table is faster.
+
+    Args:
+        working_directory (str): Directory holding the export.
+        route_ids (list): Only these routes. Defaults to the whole network.
+        direction (str): Only 'go' or 'come'.
+        columns (list): Columns to load. Defaults to every column of data_route_info_busstop.
+        source (str): Export directory. Defaults to `<working_directory>/parquet`.
+
+    Returns:
+        pd.DataFrame: Stops ordered by route_id, direction and stop_number.
+    """
+    import pandas as pd
+
+    pa = _pyarrow()
+    source = source or os.path.join(working_directory, PARQUET_DIRECTORY)
+
+    filters = []
+    if route_ids is not None:
+        filters.append(('route_id', 'in', list(route_ids)))
+    if direction is not None:
+        filters.append(('direction', '=', direction))
+
+    table = pa.parquet.read_table(
+        os.path.join(source, BUS_STOP_FILE),
+        columns=columns or BUS_STOP_COLUMNS,
+        filters=filters or None,
+        memory_map=True,
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
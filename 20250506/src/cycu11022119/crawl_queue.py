@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+This module turns data_route_list.route_data_updated into a persistent crawl queue
+(0 = pending, 1 = done, 2 = failed). Retry counts and backoff deadlines live in
+data_route_crawl_state. Every outcome is committed as soon as it is known, so an
+interrupted run resumes where it stopped without redoing finished routes.
+"""
+
+import time
+
+from cycu11022119.repository import bus_route_orm, get_repository, route_crawl_state_orm
+
+PENDING, DONE, FAILED = 0, 1, 2
+
+
+class crawl_queue:
+    """
+    Pulls pending and retryable routes from the hermes database.
+    """
+
+    def __init__(self, working_directory: str = 'data', max_attempts: int = 5,
+                 base_delay: float = 60.0, max_delay: float = 3600.0):
+        """
+        Args:
+            working_directory (str): Directory holding the SQLite database.
+            max_attempts (int): Failures after which a route is no longer retried.
+            base_delay (float): Seconds before the first retry; doubled after each failure.
+            max_delay (float): Upper bound on the retry delay, in seconds.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.session = get_repository(working_directory).session()
+
+    def begin_cycle(self) -> bool:
+        """
+        Starts a new refresh cycle if the previous one finished, otherwise resumes it.
+        A cycle is finished when every route is done or has used up its attempts.
+
+        Returns:
+            bool: True if a new cycle was started, False if an unfinished one is resumed.
+        """
+        if self.ready(now=float('inf'), limit=1):
+            return False
+
+        self.session.query(bus_route_orm).update({"route_data_updated": PENDING})
+        self.session.query(route_crawl_state_orm).delete()
+        self.session.commit()
+        return True
+
+    def _state(self, route_id: str) -> route_crawl_state_orm:
+        state = self.session.get(route_crawl_state_orm, route_id)
+        if state is None:
+            state = route_crawl_state_orm(route_id=route_id, attempts=0, next_attempt_at=0.0)
+            self.session.add(state)
+        return state
+
+    def ready(self, now: float = None, limit: int = None) -> list:
+        """
+        Returns route IDs that are pending, or failed with retries left and their backoff over.
+        """
+        now = time.time() if now is None else now
+        query = (
+            self.session.query(bus_route_orm.route_id)
+            .outerjoin(route_crawl_state_orm, route_crawl_state_orm.route_id == bus_route_orm.route_id)
+            .filter(bus_route_orm.route_data_updated.in_([PENDING, FAILED]))
+            .filter((route_crawl_state_orm.route_id.is_(None)) |
+                    ((route_crawl_state_orm.attempts < self.max_attempts) &
+                     (route_crawl_state_orm.next_attempt_at <= now)))
+            .order_by(bus_route_orm.route_id)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return [route_id for route_id, in query]
+
+    def next_retry_at(self) -> float:
+        """
+        Returns the earliest backoff deadline of a retryable route, or None if none is waiting.
+        """
+        row = (
+            self.session.query(route_crawl_state_orm.next_attempt_at)
+            .join(bus_route_orm, bus_route_orm.route_id == route_crawl_state_orm.route_id)
+            .filter(bus_route_orm.route_data_updated == FAILED)
+            .filter(route_crawl_state_orm.attempts < self.max_attempts)
+            .order_by(route_crawl_state_orm.next_attempt_at)
+            .first()
+        )
+        return row[0] if row else None
+
+    def mark_done(self, route_id: str):
+        self.session.query(bus_route_orm).filter_by(route_id=route_id).update(
+            {"route_data_updated": DONE}
+        )
+        self.session.query(route_crawl_state_orm).filter_by(route_id=route_id).delete()
+        self.session.commit()
+
+    def mark_failed(self, route_id: str, error: str):
+        """
+        Records a failure and schedules the next attempt with exponential backoff.
+        """
+        state = self._state(route_id)
+        state.attempts = (state.attempts or 0) + 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (state.attempts - 1))
+        state.next_attempt_at = time.time() + delay
+        state.last_error = error[:500]
+
+        self.session.query(bus_route_orm).filter_by(route_id=route_id).update(
+            {"route_data_updated": FAILED}
+        )
+        self.session.commit()
+
+    def close(self):
+        self.session.close()
+
+
+def crawl_route(route_id: str, pool, snapshots, repository) -> list:
+    """
+    Fetches both directions of a route and syncs the changed ones into the database;
+    the process_route of a crawl over the queue. The snapshot is recorded only after
+    the sync, so a route whose write failed is parsed and written again on its retry.
+
+    Args:
+        route_id (str): Route to crawl.
+        pool (browser_pool): Browser pool to render the route page in.
+        snapshots (snapshot_store): Snapshot store; an unchanged page is not parsed.
+        repository (hermes_repository): Database to sync the stops into.
+
+    Returns:
+        list: The change events logged by sync_bus_stops.
+    """
+    from cycu11022119.ebus_taipei import fetch_route_info_both
+
+    events = []
+    fetch_route_info_both(route_id, repository.working_directory, pool=pool, snapshots=snapshots,
+                          save=lambda dataframes: events.extend(repository.sync_bus_stops(dataframes)))
+    return events
+
+
+def run_queue(queue: crawl_queue, process_route, wait_for_retries: bool = True,
+              batch_size: int = 50) -> dict:
+    """
+    Processes routes from the queue until nothing is left to do.
+
+    Args:
+        queue (crawl_queue): The queue to drain.
+        process_route (callable): Called with a route ID; raising marks the route failed.
+        wait_for_retries (bool): Sleep until failed routes are due again instead of
+            returning while retries are still pending.
+        batch_size (int): Route IDs fetched from the database per query.
+
+    Returns:
+        dict: Counts of 'done' and 'failed' attempts made by this run.
+    """
+    counts = {"done": 0, "failed": 0}
+
+    while True:
+        route_ids = queue.ready(limit=batch_size)
+        if not route_ids:
+            retry_at = queue.next_retry_at()
+            if retry_at is None or not wait_for_retries:
+                return counts
+            time.sleep(max(0.0, retry_at - time.time()))
+            continue
+
+        for route_id in route_ids:
+            try:
+                process_route(route_id)
+            except Exception as e:
+                print(f"Error processing route {route_id}: {e}")
+                queue.mark_failed(route_id, str(e))
+                counts["failed"] += 1
+            else:
+                queue.mark_done(route_id)
+                counts["done"] += 1
+
+
+if __name__ == "__main__":
+    import sys
+
+    from cycu11022119.cli import main
+
+    sys.exit(main(['crawl']))
@@ -4,12 +4,379 @@ This module retrieves bus stop data for a specific route and direction from the
 saves the rendered HTML and CSV file, and stores the parsed data in a SQLite database.
 """
 
+import os
 import re
-import pandas as pd
-from playwright.sync_api import sync_playwright
-from sqlalchemy import create_engine, Column, String, Float, Integer, Boolean
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
+import time
+from typing import TYPE_CHECKING
+
+from cycu11022119.browser_pool import browser_pool
+from cycu11022119.endpoints import EBUS_BASE_URL
+from cycu11022119.fetch_profile import default_profile, fetch_profile
+from cycu11022119.snapshot_store import snapshot_store
+from cycu11022119.route_parser import DIRECTION_CONTAINERS, STOP_FIELDS, parse_stops, station_list
+
+# pandas, Playwright and SQLAlchemy are imported where they are used, so that
+# importing this module (e.g. for a database query) does not pay for all three
+if TYPE_CHECKING:
+    import pandas as pd
+
+ROUTE_URL = EBUS_BASE_URL + '/Route/StopsOfRoute?routeid={route_id}'
+ROUTE_LIST_URL = EBUS_BASE_URL + '/ebus?ct=all'
+COME_TAB_SELECTOR = 'a.stationlist-come-go-gray.stationlist-come'
+STATION_LIST_SELECTOR = '.auto-list-stationlist'
+# The XHR that fills the arrival-time spans of the visible direction after load
+STOP_STATUS_RESPONSE = '**/StopStatusOfRoute*'
+ROUTE_LIST_SELECTOR = 'a[href^="javascript:go"]'
+# dtypes of the typed stop frames; route_id and direction become categoricals
+TYPED_STOP_DTYPES = {"stop_number": "int32", "stop_id": "int64",
+                     "latitude": "float64", "longitude": "float64"}
+ROUTE_LIST_PATTERN = re.compile(r'<li><a href="javascript:go\(\'(.*?)\'\)">(.*?)</a></li>', re.DOTALL)
+ARRIVAL_SPAN = re.compile(r'<span class="auto-list-stationlist-position[^"]*">.*?</span>', re.DOTALL)
+
+
+class page_latency_stats:
+    """
+    Records how long pages took from navigation start until they were ready.
+    """
+
+    def __init__(self):
+        self.samples = []
+        self.timeouts = 0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        self.samples.append(seconds)
+        if timed_out:
+            self.timeouts += 1
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns the q-th percentile (0-100) of recorded latencies, in seconds.
+        """
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        """
+        Returns count, mean, p50, p95, max and timeout count of the recorded latencies.
+        """
+        count = len(self.samples)
+        return {
+            "count": count,
+            "mean": sum(self.samples) / count if count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": max(self.samples) if count else 0.0,
+            "timeouts": self.timeouts,
+        }
+
+
+class readiness_strategy:
+    """
+    Decides when a rendered page is ready to be read, instead of sleeping a fixed time.
+
+    Modes:
+        'response':    wait for a response whose URL matches `response_url`. The
+                       station lists are server-rendered, but their arrival times are
+                       filled in by the StopStatusOfRoute XHR, so this is the default.
+        'selector':    wait until `selector` is attached to the DOM.
+        'networkidle': wait until the network has been idle for 500 ms.
+        'fixed':       sleep `timeout_ms`, the historical behaviour.
+
+    `timeout_ms` is only a ceiling in every mode but 'fixed'; hitting it is counted in
+    the stats and the page is read as is, so a slow page never fails a crawl that the
+    fixed sleep would have let through.
+    """
+
+    def __init__(self, mode: str = 'response', selector: str = STATION_LIST_SELECTOR,
+                 timeout_ms: int = 10000, response_url: str = STOP_STATUS_RESPONSE):
+        if mode not in ['response', 'selector', 'networkidle', 'fixed']:
+            raise ValueError("Mode must be 'response', 'selector', 'networkidle' or 'fixed'")
+
+        self.mode = mode
+        self.selector = selector
+        self.timeout_ms = timeout_ms
+        self.response_url = response_url
+        self.stats = page_latency_stats()
+
+    def load(self, page, action):
+        """
+        Runs `action` (a navigation or a click) and blocks until the page is ready,
+        recording the latency since `action` started.
+
+        In 'response' mode the response is awaited from before `action` runs, so an
+        XHR that completes while page.goto() is still returning is not missed.
+
+        Args:
+            page (playwright.sync_api.Page): The page `action` acts on.
+            action (callable): Called without arguments, e.g. lambda: page.goto(url).
+
+        Raises:
+            playwright.sync_api.Error: If `action` itself fails; only waiting for
+                readiness is bounded by the ceiling.
+        """
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        started = time.perf_counter()
+        acted, timed_out = False, False
+        try:
+            if self.mode == 'response':
+                with page.expect_response(self.response_url, timeout=self.timeout_ms):
+                    action()
+                    acted = True
+            else:
+                action()
+                acted = True
+                if self.mode == 'selector':
+                    page.wait_for_selector(self.selector, state='attached', timeout=self.timeout_ms)
+                elif self.mode == 'networkidle':
+                    page.wait_for_load_state('networkidle', timeout=self.timeout_ms)
+                else:
+                    page.wait_for_timeout(self.timeout_ms)
+        except PlaywrightTimeoutError:
+            if not acted:
+                raise
+            timed_out = True
+
+        self.stats.record(time.perf_counter() - started, timed_out)
+
+    async def load_async(self, page, action):
+        """
+        Async counterpart of `load` for playwright.async_api pages; `action` returns
+        an awaitable.
+        """
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+        started = time.perf_counter()
+        acted, timed_out = False, False
+        try:
+            if self.mode == 'response':
+                async with page.expect_response(self.response_url, timeout=self.timeout_ms):
+                    await action()
+                    acted = True
+            else:
+                await action()
+                acted = True
+                if self.mode == 'selector':
+                    await page.wait_for_selector(self.selector, state='attached',
+                                                 timeout=self.timeout_ms)
+                elif self.mode == 'networkidle':
+                    await page.wait_for_load_state('networkidle', timeout=self.timeout_ms)
+                else:
+                    await page.wait_for_timeout(self.timeout_ms)
+        except PlaywrightTimeoutError:
+            if not acted:
+                raise
+            timed_out = True
+
+        self.stats.record(time.perf_counter() - started, timed_out)
+
+
+# Shared by route objects that are not given their own strategy, so latency
+# statistics accumulate over a whole crawl
+default_readiness = readiness_strategy()
+
+def save_route_infos_to_database(route_infos: list, working_directory: str = 'data') -> int:
+    """
+    Saves the parsed stops of many taipei_route_info objects in one transaction and
+    refreshes the planner statistics afterwards.
+
+    Args:
+        route_infos (list): taipei_route_info objects on which parse_route_info() was called.
+        working_directory (str): Directory holding the SQLite database.
+
+    Returns:
+        int: Number of rows written.
+    """
+    from cycu11022119.repository import get_repository
+
+    repository = get_repository(working_directory)
+    written = repository.upsert_bus_stops([route_info.dataframe for route_info in route_infos])
+    repository.analyze()
+    return written
+
+
+def typed_stop_frame(matches: list, route_id: str, direction: str) -> 'pd.DataFrame':
+    """
+    Builds a compact stop DataFrame from parse_stops() matches. The numeric columns are
+    converted in one vectorised pass per column; route_id and direction are single-
+    category categoricals, so they cost one byte per row instead of a string object.
+    """
+    import numpy as np
+    import pandas as pd
+
+    columns = dict(zip(STOP_FIELDS, zip(*matches)))
+    rows = len(matches)
+    data = {"arrival_info": pd.Categorical(columns["arrival_info"])}
+    for name in STOP_FIELDS[1:]:
+        if name in TYPED_STOP_DTYPES:
+            data[name] = np.asarray(columns[name]).astype(TYPED_STOP_DTYPES[name])
+        else:
+            data[name] = np.asarray(columns[name], dtype=object)
+    data["direction"] = pd.Categorical.from_codes(np.zeros(rows, dtype=np.int8), [direction])
+    data["route_id"] = pd.Categorical.from_codes(np.zeros(rows, dtype=np.int8), [route_id])
+    return pd.DataFrame(data)
+
+
+def combine_stop_frames(frames: list) -> 'pd.DataFrame':
+    """
+    Concatenates typed stop frames, keeping categorical columns categorical (a plain
+    pd.concat turns categoricals with different categories back into objects).
+    """
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    data = {}
+    for name in frames[0].columns:
+        if isinstance(frames[0][name].dtype, pd.CategoricalDtype):
+            data[name] = union_categoricals([frame[name] for frame in frames])
+        else:
+            data[name] = pd.concat([frame[name] for frame in frames], ignore_index=True)
+    return pd.DataFrame(data)
+
+
+def station_list_fingerprint(content: str) -> str:
+    """
+    Returns the station list items of both directions of a StopsOfRoute page without
+    their live arrival-time spans, so two fetches of an unchanged route compare equal.
+    Nothing is parsed: the #GoDirectionRoute and #BackDirectionRoute lists are sliced
+    out and the spans removed, which costs about half a parse of both directions.
+    """
+    sections = []
+    for direction in ('go', 'come'):
+        section = station_list(content, direction)
+        items = section[section.find('<li>'):section.rfind('</li>') + len('</li>')]
+        sections.append(ARRIVAL_SPAN.sub('', items))
+    return '\n'.join(sections)
+
+
+def route_list_fingerprint(content: str) -> str:
+    """
+    Returns the route links of the catalogue page, one per line.
+    """
+    return '\n'.join(f'{route_id}\t{name}' for route_id, name in ROUTE_LIST_PATTERN.findall(content))
+
+
+def route_snapshot_key(route_id: str, direction: str = None) -> str:
+    """
+    Returns the snapshot_store key of a route page: its URL for the page as loaded
+    (the go tab), or the URL with a #direction fragment for a render after switching
+    tabs and for the per-direction snapshots of taipei_route_info.
+    """
+    url = ROUTE_URL.format(route_id=route_id)
+    return f'{url}#{direction}' if direction is not None else url
+
+
+def route_info_from_snapshot(route_id: str, direction: str = 'go',
+                             snapshots: snapshot_store = None, working_directory: str = 'data'):
+    """
+    Builds a taipei_route_info from the latest stored snapshot, without any network access.
+
+    Raises:
+        ValueError: If the route was never snapshotted.
+    """
+    snapshots = snapshots or snapshot_store(working_directory)
+    # The direction's own render carries its arrival times; the page as loaded only the go ones
+    content = (snapshots.latest(route_snapshot_key(route_id, direction)) or
+               snapshots.latest(route_snapshot_key(route_id)))
+    if content is None:
+        raise ValueError(f"No snapshot stored for route ID {route_id} ({direction})")
+    return taipei_route_info(route_id, direction=direction, working_directory=working_directory,
+                             content=content)
+
+
+def _render_route(page, url: str, readiness: readiness_strategy, profile: fetch_profile) -> tuple:
+    profile.prepare(page)
+    token = profile.begin(page)
+    readiness.load(page, lambda: page.goto(url))
+    go_content = page.content()
+
+    # Both lists are in the DOM, but the page script only fills the arrival times of
+    # the visible one, so the come list is read after switching tabs. One-way and loop
+    # routes have no come list and no tab to click.
+    come_content = None
+    if DIRECTION_CONTAINERS['come'] in go_content:
+        readiness.load(page, lambda: page.click(COME_TAB_SELECTOR))
+        come_content = page.content()
+    profile.end(page, url, token)
+    return go_content, come_content
+
+
+def fetch_route_info_both(route_id: str, working_directory: str = 'data',
+                          pool: browser_pool = None, readiness: readiness_strategy = None,
+                          snapshots: snapshot_store = None, profile: fetch_profile = None,
+                          save=None) -> tuple:
+    """
+    Loads a route page once and returns the parsed stops of both directions: the go
+    list is read as loaded, the come list after clicking its tab, which makes the page
+    fetch its arrival times.
+
+    Args:
+        route_id (str): The unique identifier of the bus route.
+        working_directory (str): Directory to store the HTML and database files.
+        pool (browser_pool): Shared browser pool to borrow a page from. When omitted,
+            a dedicated browser is launched for this fetch.
+        readiness (readiness_strategy): How to decide the page has rendered.
+        snapshots (snapshot_store): If given, and the station lists did not change
+            since the last snapshot, nothing is parsed. Otherwise both renders are
+            stored once the page is parsed and `save` has returned, so a page whose
+            stops failed to parse or save is parsed again on the next fetch.
+        profile (fetch_profile): Which requests the page may make. Defaults to
+            `default_profile`, which blocks resources the parser does not need.
+        save (callable): Called with the list of parsed DataFrames (None left out)
+            before the snapshot is stored, e.g. repository.sync_bus_stops. Callers
+            that pass `snapshots` should write the stops here, not afterwards.
+
+    Returns:
+        tuple: (go DataFrame, come DataFrame) as returned by parse_route_info(typed=True);
+            a direction that is unchanged, or that the route does not have (one-way and
+            loop routes have no come direction), is returned as None.
+
+    Raises:
+        ValueError: If the page has no go stops.
+    """
+    url = ROUTE_URL.format(route_id=route_id)
+    readiness = readiness or default_readiness
+    profile = profile or default_profile
+
+    if pool is not None:
+        with pool.page() as page:
+            go_content, come_content = _render_route(page, url, readiness, profile)
+    else:
+        from playwright.sync_api import sync_playwright
+
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True)
+            page = browser.new_page()
+            go_content, come_content = _render_route(page, url, readiness, profile)
+            browser.close()
+
+    marker = None
+    if snapshots is not None:
+        marker = snapshots.check(route_snapshot_key(route_id), go_content, station_list_fingerprint)
+        if marker is None:
+            return None, None
+
+    dataframes = []
+    for direction, content in (('go', go_content), ('come', come_content)):
+        if content is None:
+            dataframes.append(None)
+            continue
+        route_info = taipei_route_info(route_id, direction=direction,
+                                       working_directory=working_directory, content=content)
+        dataframes.append(route_info.parse_route_info(typed=True, required=direction == 'go'))
+
+    if save is not None:
+        save([dataframe for dataframe in dataframes if dataframe is not None])
+    if snapshots is not None:
+        snapshots.put(route_snapshot_key(route_id), go_content, station_list_fingerprint,
+                      marker=marker)
+        if come_content is not None:
+            snapshots.put(route_snapshot_key(route_id, 'come'), come_content,
+                          station_list_fingerprint)
+    return tuple(dataframes)
 
 
 class taipei_route_list:
@@ -17,60 +384,112 @@ class taipei_route_list:
     Manages fetching, parsing, and storing route data for Taipei eBus.
     """
 
-    def __init__(self, working_directory: str = 'data'):
+    def __init__(self, working_directory: str = 'data', pool: browser_pool = None,
+                 readiness: readiness_strategy = None, snapshots: snapshot_store = None,
+                 fetch: str = 'eager', profile: fetch_profile = None):
         """
         Initializes the taipei_route_list, fetches webpage content,
         configures the ORM, and sets up the SQLite database.
 
+        Callers that only read the database or set route_data_updated flags should
+        pass fetch='offline' (or 'lazy'), so no browser is launched.
+
         Args:
             working_directory (str): Directory to store the HTML and database files.
+            pool (browser_pool): Shared browser pool to borrow a page from. When omitted,
+                a dedicated browser is launched for this fetch.
+            readiness (readiness_strategy): How to decide the page has rendered. Defaults
+                to waiting for the route links to appear.
+            snapshots (snapshot_store): If given, the page is snapshotted and `changed`
+                tells whether the route catalogue differs from the last snapshot.
+            fetch (str): When the route catalogue is fetched:
+                'eager':   in the constructor, the historical behaviour.
+                'lazy':    on the first parse_route_list() call.
+                'offline': never; parse_route_list() reads the latest snapshot, or else
+                           the HTML file saved by an earlier fetch.
+            profile (fetch_profile): Which requests the page may make. Defaults to
+                `default_profile`.
+
+        Raises:
+            ValueError: If `fetch` is not one of the modes above.
         """
+        if fetch not in ['eager', 'lazy', 'offline']:
+            raise ValueError("Fetch must be 'eager', 'lazy' or 'offline'")
+
         self.working_directory = working_directory
-        self.url = 'https://ebus.gov.taipei/ebus?ct=all'
+        self.url = ROUTE_LIST_URL
         self.content = None
+        self.changed = True
+        self.pool = pool
+        self.readiness = readiness or readiness_strategy('selector', selector=ROUTE_LIST_SELECTOR)
+        self.profile = profile or default_profile
+        self.snapshots = snapshots
+        self.fetch = fetch
+        self.html_file = f'{self.working_directory}/hermes_ebus_taipei_route_list.html'
 
         # Fetch webpage content
-        self._fetch_content()
-
-        # Setup ORM base and table
-        Base = declarative_base()
+        if self.fetch == 'eager':
+            self._fetch_content()
 
-        class bus_route_orm(Base):
-            __tablename__ = 'data_route_list'
-
-            route_id = Column(String, primary_key=True)
-            route_name = Column(String)
-            route_data_updated = Column(Integer, default=0)
+        # Shared engine and mappings for this database file
+        from cycu11022119.repository import bus_route_orm, get_repository
 
+        self.repository = get_repository(self.working_directory)
         self.orm = bus_route_orm
-
-        # Create and connect to the SQLite engine
-        self.engine = create_engine(f'sqlite:///{self.working_directory}/hermes_ebus_taipei.sqlite3')
-        self.engine.connect()
-        Base.metadata.create_all(self.engine)
-
-        # Create session
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        self.engine = self.repository.engine
+        self.session = self.repository.session()
 
     def _fetch_content(self):
         """
         Fetches the webpage content using Playwright and saves it as a local HTML file.
         """
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(self.url)
-            page.wait_for_timeout(3000)  # Wait for the page to load
-            self.content = page.content()
-            browser.close()
+        if self.pool is not None:
+            with self.pool.page() as page:
+                self._render(page)
+        else:
+            from playwright.sync_api import sync_playwright
+
+            with sync_playwright() as p:
+                browser = p.chromium.launch(headless=True)
+                page = browser.new_page()
+                self._render(page)
+                browser.close()
+
+        if self.snapshots is not None:
+            self.changed = self.snapshots.put(self.url, self.content, route_list_fingerprint)
+
+        # Save the rendered HTML to a file for inspection, unless the catalogue is unchanged
+        if self.changed or not os.path.exists(self.html_file):
+            with open(self.html_file, "w", encoding="utf-8") as file:
+                file.write(self.content)
+
+    def _load_content(self):
+        """
+        Loads the route catalogue saved by an earlier fetch, without any network access.
 
-        # Save the rendered HTML to a file for inspection
-        html_file_path = f'{self.working_directory}/hermes_ebus_taipei_route_list.html'
-        with open(html_file_path, "w", encoding="utf-8") as file:
-            file.write(self.content)
+        Raises:
+            ValueError: If the catalogue was never fetched into this working directory.
+        """
+        self.changed = False
+        if self.snapshots is not None:
+            self.content = self.snapshots.latest(self.url)
+        if self.content is None and os.path.exists(self.html_file):
+            with open(self.html_file, encoding="utf-8") as file:
+                self.content = file.read()
+        if self.content is None:
+            raise ValueError(f"No saved route list in {self.working_directory}; fetch it first")
+
+    def _render(self, page):
+        """
+        Loads the route list into the given page and stores the rendered HTML.
+        """
+        self.profile.prepare(page)
+        token = self.profile.begin(page)
+        self.readiness.load(page, lambda: page.goto(self.url))
+        self.content = page.content()
+        self.profile.end(page, self.url, token)
 
-    def parse_route_list(self) -> pd.DataFrame:
+    def parse_route_list(self) -> 'pd.DataFrame':
         """
         Parses bus route data from the fetched HTML content.
 
@@ -78,34 +497,51 @@ class taipei_route_list:
             pd.DataFrame: DataFrame containing bus route IDs and names.
 
         Raises:
-            ValueError: If no route data is found.
+            ValueError: If no route data is found, or in offline mode nothing was saved.
         """
-        pattern = r'<li><a href="javascript:go\(\'(.*?)\'\)">(.*?)</a></li>'
-        matches = re.findall(pattern, self.content, re.DOTALL)
+        if self.content is None:
+            if self.fetch == 'offline':
+                self._load_content()
+            else:
+                self._fetch_content()
+
+        matches = ROUTE_LIST_PATTERN.findall(self.content)
 
         if not matches:
             raise ValueError("No data found for route table")
 
+        import pandas as pd
+
         bus_routes = [(route_id, route_name.strip()) for route_id, route_name in matches]
         self.dataframe = pd.DataFrame(bus_routes, columns=["route_id", "route_name"])
         return self.dataframe
 
-    def save_to_database(self):
+    def save_to_database(self, bulk: bool = True):
         """
-        Saves the parsed bus route data to the SQLite database via SQLAlchemy ORM.
+        Saves the parsed bus route data to the SQLite database.
+
+        Args:
+            bulk (bool): Write all routes with one upsert statement. When False, each row
+                goes through `session.merge()`, which issues a SELECT per row.
         """
+        if bulk:
+            self.repository.upsert_route_list(self.dataframe)
+            return
+
         for _, row in self.dataframe.iterrows():
             self.session.merge(self.orm(route_id=row['route_id'], route_name=row['route_name']))
 
         self.session.commit()
 
-    def read_from_database(self) -> pd.DataFrame:
+    def read_from_database(self) -> 'pd.DataFrame':
         """
         Reads bus route data from the SQLite database.
 
         Returns:
             pd.DataFrame: DataFrame containing bus route data.
         """
+        import pandas as pd
+
         query = self.session.query(self.orm)
         self.db_dataframe = pd.read_sql(query.statement, self.session.bind)
         return self.db_dataframe
@@ -128,10 +564,12 @@ class taipei_route_list:
 
     def __del__(self):
         """
-        Closes the session and engine when the object is deleted.
+        Closes the session when the object is deleted. The engine is shared and stays open.
         """
-        self.session.close()
-        self.engine.dispose()
+        # The constructor may have raised (e.g. on a bad `fetch`) before the session existed
+        session = getattr(self, 'session', None)
+        if session is not None:
+            session.close()
 
 
 class taipei_route_info:
@@ -139,40 +577,67 @@ class taipei_route_info:
     Manages fetching, parsing, and storing bus stop data for a specified route and direction.
     """
 
-    def __init__(self, route_id: str, direction: str = 'go', working_directory: str = 'data'):
+    def __init__(self, route_id: str, direction: str = 'go', working_directory: str = 'data',
+                 pool: browser_pool = None, content: str = None,
+                 readiness: readiness_strategy = None, snapshots: snapshot_store = None,
+                 profile: fetch_profile = None):
         """
         Initializes the taipei_route_info by setting parameters and fetching the webpage content.
 
         Args:
             route_id (str): The unique identifier of the bus route.
             direction (str): The direction of the route; must be either 'go' or 'come'.
+            pool (browser_pool): Shared browser pool to borrow a page from. When omitted,
+                a dedicated browser is launched for this fetch.
+            content (str): Already-rendered HTML of the route page. When given, no fetch
+                is performed and the content is parsed as is.
+            readiness (readiness_strategy): How to decide the page has rendered. Defaults
+                to the module-wide `default_readiness`.
+            snapshots (snapshot_store): If given, `changed` tells whether the station list
+                of a fetched page differs from the last snapshot, and the page is
+                snapshotted once save_to_database() has written its stops.
+            profile (fetch_profile): Which requests the page may make. Defaults to
+                `default_profile`.
         """
         self.route_id = route_id
         self.direction = direction
-        self.content = None
-        self.url = f'https://ebus.gov.taipei/Route/StopsOfRoute?routeid={route_id}'
+        self.content = content
+        self.changed = True
+        self.snapshots = snapshots
+        self._snapshot_marker = None
+        self.url = ROUTE_URL.format(route_id=route_id)
         self.working_directory = working_directory
+        self.pool = pool
+        self.readiness = readiness or default_readiness
+        self.profile = profile or default_profile
 
         if self.direction not in ['go', 'come']:
             raise ValueError("Direction must be 'go' or 'come'")
 
-        self._fetch_content()
+        if self.content is None:
+            self._fetch_content()
 
     def _fetch_content(self):
         """
         Fetches the webpage content using Playwright and writes the rendered HTML to a local file.
         """
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(self.url)
-
-            if self.direction == 'come':
-                page.click('a.stationlist-come-go-gray.stationlist-come')
-
-            page.wait_for_timeout(3000)  # Wait for page render
-            self.content = page.content()
-            browser.close()
+        if self.pool is not None:
+            with self.pool.page() as page:
+                self._render(page)
+        else:
+            from playwright.sync_api import sync_playwright
+
+            with sync_playwright() as p:
+                browser = p.chromium.launch(headless=True)
+                page = browser.new_page()
+                self._render(page)
+                browser.close()
+
+        if self.snapshots is not None:
+            self._snapshot_marker = self.snapshots.check(
+                route_snapshot_key(self.route_id, self.direction), self.content,
+                station_list_fingerprint)
+            self.changed = self._snapshot_marker is not None
 
         # Save the rendered HTML to a file for inspection
         self.html_file = f"{self.working_directory}/ebus_taipei_{self.route_id}.html"
@@ -180,34 +645,57 @@ class taipei_route_info:
         # with open(html_file, "w", encoding="utf-8") as file:
         #     file.write(self.content)
 
-    def parse_route_info(self) -> pd.DataFrame:
+    def _render(self, page):
+        """
+        Loads the route page into the given page and stores the rendered HTML. For the
+        come direction the come tab is clicked first, if the route has one, so that the
+        page fills in its arrival times.
+        """
+        self.profile.prepare(page)
+        token = self.profile.begin(page)
+        self.readiness.load(page, lambda: page.goto(self.url))
+        self.content = page.content()
+        if self.direction == 'come' and DIRECTION_CONTAINERS['come'] in self.content:
+            self.readiness.load(page, lambda: page.click(COME_TAB_SELECTOR))
+            self.content = page.content()
+        self.profile.end(page, self.url, token)
+
+    def parse_route_info(self, backend: str = 'regex', typed: bool = False,
+                         required: bool = True) -> 'pd.DataFrame':
         """
         Parses the fetched HTML content to extract bus stop data.
 
+        Args:
+            backend (str): Parser backend, 'regex' or 'lxml' (see route_parser).
+            typed (bool): Return numeric columns (int32 stop_number, int64 stop_id,
+                float64 coordinates) and categorical arrival_info, direction and
+                route_id, built by `typed_stop_frame`, instead of all strings.
+            required (bool): Raise if the direction has no stops. When False, None is
+                returned instead, e.g. for the come direction of a one-way route.
+
         Returns:
             pd.DataFrame: DataFrame containing bus stop information.
 
         Raises:
-            ValueError: If no data is found for the route.
-        """
-        pattern = re.compile(
-            r'<li>.*?<span class="auto-list-stationlist-position.*?">(.*?)</span>\s*'
-            r'<span class="auto-list-stationlist-number">\s*(\d+)</span>\s*'
-            r'<span class="auto-list-stationlist-place">(.*?)</span>.*?'
-            r'<input[^>]+name="item\.UniStopId"[^>]+value="(\d+)"[^>]*>.*?'
-            r'<input[^>]+name="item\.Latitude"[^>]+value="([\d\.]+)"[^>]*>.*?'
-            r'<input[^>]+name="item\.Longitude"[^>]+value="([\d\.]+)"[^>]*>',
-            re.DOTALL
-        )
-
-        matches = pattern.findall(self.content)
+            ValueError: If no data is found for the route and `required` is set.
+        """
+        matches = parse_stops(self.content, self.direction, backend)
         if not matches:
+            if not required:
+                self.dataframe = None
+                return None
             raise ValueError(f"No data found for route ID {self.route_id}")
 
+        if typed:
+            self.dataframe = typed_stop_frame(matches, self.route_id, self.direction)
+            return self.dataframe
+
+        import pandas as pd
+
         bus_routes = [m for m in matches]
         self.dataframe = pd.DataFrame(
             bus_routes,
-            columns=["arrival_info", "stop_number", "stop_name", "stop_id", "latitude", "longitude"]
+            columns=STOP_FIELDS
         )
 
         self.dataframe["direction"] = self.direction
@@ -215,28 +703,40 @@ class taipei_route_info:
 
         return self.dataframe
 
-    def save_to_database(self):
+    def save_to_database(self, bulk: bool = True, diff: bool = False):
         """
         Saves the parsed bus stop data to the SQLite database.
+
+        Args:
+            bulk (bool): Write the whole route with one upsert statement. When False, each
+                stop goes through `session.merge()`, which issues a SELECT per row.
+            diff (bool): Compare with the stored stops instead, write only the ones that
+                changed and log them to data_route_change_log. Takes precedence over `bulk`.
+
+        Returns:
+            list: The change events when `diff` is set, otherwise None.
         """
-        db_file = f"{self.working_directory}/hermes_ebus_taipei.sqlite3"
-        engine = create_engine(f"sqlite:///{db_file}")
-        Base = declarative_base()
-
-        class bus_stop_orm(Base):
-            __tablename__ = "data_route_info_busstop"
-            stop_id = Column(Integer)
-            arrival_info = Column(String)
-            stop_number = Column(Integer, primary_key=True)
-            stop_name = Column(String)
-            latitude = Column(Float)
-            longitude = Column(Float)
-            direction = Column(String, primary_key=True)
-            route_id = Column(String, primary_key=True)
-
-        Base.metadata.create_all(engine)
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        events = self._write_stops(bulk, diff)
+        # Only now is the page snapshotted: a failed write leaves it "changed" for the retry
+        if self._snapshot_marker is not None:
+            self.snapshots.put(route_snapshot_key(self.route_id, self.direction), self.content,
+                               station_list_fingerprint, marker=self._snapshot_marker)
+            self._snapshot_marker = None
+        return events
+
+    def _write_stops(self, bulk: bool, diff: bool):
+        from cycu11022119.repository import bus_stop_orm, get_repository
+
+        repository = get_repository(self.working_directory)
+
+        if diff:
+            return repository.sync_bus_stops(self.dataframe)
+
+        if bulk:
+            repository.upsert_bus_stops(self.dataframe)
+            return
+
+        session = repository.session()
 
         for _, row in self.dataframe.iterrows():
             session.merge(bus_stop_orm(
@@ -255,10 +755,17 @@ class taipei_route_info:
 
 
 if __name__ == "__main__":
+    from cycu11022119.repository import get_repository
+
+    # One browser for the whole run; route objects borrow pages from it
+    pool = browser_pool(pool_size=1, max_navigations=50)
+    snapshots = snapshot_store()
+
     # Initialize and process route data
-    route_list = taipei_route_list()
+    route_list = taipei_route_list(pool=pool, snapshots=snapshots)
     route_list.parse_route_list()
-    route_list.save_to_database()
+    if route_list.changed:
+        route_list.save_to_database()
 
     bus1='0161000900' # 承德幹線
     bus2='0161001500' #基隆幹線
@@ -268,18 +775,23 @@ if __name__ == "__main__":
 
     for route_id in bus_list:
         try:
-            route_info = taipei_route_info(route_id, direction="go")
-            route_info.parse_route_info()
-            route_info.save_to_database()
-
-
-            for index, row in route_info.dataframe.iterrows():
-                print(f"Stop Number: {row['stop_number']}, Stop Name: {row['stop_name']}, "
-                      f"Latitude: {row['latitude']}, Longitude: {row['longitude']}")
-
-            # route_info = taipei_route_info(route_id, direction="come")
-            # route_info.parse_route_info()
-            # route_info.save_to_database()
+            # Stops are synced inside the fetch, so the snapshot is only stored once they are
+            events = []
+            dataframes = fetch_route_info_both(
+                route_id, pool=pool, snapshots=snapshots,
+                save=lambda changed: events.extend(get_repository().sync_bus_stops(changed)))
+            changed = [dataframe for dataframe in dataframes if dataframe is not None]
+            if not changed:
+                print(f"Route {route_id} unchanged since last snapshot.")
+            for event in events:
+                print(f"{event['change']}: {event['direction']} stop {event['stop_id']} "
+                      f"{event['stop_name']} ({event['old_stop_number']} -> {event['stop_number']})")
+
+
+            for dataframe in changed:
+                for index, row in dataframe.iterrows():
+                    print(f"Stop Number: {row['stop_number']}, Stop Name: {row['stop_name']}, "
+                          f"Latitude: {row['latitude']}, Longitude: {row['longitude']}")
 
             route_list.set_route_data_updated(route_id)
             print(f"Route data for {route_id} updated.")
@@ -289,3 +801,7 @@ if __name__ == "__main__":
             route_list.set_route_data_unexcepted(route_id)
             continue
 
+    print(f"Page readiness latency: {default_readiness.stats.summary()}")
+    snapshots.flush()
+    get_repository().analyze()
+    pool.close()
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+This module holds the base URLs of the sites the crawlers read. Both can be pointed
+at another server, e.g. the local replay_server, through environment variables:
+
+    EBUS_BASE_URL      (default https://ebus.gov.taipei)
+    PDA5284_BASE_URL   (default https://pda5284.gov.taipei)
+"""
+
+import os
+
+EBUS_BASE_URL = os.environ.get('EBUS_BASE_URL', 'https://ebus.gov.taipei').rstrip('/')
+PDA5284_BASE_URL = os.environ.get('PDA5284_BASE_URL', 'https://pda5284.gov.taipei').rstrip('/')
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+This module decides which requests a Playwright page may make while an eBus page is
+fetched. The parsers only read the server-rendered station and route lists, so images,
+fonts, media, map tiles, analytics and captcha scripts are aborted through request
+routing. Scripts from an allow-list of hosts (the site itself and the jQuery CDNs its
+tabs rely on) still load. Optionally the transferred bytes and load time of every
+fetched page are recorded.
+"""
+
+import time
+import weakref
+from urllib.parse import urlparse
+
+from cycu11022119.endpoints import EBUS_BASE_URL
+
+BLOCKED_RESOURCE_TYPES = ('image', 'font', 'media', 'texttrack', 'manifest', 'other')
+ALLOWED_SCRIPT_HOSTS = ('ebus.gov.taipei', urlparse(EBUS_BASE_URL).hostname,
+                        'ajax.googleapis.com', 'cdnjs.cloudflare.com')
+# Blocked whatever the resource type: map tiles, analytics beacons and captcha frames
+BLOCKED_HOSTS = (
+    'maps.nlsc.gov.tw',
+    'www.googletagmanager.com',
+    'www.google-analytics.com',
+    'js.hcaptcha.com',
+    'newassets.hcaptcha.com',
+    'html5shiv.googlecode.com',
+)
+
+
+class page_transfer_stats:
+    """
+    Records transferred bytes, request counts and load time of fetched pages.
+    """
+
+    def __init__(self):
+        self.pages = []
+
+    def record(self, url: str, transferred: int, requests: int, blocked: int, seconds: float):
+        self.pages.append({
+            "url": url,
+            "bytes": transferred,
+            "requests": requests,
+            "blocked": blocked,
+            "seconds": seconds,
+        })
+
+    def summary(self) -> dict:
+        """
+        Returns page count, total and mean bytes, mean requests, blocked requests and
+        mean load time of the recorded pages.
+        """
+        count = len(self.pages)
+        total = sum(page["bytes"] for page in self.pages)
+        return {
+            "pages": count,
+            "bytes": total,
+            "mean_bytes": total / count if count else 0.0,
+            "mean_requests": sum(page["requests"] for page in self.pages) / count if count else 0.0,
+            "blocked": sum(page["blocked"] for page in self.pages),
+            "mean_seconds": sum(page["seconds"] for page in self.pages) / count if count else 0.0,
+        }
+
+
+class fetch_profile:
+    """
+    Request policy and optional transfer accounting for the pages of a crawl.
+
+    A page is prepared once (route handler and listeners are attached on first use),
+    so pages borrowed repeatedly from a browser_pool are not routed twice.
+    """
+
+    def __init__(self, block: bool = True, blocked_types: tuple = BLOCKED_RESOURCE_TYPES,
+                 allowed_script_hosts: tuple = ALLOWED_SCRIPT_HOSTS,
+                 blocked_hosts: tuple = BLOCKED_HOSTS, measure: bool = False):
+        """
+        Args:
+            block (bool): Abort non-essential requests. When False every request loads,
+                which is useful as the baseline of a measurement.
+            blocked_types (tuple): Playwright resource types that are always aborted.
+            allowed_script_hosts (tuple): Hosts whose scripts may load; scripts from
+                any other host are aborted.
+            blocked_hosts (tuple): Hosts whose requests are aborted whatever their type.
+            measure (bool): Record bytes transferred and load time of every page in `stats`.
+        """
+        self.block = block
+        self.blocked_types = set(blocked_types)
+        self.allowed_script_hosts = set(allowed_script_hosts)
+        self.blocked_hosts = set(blocked_hosts)
+        self.measure = measure
+        self.stats = page_transfer_stats()
+
+        self._prepared = weakref.WeakSet()
+        self._counters = weakref.WeakKeyDictionary()
+
+    def should_abort(self, resource_type: str, url: str) -> bool:
+        """
+        Returns True if a request of `resource_type` to `url` is not needed for parsing.
+        """
+        if not self.block:
+            return False
+
+        host = urlparse(url).hostname or ''
+        if host in self.blocked_hosts or resource_type in self.blocked_types:
+            return True
+        return resource_type == 'script' and host not in self.allowed_script_hosts
+
+    def _counter(self, page) -> dict:
+        if page not in self._counters:
+            self._counters[page] = {"bytes": 0, "requests": 0, "blocked": 0}
+        return self._counters[page]
+
+    def prepare(self, page):
+        """
+        Attaches the request policy and, in measurement mode, the byte counter to a
+        playwright.sync_api.Page.
+        """
+        if page in self._prepared:
+            return
+        self._prepared.add(page)
+        counter = self._counter(page)
+
+        if self.block:
+            def route(route):
+                request = route.request
+                if self.should_abort(request.resource_type, request.url):
+                    counter["blocked"] += 1
+                    route.abort()
+                else:
+                    route.continue_()
+
+            page.route('**/*', route)
+
+        if self.measure:
+            def finished(request):
+                sizes = request.sizes()
+                counter["bytes"] += sizes["responseHeadersSize"] + sizes["responseBodySize"]
+                counter["requests"] += 1
+
+            page.on('requestfinished', finished)
+
+    async def prepare_async(self, page):
+        """
+        Async counterpart of `prepare` for playwright.async_api pages.
+        """
+        if page in self._prepared:
+            return
+        self._prepared.add(page)
+        counter = self._counter(page)
+
+        if self.block:
+            async def route(route):
+                request = route.request
+                if self.should_abort(request.resource_type, request.url):
+                    counter["blocked"] += 1
+                    await route.abort()
+                else:
+                    await route.continue_()
+
+            await page.route('**/*', route)
+
+        if self.measure:
+            async def finished(request):
+                sizes = await request.sizes()
+                counter["bytes"] += sizes["responseHeadersSize"] + sizes["responseBodySize"]
+                counter["requests"] += 1
+
+            page.on('requestfinished', finished)
+
+    def begin(self, page) -> tuple:
+        """
+        Marks the start of a page load.
+
+        Returns:
+            tuple: Token to pass to `end`.
+        """
+        return dict(self._counter(page)), time.perf_counter()
+
+    def end(self, page, url: str, token: tuple):
+        """
+        Records the bytes, requests and time of the load started with `begin`. Requests
+        still in flight when the page was read are not counted.
+        """
+        if not self.measure:
+            return
+        before, started = token
+        counter = self._counter(page)
+        self.stats.record(url,
+                          counter["bytes"] - before["bytes"],
+                          counter["requests"] - before["requests"],
+                          counter["blocked"] - before["blocked"],
+                          time.perf_counter() - started)
+
+
+# Shared by fetches that are not given their own profile
+default_profile = fetch_profile()
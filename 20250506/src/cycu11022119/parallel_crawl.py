@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+This module crawls routes across several processes. Route IDs are sharded over worker
+processes that each render, parse and compact their routes; the records travel over a
+queue to one writer process, the only process that opens the SQLite database for
+writing, which batches them into data_route_info_busstop.
+
+If the writer dies, the crawl is aborted: workers stop instead of blocking on the full
+queue, and crawl_sharded raises with the writer's error.
+"""
+
+import multiprocessing
+import queue
+import time
+import traceback
+
+from cycu11022119.repository import BUS_STOP_COLUMNS, bus_route_orm, bus_stop_records, get_repository
+
+# Seconds a queue operation blocks before the abort flag and the writer are checked again
+QUEUE_TIMEOUT = 1.0
+# Seconds workers get to exit after an abort before they are terminated
+ABORT_GRACE = 10.0
+
+
+def _put(records, message: tuple, abort) -> bool:
+    """
+    Puts a message on the records queue, giving up once the crawl is aborted.
+
+    Returns:
+        bool: False if the crawl was aborted before the message could be queued.
+    """
+    while not abort.is_set():
+        try:
+            records.put(message, timeout=QUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _crawl_shard(shard: list, records, abort, working_directory: str):
+    """
+    Worker process: fetches and parses every route of its shard and sends
+    ('stops', route_id, rows) or ('failed', route_id, error) messages to the writer.
+    If the browser cannot be started, every route of the shard is reported failed.
+    Stops early if the crawl is aborted.
+    """
+    from cycu11022119.browser_pool import browser_pool
+    from cycu11022119.ebus_taipei import fetch_route_info_both
+
+    reported = 0
+    try:
+        with browser_pool(pool_size=1) as pool:
+            for route_id in shard:
+                try:
+                    rows = []
+                    for dataframe in fetch_route_info_both(route_id, working_directory, pool=pool):
+                        if dataframe is None:
+                            continue  # one-way and loop routes have no come direction
+                        rows.extend(tuple(record.values()) for record in bus_stop_records(dataframe))
+                    message = ('stops', route_id, rows)
+                except Exception as e:
+                    message = ('failed', route_id, str(e))
+                if not _put(records, message, abort):
+                    break
+                reported += 1
+    except Exception as e:
+        # The pool itself failed (e.g. Chromium did not launch); no route may go unreported
+        for route_id in shard[reported:]:
+            if not _put(records, ('failed', route_id, f"Browser pool failed: {e}"), abort):
+                break
+    finally:
+        if not _put(records, ('finished', None, None), abort):
+            # Nobody drains the queue any more; do not wait for it on exit
+            records.cancel_join_thread()
+
+
+def _write_batch(repository, rows: list, statuses: dict) -> int:
+    # Stops first: a crash in between leaves routes pending, and a re-crawl finds no changes
+    events = repository.sync_bus_stops([dict(zip(BUS_STOP_COLUMNS, row)) for row in rows])
+    with repository.engine.begin() as connection:
+        for flag in (1, 2):
+            route_ids = [route_id for route_id, value in statuses.items() if value == flag]
+            if route_ids:
+                connection.execute(
+                    bus_route_orm.__table__.update()
+                    .where(bus_route_orm.route_id.in_(route_ids))
+                    .values(route_data_updated=flag)
+                )
+    return len(events)
+
+
+def _write_records(records, results, working_directory: str, workers: int, batch_size: int):
+    """
+    Writer process: drains the queue until every worker has finished, diffing stops
+    against the database and setting route_data_updated flags in batches of about
+    `batch_size` rows. Sends ('summary', summary) to `results`, or ('error', traceback)
+    if writing fails.
+    """
+    try:
+        results.put(('summary', _drain_records(records, working_directory, workers, batch_size)))
+    except BaseException:
+        results.put(('error', traceback.format_exc()))
+        raise
+
+
+def _drain_records(records, working_directory: str, workers: int, batch_size: int) -> dict:
+    repository = get_repository(working_directory)
+    rows, statuses = [], {}
+    summary = {"rows": 0, "changes": 0, "succeeded": 0, "failed": {}}
+
+    finished = 0
+    while finished < workers:
+        kind, route_id, payload = records.get()
+        if kind == 'finished':
+            finished += 1
+        elif kind == 'stops':
+            rows.extend(payload)
+            statuses[route_id] = 1
+            summary["succeeded"] += 1
+        else:
+            statuses[route_id] = 2
+            summary["failed"][route_id] = payload
+
+        if len(rows) >= batch_size or (finished == workers and (rows or statuses)):
+            summary["changes"] += _write_batch(repository, rows, statuses)
+            summary["rows"] += len(rows)
+            rows, statuses = [], {}
+
+    repository.analyze()
+    return summary
+
+
+def crawl_sharded(route_ids: list, workers: int = 4, working_directory: str = 'data',
+                  batch_size: int = 2000) -> dict:
+    """
+    Crawls both directions of every route with `workers` fetch/parse processes and a
+    single writer process.
+
+    Args:
+        route_ids (list): Route IDs to crawl.
+        workers (int): Number of worker processes; route IDs are split round-robin.
+        working_directory (str): Directory holding the SQLite database.
+        batch_size (int): Stop rows per write transaction.
+
+    Returns:
+        dict: 'rows' parsed, 'changes' logged, 'succeeded' route count, 'failed' {route_id: error},
+            'elapsed' seconds and 'routes_per_sec'.
+
+    Raises:
+        RuntimeError: If the writer process fails; the workers are stopped first.
+    """
+    started = time.perf_counter()
+    workers = max(1, min(workers, len(route_ids)))
+    # Playwright's driver does not survive fork, so every process starts fresh
+    context = multiprocessing.get_context('spawn')
+    records = context.Queue(maxsize=workers * 16)
+    results = context.Queue()
+    abort = context.Event()
+
+    writer = context.Process(target=_write_records,
+                             args=(records, results, working_directory, workers, batch_size))
+    writer.start()
+
+    processes = [
+        context.Process(target=_crawl_shard,
+                        args=(route_ids[i::workers], records, abort, working_directory))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    outcome, reaped = None, set()
+    while outcome is None:
+        try:
+            outcome = results.get(timeout=QUEUE_TIMEOUT)
+            continue
+        except queue.Empty:
+            pass
+
+        for process in processes:
+            if process.pid not in reaped and process.exitcode is not None:
+                reaped.add(process.pid)
+                if process.exitcode < 0:
+                    # Killed by a signal before it could report; let the writer stop waiting for it
+                    _put(records, ('finished', None, None), abort)
+
+        if not writer.is_alive():
+            # The writer may have reported just before it exited
+            try:
+                outcome = results.get(timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                outcome = ('error', f"Writer process exited with code {writer.exitcode}")
+
+    kind, payload = outcome
+    if kind == 'error':
+        abort.set()
+        records.cancel_join_thread()
+        for process in processes:
+            process.join(ABORT_GRACE)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        writer.join()
+        raise RuntimeError(f"Writer process failed, crawl aborted:\n{payload}")
+
+    for process in processes:
+        process.join()
+    writer.join()
+    summary = payload
+
+    summary["elapsed"] = time.perf_counter() - started
+    done = summary["succeeded"] + len(summary["failed"])
+    summary["routes_per_sec"] = done / summary["elapsed"] if summary["elapsed"] > 0 else 0.0
+    return summary
+
+
+if __name__ == "__main__":
+    route_list = get_repository().session().query(bus_route_orm.route_id).all()
+    summary = crawl_sharded([route_id for route_id, in route_list],
+                            workers=multiprocessing.cpu_count())
+    print(f"{summary['succeeded']} routes ok, {len(summary['failed'])} failed, "
+          f"{summary['rows']} rows ({summary['changes']} changes) in {summary['elapsed']:.1f}s "
+          f"({summary['routes_per_sec']:.2f} routes/sec)")
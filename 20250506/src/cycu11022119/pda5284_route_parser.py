@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+This module extracts the stops of both directions from a pda5284 route page
+(MQS/route.jsp?rid=<rid>). Every stop is a table row whose class tells its direction,
+ttego1/ttego2 for go and tteback1/tteback2 for back, and whose first cell links to
+stop.jsp?sid=<sid>. The tables are nested, so searching every <table> for rows finds
+the same rows more than once; both backends instead classify each row once, in
+document order:
+
+    'regex': one pass of a regular expression over the rows of the page.
+    'lxml':  a single walk over the <tr> elements of the DOM built by lxml's C parser;
+             it does not depend on the exact markup of the row. Requires lxml.
+"""
+
+import html
+import re
+from typing import NamedTuple
+
+ROW_DIRECTIONS = {
+    'ttego1': 'go',
+    'ttego2': 'go',
+    'tteback1': 'back',
+    'tteback2': 'back',
+}
+
+ROW_PATTERN = re.compile(
+    r'<tr[^>]*\sclass="(tte(?:go|back)[12])"[^>]*>\s*<td[^>]*>(.*?)</td>',
+    re.DOTALL | re.IGNORECASE
+)
+LINK_PATTERN = re.compile(r'<a[^>]*\shref="([^"]*)"', re.IGNORECASE)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+class route_stop(NamedTuple):
+    """
+    One stop of a pda5284 route page.
+    """
+    direction: str
+    sequence: int
+    stop_name: str
+    stop_link: str
+    stop_id: int
+
+
+def stop_id_of(stop_link: str) -> int:
+    """
+    Returns the sid of a stop.jsp?sid=<sid> link, or None.
+    """
+    if not stop_link or 'sid=' not in stop_link:
+        return None
+    sid = stop_link.split('sid=', 1)[1].split('&', 1)[0]
+    return int(sid) if sid.isdigit() else None
+
+
+def _split(stops: list) -> tuple:
+    go = [stop for stop in stops if stop.direction == 'go']
+    back = [stop for stop in stops if stop.direction == 'back']
+    return go, back
+
+
+def parse_route_stops_regex(content: str) -> tuple:
+    """
+    Returns the (go, back) route_stop lists using the regular expression backend.
+    """
+    stops = []
+    sequences = {'go': 0, 'back': 0}
+    for match in ROW_PATTERN.finditer(content):
+        direction = ROW_DIRECTIONS[match.group(1).lower()]
+        cell = match.group(2)
+        link = LINK_PATTERN.search(cell)
+        stop_link = html.unescape(link.group(1)) if link else None
+        sequences[direction] += 1
+        stops.append(route_stop(direction, sequences[direction],
+                                html.unescape(TAG_PATTERN.sub('', cell)).strip(),
+                                stop_link, stop_id_of(stop_link)))
+    return _split(stops)
+
+
+def parse_route_stops_lxml(content: str) -> tuple:
+    """
+    Returns the (go, back) route_stop lists by walking the rows of the page once with lxml.
+
+    Raises:
+        ImportError: If lxml is not installed.
+    """
+    try:
+        from lxml import html as lxml_html
+    except ImportError as e:
+        raise ImportError("The 'lxml' parser backend requires lxml: pip install lxml") from e
+
+    stops = []
+    sequences = {'go': 0, 'back': 0}
+    for tr in lxml_html.fromstring(content).iter('tr'):
+        direction = None
+        for css_class in tr.get('class', '').split():
+            direction = ROW_DIRECTIONS.get(css_class)
+            if direction:
+                break
+        td = tr.find('td') if direction else None
+        if td is None:
+            continue
+
+        link = td.find('.//a')
+        stop_link = link.get('href') if link is not None else None
+        sequences[direction] += 1
+        stops.append(route_stop(direction, sequences[direction], td.text_content().strip(),
+                                stop_link, stop_id_of(stop_link)))
+    return _split(stops)
+
+
+PARSER_BACKENDS = {
+    'regex': parse_route_stops_regex,
+    'lxml': parse_route_stops_lxml,
+}
+
+
+def parse_route_stops(content: str, backend: str = 'regex') -> tuple:
+    """
+    Returns the stops of both directions of a pda5284 route page.
+
+    Args:
+        content (str): HTML of MQS/route.jsp.
+        backend (str): 'regex' or 'lxml', see PARSER_BACKENDS.
+
+    Returns:
+        tuple: (go, back), two lists of route_stop in stop order.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Parser backend must be one of {sorted(PARSER_BACKENDS)}")
+    return PARSER_BACKENDS[backend](content)
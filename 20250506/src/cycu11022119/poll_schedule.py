@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+This module decides when the arrival_poller polls a stop location next. After every
+poll the schedule gets the ETAs just read for the location's configured stops (None
+if the poll failed) and returns the next due time:
+
+    fixed_schedule      every `interval` seconds, on fixed slots.
+    adaptive_schedule   from the nearest ETA: a bus about to arrive is polled every
+                        `min_interval` seconds, one that is still far away again after
+                        a fraction of its ETA, and stops without a bus on the way
+                        (未發車, 末班已過, ...) rarely.
+"""
+
+import math
+
+# The stop page shows 將到站 below three minutes
+IMMINENT_SECONDS = 180
+# Seconds until the next poll of a location whose stops only report these ETA_STATUS codes
+STATUS_INTERVALS = {
+    -1: 120.0,   # 未發車: the first bus may leave the terminal any time
+    -2: 300.0,   # 交管不停
+    -3: 900.0,   # 末班已過
+    -4: 900.0,   # 今日未營運
+}
+
+
+def is_imminent(etas: list) -> bool:
+    """
+    Returns True if a bus is arriving within IMMINENT_SECONDS at one of the stops.
+    """
+    return any(0 <= eta < IMMINENT_SECONDS for eta in etas or ())
+
+
+class fixed_schedule:
+    """
+    Polls a location every `interval` seconds.
+
+    Slots keep their phase: a poll that ran late is followed by the next slot still
+    ahead, and slots passed over that way are counted in `skipped`.
+    """
+
+    def __init__(self, interval: float = 60.0):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self.skipped = 0
+
+    def next_poll(self, due: float, polled: float, etas: list) -> float:
+        """
+        Returns the due time of the next poll.
+
+        Args:
+            due (float): Due time of the poll that just finished.
+            polled (float): Time it was sent.
+            etas (list): ETAs read, or None if it failed (not used).
+        """
+        next_due = due + self.interval
+        if next_due <= polled:
+            missed = math.floor((polled - next_due) / self.interval) + 1
+            next_due += missed * self.interval
+            self.skipped += missed
+        return next_due
+
+
+class adaptive_schedule:
+    """
+    Polls a location again after an interval chosen from its nearest ETA.
+    """
+
+    def __init__(self, min_interval: float = 20.0, max_interval: float = 300.0,
+                 eta_fraction: float = 0.5, imminent: float = IMMINENT_SECONDS,
+                 status_intervals: dict = STATUS_INTERVALS, retry_interval: float = 30.0):
+        """
+        Args:
+            min_interval (float): Interval while a bus is imminent, and the shortest one.
+            max_interval (float): Longest interval while a bus is on its way.
+            eta_fraction (float): Fraction of the ETA to wait while the bus is far away.
+                The poll is also never later than the moment the bus becomes imminent.
+            imminent (float): ETA in seconds below which a bus counts as imminent.
+            status_intervals (dict): Interval per ETA_STATUS code, used when no stop of
+                the location has a bus on the way.
+            retry_interval (float): Interval after a failed poll.
+        """
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Intervals must satisfy 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.eta_fraction = eta_fraction
+        self.imminent = imminent
+        self.status_intervals = status_intervals
+        self.retry_interval = retry_interval
+        self.skipped = 0
+
+    def interval_for(self, etas: list) -> float:
+        """
+        Returns the seconds to wait after a poll that read `etas` (None: it failed).
+        """
+        if etas is None:
+            return self.retry_interval
+
+        arriving = [eta for eta in etas if eta >= 0]
+        if arriving:
+            eta = min(arriving)
+            if eta < self.imminent:
+                return self.min_interval
+            wait = min(eta * self.eta_fraction, eta - self.imminent)
+            return max(self.min_interval, min(self.max_interval, wait))
+
+        if not etas:
+            # None of the configured stops was in the response
+            return self.max_interval
+        return max(self.min_interval,
+                   min(self.status_intervals.get(eta, self.max_interval) for eta in etas))
+
+    def next_poll(self, due: float, polled: float, etas: list) -> float:
+        """
+        Returns the due time of the next poll, counted from when this one was sent.
+        """
+        return polled + self.interval_for(etas)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+This module holds the token bucket that every request of a polling process draws from,
+so the total request rate to a site stays under one limit however many worker threads
+send requests.
+"""
+
+import threading
+import time
+
+
+class token_bucket:
+    """
+    Thread-safe token bucket.
+
+    Tokens accrue at `rate` per second up to `capacity`, and every request takes one.
+    A burst of up to `capacity` requests passes at once; over any longer period the
+    rate never exceeds `rate`. Waiting callers are served in the order they arrived:
+    a caller reserves its token immediately, even if that leaves the bucket in debt,
+    and sleeps until the debt is paid off.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Largest burst. Defaults to one second's worth of tokens.
+
+        Raises:
+            ValueError: If rate or capacity is not positive.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        if self.capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.waited = 0.0  # total seconds callers slept for tokens
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        Takes tokens if they are available right now.
+
+        Returns:
+            bool: True if the tokens were taken.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """
+        Takes tokens, sleeping until the bucket can pay for them.
+
+        Args:
+            tokens (float): Tokens to take.
+            timeout (float): Longest sleep; None waits as long as needed.
+
+        Returns:
+            bool: True if the tokens were taken, False if that would take longer than
+                `timeout` (nothing is taken then).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                return False
+            self._tokens -= tokens
+            self.waited += wait
+
+        if wait > 0:
+            time.sleep(wait)
+        return True
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+This module serves the recorded eBus and pda5284 pages from data/ and bus_data/ over
+HTTP, as a local stand-in for the live sites. Crawlers are pointed at it through
+EBUS_BASE_URL / PDA5284_BASE_URL (see endpoints), so performance work can be measured
+reproducibly. Latency and error rate are configurable, and every request is recorded.
+
+Both sites are served from one address; their paths do not overlap:
+
+    /ebus, /ebus?ct=all                  data/hermes_ebus_taipei_route_list.html
+    /Route/StopsOfRoute?routeid=<id>     ebus_taipei_<id>.html
+    /MQS/routelist.jsp                   generated from the recorded bus_route_<rid>.html
+    /MQS/route.jsp?rid=<rid>             bus_route_<rid>.html
+    /MQS/stop.jsp?sid=<sid>              bus_stop_<sid>.html
+    /MQS/StopLocationDyna?stoplocationid=<id>
+                                         generated arrival estimates for the routes of
+                                         the recorded stop page of that location
+
+The arrival estimates are synthetic: every stop gets a bus every 10-20 minutes, so
+polled values change over time the way live ones do.
+
+With `fallback` on, an unrecorded route or stop gets a recorded page of the same kind,
+so a crawl over the whole route catalogue still has something to fetch.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DATA_DIRECTORIES = ('data', 'bus_data')
+STOP_LOCATION_PATTERN = re.compile(rb'StopLocationDyna\?stoplocationid=(\d+)')
+STOP_ROW_PATTERN = re.compile(rb'route\.jsp\?rid=(\d+)".*?stop\.jsp\?[^"]*sid=(\d+)"')
+
+
+class replay_server:
+    """
+    Threaded HTTP server replaying recorded pages with injected latency and errors.
+    """
+
+    def __init__(self, root: str = '.', host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 fallback: bool = True, seed: int = None):
+        """
+        Args:
+            root (str): Directory containing data/ and bus_data/.
+            host (str): Address to bind.
+            port (int): Port to bind; 0 picks a free one (see `base_url`).
+            latency (float): Seconds every response is delayed by.
+            jitter (float): Extra random delay, uniform in [0, jitter] seconds.
+            error_rate (float): Fraction of requests answered with 503.
+            fallback (bool): Serve a recorded page for unrecorded routes and stops.
+            seed (int): Seed of the latency and error draws, for repeatable runs.
+        """
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fallback = fallback
+        self.requests = []
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages = self._index(root)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @staticmethod
+    def _index(root: str) -> dict:
+        pages = {"route_list": None, "ebus": {}, "route": {}, "stop": {}, "location": {}}
+        for directory in DATA_DIRECTORIES:
+            path = os.path.join(root, directory)
+            if not os.path.isdir(path):
+                continue
+            for name in sorted(os.listdir(path)):
+                if not name.endswith('.html'):
+                    continue
+                file_path = os.path.join(path, name)
+                stem = name[:-len('.html')]
+                if name == 'hermes_ebus_taipei_route_list.html':
+                    pages["route_list"] = file_path
+                elif stem.startswith('ebus_taipei_'):
+                    pages["ebus"][stem[len('ebus_taipei_'):]] = file_path
+                elif stem.startswith('bus_route_'):
+                    pages["route"][stem[len('bus_route_'):]] = file_path
+                elif stem.startswith('bus_stop_'):
+                    pages["stop"][stem[len('bus_stop_'):]] = file_path
+                    with open(file_path, 'rb') as file:
+                        match = STOP_LOCATION_PATTERN.search(file.read())
+                    if match:
+                        pages["location"][match.group(1).decode()] = file_path
+        return pages
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _lookup(self, kind: str, key: str) -> str:
+        pages = self._pages[kind]
+        if key in pages:
+            return pages[key]
+        if self.fallback and pages:
+            return pages[min(pages)]
+        return None
+
+    def _route_list_jsp(self) -> bytes:
+        links = ''.join(f'<li><a href="route.jsp?rid={rid}">{rid}</a></li>'
+                        for rid in sorted(self._pages["route"]))
+        return (f'<html><head><meta charset="utf-8"></head><body><ul>{links}</ul>'
+                f'</body></html>').encode('utf-8')
+
+    @staticmethod
+    def _stop_location_dyna(file_path: str) -> bytes:
+        with open(file_path, 'rb') as file:
+            rows = STOP_ROW_PATTERN.findall(file.read())
+
+        now = time.time()
+        stops = []
+        for route_id, stop_id in rows:
+            stop_id = int(stop_id)
+            headway = 600 + stop_id % 11 * 60
+            eta = int(headway - (now + stop_id * 37) % headway)
+            stops.append({"n1": f"{route_id.decode()},{stop_id},0,05&#x3a;30,0,0,0,{eta}"})
+        update_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now + 8 * 3600))
+        return json.dumps({"UpdateTime": update_time, "Stop": stops}).encode('utf-8')
+
+    def resolve(self, path: str) -> bytes:
+        """
+        Returns the body served for a request path, or None for 404.
+        """
+        url = urlparse(path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        if url.path == '/MQS/routelist.jsp':
+            return self._route_list_jsp()
+        if url.path == '/MQS/StopLocationDyna' and 'stoplocationid' in query:
+            file_path = self._lookup("location", query['stoplocationid'])
+            return self._stop_location_dyna(file_path) if file_path else None
+
+        file_path = None
+        if url.path == '/ebus':
+            file_path = self._pages["route_list"]
+        elif url.path == '/Route/StopsOfRoute' and 'routeid' in query:
+            file_path = self._lookup("ebus", query['routeid'])
+        elif url.path == '/MQS/route.jsp' and 'rid' in query:
+            file_path = self._lookup("route", query['rid'])
+        elif url.path == '/MQS/stop.jsp' and 'sid' in query:
+            file_path = self._lookup("stop", query['sid'])
+
+        if file_path is None:
+            return None
+        with open(file_path, 'rb') as file:
+            return file.read()
+
+    def _handler(self):
+        server = self
+
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                started = time.perf_counter()
+                with server._lock:
+                    delay = server.latency + server._random.uniform(0.0, server.jitter)
+                    failed = server._random.random() < server.error_rate
+                if delay > 0:
+                    time.sleep(delay)
+
+                body = None if failed else server.resolve(self.path)
+                status = 503 if failed else (200 if body is not None else 404)
+                body = body or b''
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8'
+                                 if body.startswith(b'{') else 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+                with server._lock:
+                    server.requests.append({
+                        "path": self.path,
+                        "status": status,
+                        "bytes": len(body),
+                        "seconds": time.perf_counter() - started,
+                        "finished": time.time(),
+                    })
+
+            def log_message(self, format, *args):
+                pass
+
+        return handler
+
+    def start(self):
+        """
+        Serves requests on a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def reset(self) -> list:
+        """
+        Returns the recorded requests and starts a new record.
+        """
+        with self._lock:
+            requests, self.requests = self.requests, []
+        return requests
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded eBus and pda5284 pages.")
+    parser.add_argument('--root', default='.', help="Directory containing data/ and bus_data/")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds per response")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = replay_server(args.root, port=args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate)
+    print(f"Serving on {server.base_url}; set EBUS_BASE_URL and PDA5284_BASE_URL to it.")
+    try:
+        server.start()._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
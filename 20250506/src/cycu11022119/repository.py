@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+This module owns the hermes_ebus_taipei.sqlite3 database: the ORM mappings are declared
+once, and one engine (with its connection pool) is kept per database file and process,
+so route objects share it instead of rebuilding engines and re-checking the schema.
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine, event, inspect, text, Column, String, Float, Index, Integer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+from cycu11022119.change_log import diff_route_stops
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DATABASE_FILE = 'hermes_ebus_taipei.sqlite3'
+BUS_STOP_KEY = ["route_id", "direction", "stop_number"]
+BUS_STOP_COLUMNS = ["stop_id", "arrival_info", "stop_number", "stop_name",
+                    "latitude", "longitude", "direction", "route_id"]
+
+# PRAGMAs applied to every new connection. 'performance' lets a crawler write while
+# readers query (WAL), fsyncs only at checkpoints and keeps a 64 MiB page cache.
+STORAGE_PROFILES = {
+    'default': {},
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'temp_store': 'MEMORY',
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+    },
+}
+
+Base = declarative_base()
+
+
+class bus_route_orm(Base):
+    __tablename__ = 'data_route_list'
+
+    route_id = Column(String, primary_key=True)
+    route_name = Column(String)
+    route_data_updated = Column(Integer, default=0)
+
+
+class bus_stop_orm(Base):
+    __tablename__ = "data_route_info_busstop"
+
+    stop_id = Column(Integer)
+    arrival_info = Column(String)
+    stop_number = Column(Integer, primary_key=True)
+    stop_name = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    direction = Column(String, primary_key=True)
+    route_id = Column(String, primary_key=True)
+
+    __table_args__ = (
+        Index('ix_busstop_stop_id', 'stop_id'),
+        Index('ix_busstop_route_direction', 'route_id', 'direction'),
+        Index('ix_busstop_stop_name', 'stop_name'),
+    )
+
+
+class route_crawl_state_orm(Base):
+    __tablename__ = "data_route_crawl_state"
+
+    route_id = Column(String, primary_key=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(Float, default=0.0)
+    last_error = Column(String)
+
+
+class route_change_orm(Base):
+    __tablename__ = "data_route_change_log"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    crawled_at = Column(String)
+    route_id = Column(String)
+    direction = Column(String)
+    change = Column(String)
+    stop_id = Column(Integer)
+    stop_name = Column(String)
+    old_stop_number = Column(Integer)
+    stop_number = Column(Integer)
+    latitude = Column(Float)
+    longitude = Column(Float)
+
+    __table_args__ = (
+        Index('ix_change_log_route_crawled', 'route_id', 'crawled_at'),
+    )
+
+
+def upsert_rows(connection, table, rows: list, key_columns: list, update_columns: list = None) -> int:
+    """
+    Writes rows with a single executemany `INSERT ... ON CONFLICT DO UPDATE`.
+
+    Args:
+        connection: SQLAlchemy connection inside an open transaction.
+        table (sqlalchemy.Table): Target table.
+        rows (list): Row dictionaries keyed by column name.
+        key_columns (list): Columns of the primary key / conflict target.
+        update_columns (list): Columns overwritten on conflict. Defaults to every
+            non-key column present in the rows.
+
+    Returns:
+        int: Number of rows written.
+    """
+    if not rows:
+        return 0
+
+    if update_columns is None:
+        update_columns = [name for name in rows[0] if name not in key_columns]
+
+    statement = sqlite_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={name: statement.excluded[name] for name in update_columns}
+    )
+    connection.execute(statement, rows)
+    return len(rows)
+
+
+def bus_stop_records(dataframe: 'pd.DataFrame') -> list:
+    """
+    Converts a parse_route_info() DataFrame to row dictionaries typed like data_route_info_busstop.
+    """
+    typed = dataframe.astype({
+        "stop_id": "int64",
+        "stop_number": "int64",
+        "latitude": "float64",
+        "longitude": "float64",
+    })
+    return typed[BUS_STOP_COLUMNS].to_dict("records")
+
+
+class hermes_repository:
+    """
+    One engine, one metadata and one session factory for a hermes SQLite database file.
+    """
+
+    def __init__(self, working_directory: str = 'data', profile: str = 'performance',
+                 readonly: bool = False):
+        """
+        Creates the engine and makes sure the schema and its indexes exist. Use
+        `get_repository` instead of calling this directly, so the instance is shared.
+
+        Args:
+            working_directory (str): Directory holding the database file.
+            profile (str): Key of STORAGE_PROFILES applied to every connection.
+            readonly (bool): Open an existing database read-only (SQLite mode=ro), for
+                queries: no schema or index is created and no PRAGMA is applied, so the
+                file and its journal mode stay as they are.
+
+        Raises:
+            FileNotFoundError: If `readonly` is set and the database does not exist.
+        """
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Storage profile must be one of {sorted(STORAGE_PROFILES)}")
+
+        self.working_directory = working_directory
+        self.db_file = os.path.join(working_directory, DATABASE_FILE)
+        self.profile = profile
+        self.readonly = readonly
+        self.pid = os.getpid()
+
+        if readonly:
+            if not os.path.exists(self.db_file):
+                raise FileNotFoundError(f"No database at {self.db_file}")
+            self.engine = create_engine(
+                f'sqlite:///file:{os.path.abspath(self.db_file)}?mode=ro&uri=true')
+            self.Session = sessionmaker(bind=self.engine)
+            return
+
+        os.makedirs(working_directory, exist_ok=True)
+        self.engine = create_engine(f'sqlite:///{self.db_file}')
+        pragmas = STORAGE_PROFILES[profile]
+        if pragmas:
+            @event.listens_for(self.engine, "connect")
+            def _apply_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+                cursor.close()
+
+        Base.metadata.create_all(self.engine)
+        # create_all skips indexes of tables that already exist, e.g. in older databases
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+        self.Session = sessionmaker(bind=self.engine)
+
+    def session(self):
+        """
+        Returns a new ORM session bound to the shared engine.
+        """
+        return self.Session()
+
+    def has_table(self, orm) -> bool:
+        """
+        Returns True if the table of an ORM class exists; a read-only repository does
+        not create missing tables, e.g. the change log of a database never crawled.
+        """
+        return inspect(self.engine).has_table(orm.__tablename__)
+
+    def upsert_route_list(self, dataframe: 'pd.DataFrame') -> int:
+        """
+        Upserts route_id/route_name rows, leaving route_data_updated of known routes untouched.
+        """
+        rows = dataframe[["route_id", "route_name"]].to_dict("records")
+        with self.engine.begin() as connection:
+            return upsert_rows(connection, bus_route_orm.__table__, rows, ["route_id"])
+
+    def upsert_bus_stops(self, dataframes) -> int:
+        """
+        Upserts the stops of one or more parse_route_info() DataFrames in one transaction.
+
+        Args:
+            dataframes (list or pd.DataFrame): DataFrames to write.
+
+        Returns:
+            int: Number of rows written.
+        """
+        import pandas as pd
+
+        if isinstance(dataframes, pd.DataFrame):
+            dataframes = [dataframes]
+
+        rows = []
+        for dataframe in dataframes:
+            rows.extend(bus_stop_records(dataframe))
+
+        with self.engine.begin() as connection:
+            return upsert_rows(connection, bus_stop_orm.__table__, rows, BUS_STOP_KEY)
+
+    def sync_bus_stops(self, records, crawled_at: str = None) -> list:
+        """
+        Writes only the stops that differ from the stored rows of their route direction
+        and appends the differences to data_route_change_log, in one transaction.
+
+        arrival_info of unchanged stops is not rewritten; the table describes the
+        route, not live arrivals.
+
+        Args:
+            records (list or pd.DataFrame): Row dictionaries as from bus_stop_records(),
+                or parse_route_info() DataFrames (one or a list). Every route direction
+                present is taken to be complete.
+            crawled_at (str): ISO timestamp stored with the events. Defaults to now.
+
+        Returns:
+            list: The change events written.
+        """
+        import pandas as pd
+
+        if isinstance(records, pd.DataFrame):
+            records = [records]
+        if records and isinstance(records[0], pd.DataFrame):
+            records = [record for dataframe in records for record in bus_stop_records(dataframe)]
+
+        crawled_at = crawled_at or datetime.now().isoformat(timespec='seconds')
+        fresh = defaultdict(list)
+        for record in records:
+            fresh[(record["route_id"], record["direction"])].append(record)
+
+        table = bus_stop_orm.__table__
+        events = []
+        with self.engine.begin() as connection:
+            stored = defaultdict(list)
+            route_ids = sorted({route_id for route_id, _ in fresh})
+            for start in range(0, len(route_ids), 500):
+                query = table.select().where(table.c.route_id.in_(route_ids[start:start + 500]))
+                for row in connection.execute(query).mappings():
+                    stored[(row["route_id"], row["direction"])].append(dict(row))
+
+            upserts = []
+            for key, rows in fresh.items():
+                route_events, route_upserts, deleted = diff_route_stops(stored.get(key, []), rows)
+                events.extend(route_events)
+                upserts.extend(route_upserts)
+                if deleted:
+                    connection.execute(table.delete()
+                                       .where(table.c.route_id == key[0])
+                                       .where(table.c.direction == key[1])
+                                       .where(table.c.stop_number.in_(deleted)))
+
+            upsert_rows(connection, table, upserts, BUS_STOP_KEY)
+            if events:
+                connection.execute(route_change_orm.__table__.insert(),
+                                   [dict(event, crawled_at=crawled_at) for event in events])
+        return events
+
+    def analyze(self):
+        """
+        Refreshes the query planner statistics; run after bulk loads.
+        """
+        with self.engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+
+    def dispose(self):
+        """
+        Closes every pooled connection.
+        """
+        self.engine.dispose()
+
+
+_repositories = {}
+
+
+def get_repository(working_directory: str = 'data', profile: str = 'performance',
+                   readonly: bool = False) -> hermes_repository:
+    """
+    Returns the process-wide repository for the database in `working_directory`, or
+    its read-only counterpart for queries (see hermes_repository).
+
+    Engines must not cross a fork, so a child process gets its own instance. The
+    profile only takes effect when the instance is first created.
+    """
+    key = (os.path.abspath(working_directory), readonly)
+    repository = _repositories.get(key)
+    if repository is None or repository.pid != os.getpid():
+        repository = hermes_repository(working_directory, profile, readonly)
+        _repositories[key] = repository
+    return repository
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+This module extracts bus stops from a rendered StopsOfRoute page. Two interchangeable
+backends return the same six fields per stop:
+
+    'regex': one DOTALL regular expression over the direction's section of the page.
+             The fast default, but it relies on the markup's attribute order: on a page
+             whose inputs list value= before name= it finds nothing, after backtracking
+             for hundreds of milliseconds.
+    'lxml':  a single walk over the station-list DOM built by lxml. The robust backend:
+             attribute order and whitespace do not matter. About 2-8 times slower than
+             the regex on well-formed pages, since building the DOM of a station list
+             alone costs more than the whole regex parse. Requires lxml.
+"""
+
+import re
+
+STOP_FIELDS = ["arrival_info", "stop_number", "stop_name", "stop_id", "latitude", "longitude"]
+DIRECTION_CONTAINERS = {'go': 'id="GoDirectionRoute"', 'come': 'id="BackDirectionRoute"'}
+
+STOP_PATTERN = re.compile(
+    r'<li>.*?<span class="auto-list-stationlist-position.*?">(.*?)</span>\s*'
+    r'<span class="auto-list-stationlist-number">\s*(\d+)</span>\s*'
+    r'<span class="auto-list-stationlist-place">(.*?)</span>.*?'
+    r'<input[^>]+name="item\.UniStopId"[^>]+value="(\d+)"[^>]*>.*?'
+    r'<input[^>]+name="item\.Latitude"[^>]+value="([\d\.]+)"[^>]*>.*?'
+    r'<input[^>]+name="item\.Longitude"[^>]+value="([\d\.]+)"[^>]*>',
+    re.DOTALL
+)
+
+_SPAN_FIELDS = {
+    'auto-list-stationlist-position': 'arrival_info',
+    'auto-list-stationlist-number': 'stop_number',
+    'auto-list-stationlist-place': 'stop_name',
+}
+_INPUT_FIELDS = {
+    'item.UniStopId': 'stop_id',
+    'item.Latitude': 'latitude',
+    'item.Longitude': 'longitude',
+}
+
+
+def direction_section(content: str, direction: str) -> str:
+    """
+    Returns the part of a StopsOfRoute page that holds the station list of one direction.
+
+    The page renders both lists, under #GoDirectionRoute and #BackDirectionRoute, and the
+    come/go tab only toggles which one is visible. A page with only one of the containers
+    (one-way and loop routes) has an empty section for the other direction; content
+    without either container is returned unchanged.
+    """
+    go_start = content.find(DIRECTION_CONTAINERS['go'])
+    come_start = content.find(DIRECTION_CONTAINERS['come'])
+    if go_start < 0 and come_start < 0:
+        return content
+
+    start, other = (go_start, come_start) if direction == 'go' else (come_start, go_start)
+    if start < 0:
+        return ''
+    return content[start:other] if start < other else content[start:]
+
+
+def station_list(content: str, direction: str) -> str:
+    """
+    Returns the section of one direction up to the end of its station list (</ul>),
+    leaving out the scroll bars and scripts that follow it.
+    """
+    section = direction_section(content, direction)
+    end = section.find('</ul>')
+    return section[:end + len('</ul>')] if end >= 0 else section
+
+
+def parse_stops_regex(content: str, direction: str) -> list:
+    """
+    Returns (arrival_info, stop_number, stop_name, stop_id, latitude, longitude) tuples
+    using the regular expression backend.
+    """
+    return STOP_PATTERN.findall(direction_section(content, direction))
+
+
+def parse_stops_lxml(content: str, direction: str) -> list:
+    """
+    Returns (arrival_info, stop_number, stop_name, stop_id, latitude, longitude) tuples
+    by walking the direction's station list once with lxml. Slower than
+    parse_stops_regex, but independent of attribute order and markup whitespace.
+
+    Raises:
+        ImportError: If lxml is not installed.
+    """
+    try:
+        from lxml import html as lxml_html
+    except ImportError as e:
+        raise ImportError("The 'lxml' parser backend requires lxml: pip install lxml") from e
+
+    # Only the direction's list is handed to the parser; the rest of the page is
+    # scripts and layout that would dominate the parse time
+    scope = lxml_html.fromstring(station_list(content, direction))
+
+    stops = []
+    current = None
+    for element in scope.iter('span', 'input'):
+        if element.tag == 'input':
+            field = _INPUT_FIELDS.get(element.get('name'))
+            if current is not None and field:
+                current[field] = element.get('value', '')
+            continue
+
+        classes = element.get('class', '').split()
+        if 'auto-list-stationlist' in classes:
+            if current is not None and len(current) == len(STOP_FIELDS):
+                stops.append(tuple(current[name] for name in STOP_FIELDS))
+            current = {}
+        elif current is not None:
+            for css_class in classes:
+                field = _SPAN_FIELDS.get(css_class)
+                if field:
+                    current[field] = element.text_content().strip()
+                    break
+
+    if current is not None and len(current) == len(STOP_FIELDS):
+        stops.append(tuple(current[name] for name in STOP_FIELDS))
+    return stops
+
+
+PARSER_BACKENDS = {
+    'regex': parse_stops_regex,
+    'lxml': parse_stops_lxml,
+}
+
+
+def parse_stops(content: str, direction: str, backend: str = 'regex') -> list:
+    """
+    Returns the stops of one direction with the selected backend.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Parser backend must be one of {sorted(PARSER_BACKENDS)}")
+    return PARSER_BACKENDS[backend](content, direction)
@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps the history of raw page snapshots (pda5284 stop and route pages, eBus
+route pages) in one SQLite file, so old crawls can be re-parsed without keeping a
+directory of HTML files per run.
+
+    object     page bodies, content-addressed by SHA-256: a page fetched again
+               unchanged is stored once. A body is either a keyframe, compressed on
+               its own, or a delta against a keyframe (base_id)
+    snapshot   (kind, key, taken_at) -> object, the primary key doubling as the
+               index for "page of stop X as of time T" and range scans
+    dictionary compression dictionaries, one trained per kind of page
+
+Pages of one kind share most of their markup (scripts, headers, table layout), so
+bodies are compressed with a dictionary trained on earlier pages of that kind: zstd
+when the zstandard package is installed, otherwise zlib with a preset dictionary
+(zdict) of the lines most pages share. The first `train_after` pages of a kind are
+compressed without a dictionary; the dictionary is then trained on them, and they are
+recompressed with it.
+
+Pages of one key barely change between crawls (the arrival estimates do), and a
+dictionary cannot hold a whole 300 KiB eBus route page, so a changed page is stored as
+a delta: compressed with the key's latest keyframe as its dictionary. zlib only looks
+back 32 KiB, so there the page is compressed in DELTA_SEGMENT pieces, each against the
+same region of the keyframe. Deltas always refer to a keyframe, never to another delta,
+so reading a page decompresses at most two bodies; a key gets a new keyframe after
+KEYFRAME_EVERY deltas, or when a page has changed so much that it compresses better on
+its own.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+# File names of saved pages -> (kind, key)
+SNAPSHOT_FILE_PATTERNS = (
+    (re.compile(r'bus_stop_(\d+)\.html$'), 'stop'),
+    (re.compile(r'bus_route_(\d+)\.html$'), 'route'),
+    (re.compile(r'ebus_taipei_(\w+)\.html$'), 'ebus_route'),
+    (re.compile(r'hermes_ebus_taipei_route_list\.html$'), 'ebus_route_list'),
+)
+ZLIB_DICTIONARY_SIZE = 32 * 1024  # the largest window zlib can refer back into
+ZSTD_DICTIONARY_SIZE = 112 * 1024
+TRAIN_AFTER = 16
+TRAINING_SAMPLES = 256
+COMPRESSION_LEVEL = 9
+KEYFRAME_EVERY = 64
+# Segment + 2 margins must fit the 32 KiB zlib window, so a segment can match
+# keyframe content that moved by up to DELTA_MARGIN bytes
+DELTA_SEGMENT = 12 * 1024
+DELTA_MARGIN = 2 * 1024
+# Keyframes kept decompressed for reading deltas
+BASE_CACHE_SIZE = 16
+
+
+def available_codec() -> str:
+    """
+    Returns 'zstd' if the zstandard package is installed, otherwise 'zlib'.
+    """
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return 'zlib'
+    return 'zstd'
+
+
+def snapshot_file_key(file_name: str) -> tuple:
+    """
+    Returns the (kind, key) of a saved page file name, or None for other files.
+    """
+    for pattern, kind in SNAPSHOT_FILE_PATTERNS:
+        match = pattern.search(file_name)
+        if match:
+            return kind, match.group(1) if pattern.groups else ''
+    return None
+
+
+def train_shared_lines(samples: list, size: int = ZLIB_DICTIONARY_SIZE) -> bytes:
+    """
+    Returns a raw-content dictionary of the lines that recur across samples.
+
+    A line makes it in if at least a quarter of the samples (and two) contain it. The
+    most common lines go last: zlib and zstd encode nearby matches more cheaply.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update(line for line in set(sample.splitlines(keepends=True)) if len(line) >= 8)
+
+    threshold = max(2, len(samples) // 4)
+    picked, total = [], 0
+    for line, count in counts.most_common():
+        if count < threshold:
+            break
+        if total + len(line) <= size:
+            picked.append(line)
+            total += len(line)
+    return b''.join(reversed(picked))
+
+
+class _codec:
+    """
+    Compressor and decompressor of one codec, with or without a dictionary.
+    """
+
+    def __init__(self, name: str, dictionary: bytes = None):
+        self.name = name
+        self.dictionary = dictionary
+        if name == 'zstd':
+            import zstandard
+
+            dict_data = (zstandard.ZstdCompressionDict(dictionary) if dictionary else None)
+            self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dict_data)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+        elif name != 'zlib':
+            raise ValueError(f"Unknown codec: {name}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == 'zstd':
+            return self._compressor.compress(data)
+        compressor = (zlib.compressobj(COMPRESSION_LEVEL, zdict=self.dictionary)
+                      if self.dictionary else zlib.compressobj(COMPRESSION_LEVEL))
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.name == 'zstd':
+            return self._decompressor.decompress(data)
+        decompressor = (zlib.decompressobj(zdict=self.dictionary)
+                        if self.dictionary else zlib.decompressobj())
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+def _base_window(base: bytes, start: int) -> bytes:
+    return base[max(0, start - DELTA_MARGIN):start + DELTA_SEGMENT + DELTA_MARGIN]
+
+
+def compress_delta(data: bytes, base: bytes, codec: str) -> bytes:
+    """
+    Compresses `data` using `base`, an earlier version of the same page, as dictionary.
+    """
+    if codec == 'zstd':
+        import zstandard
+
+        dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dict_data).compress(data)
+
+    parts = []
+    for start in range(0, len(data), DELTA_SEGMENT):
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=_base_window(base, start))
+        parts.append(compressor.compress(data[start:start + DELTA_SEGMENT]) + compressor.flush())
+    return b''.join(parts)
+
+
+def decompress_delta(data: bytes, base: bytes, codec: str) -> bytes:
+    """
+    Reverses compress_delta().
+    """
+    if codec == 'zstd':
+        import zstandard
+
+        dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+
+    # The segments are concatenated zlib streams; each ends where unused_data starts
+    parts, start = [], 0
+    while data:
+        decompressor = zlib.decompressobj(zdict=_base_window(base, start))
+        part = decompressor.decompress(data) + decompressor.flush()
+        parts.append(part)
+        start += len(part)
+        data = decompressor.unused_data
+    return b''.join(parts)
+
+
+def train_dictionary(samples: list, codec: str) -> bytes:
+    """
+    Returns a compression dictionary for pages like `samples` (bytes).
+
+    zstd dictionaries are trained with zstandard.train_dictionary; if that fails, e.g.
+    on too few samples, both codecs use train_shared_lines().
+    """
+    if codec == 'zstd':
+        import zstandard
+
+        try:
+            return zstandard.train_dictionary(ZSTD_DICTIONARY_SIZE, samples).as_bytes()
+        except zstandard.ZstdError:
+            return train_shared_lines(samples, ZSTD_DICTIONARY_SIZE)
+    return train_shared_lines(samples, ZLIB_DICTIONARY_SIZE)
+
+
+class snapshot_archive:
+    """
+    Compressed, deduplicated and indexed archive of page snapshots. Thread-safe.
+    """
+
+    def __init__(self, path: str = os.path.join('data', 'snapshot_archive.sqlite3'),
+                 codec: str = None, train_after: int = TRAIN_AFTER):
+        """
+        Opens (or creates) an archive.
+
+        Args:
+            path (str): SQLite file of the archive.
+            codec (str): 'zstd' or 'zlib' for new pages. Defaults to available_codec().
+                Pages are always read back with the codec they were written with.
+            train_after (int): Keyframes of a kind stored before its dictionary is trained.
+        """
+        self.path = path
+        self.codec = codec or available_codec()
+        self.train_after = train_after
+        self._codecs = {}
+        self._bases = OrderedDict()
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS dictionary (
+                    id INTEGER PRIMARY KEY, kind TEXT NOT NULL, codec TEXT NOT NULL,
+                    created_at INTEGER NOT NULL, data BLOB NOT NULL);
+                CREATE TABLE IF NOT EXISTS object (
+                    id INTEGER PRIMARY KEY, digest BLOB NOT NULL UNIQUE, kind TEXT NOT NULL,
+                    codec TEXT NOT NULL, dictionary_id INTEGER, base_id INTEGER,
+                    size INTEGER NOT NULL, data BLOB NOT NULL);
+                CREATE INDEX IF NOT EXISTS object_base ON object (base_id);
+                CREATE TABLE IF NOT EXISTS snapshot (
+                    kind TEXT NOT NULL, key TEXT NOT NULL, taken_at INTEGER NOT NULL,
+                    object_id INTEGER NOT NULL, PRIMARY KEY (kind, key, taken_at)
+                ) WITHOUT ROWID;
+            ''')
+
+    def _codec(self, name: str, dictionary_id: int = None) -> _codec:
+        cache_key = (name, dictionary_id)
+        if cache_key not in self._codecs:
+            dictionary = None
+            if dictionary_id is not None:
+                dictionary = self._connection.execute(
+                    'SELECT data FROM dictionary WHERE id = ?', (dictionary_id,)).fetchone()[0]
+            self._codecs[cache_key] = _codec(name, dictionary)
+        return self._codecs[cache_key]
+
+    def _dictionary_id(self, kind: str) -> int:
+        row = self._connection.execute(
+            'SELECT MAX(id) FROM dictionary WHERE kind = ? AND codec = ?',
+            (kind, self.codec)).fetchone()
+        return row[0]
+
+    def put(self, kind: str, key: str, content: str, taken_at: float = None) -> bool:
+        """
+        Records a snapshot of a page.
+
+        Args:
+            kind (str): Kind of page, e.g. 'stop', 'route', 'ebus_route'.
+            key (str): ID of the page within its kind, e.g. the stop ID.
+            content (str): Page body.
+            taken_at (float): Epoch seconds the page was fetched. Defaults to now; a
+                second snapshot of the same page in the same second replaces the first.
+
+        Returns:
+            bool: True if the body was new to the archive, False if it was deduplicated.
+        """
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).digest()
+        taken_at = int(taken_at if taken_at is not None else time.time())
+
+        with self._lock:
+            with self._connection:
+                row = self._connection.execute('SELECT id FROM object WHERE digest = ?',
+                                               (digest,)).fetchone()
+                stored = row is None
+                if stored:
+                    object_id, keyframe = self._store(kind, str(key), data, digest)
+                else:
+                    object_id = row[0]
+                self._connection.execute('INSERT OR REPLACE INTO snapshot VALUES (?, ?, ?, ?)',
+                                         (kind, str(key), taken_at, object_id))
+
+            if stored and keyframe and self.train_after and self._dictionary_id(kind) is None:
+                untrained = self._connection.execute(
+                    'SELECT COUNT(*) FROM object WHERE kind = ? AND codec = ? '
+                    'AND dictionary_id IS NULL AND base_id IS NULL',
+                    (kind, self.codec)).fetchone()[0]
+                if untrained >= self.train_after:
+                    self.train(kind)
+        return stored
+
+    def _store(self, kind: str, key: str, data: bytes, digest: bytes) -> tuple:
+        """
+        Compresses and inserts a new body, as a delta against the key's current
+        keyframe if it has one with room for more deltas.
+
+        Returns:
+            tuple: (object ID, True if it was stored as a keyframe)
+        """
+        base_id = None
+        latest = self._connection.execute(
+            'SELECT object.id, object.base_id FROM snapshot '
+            'JOIN object ON object.id = snapshot.object_id '
+            'WHERE snapshot.kind = ? AND snapshot.key = ? '
+            'ORDER BY snapshot.taken_at DESC LIMIT 1', (kind, key)).fetchone()
+        if latest is not None:
+            base_id = latest[1] if latest[1] is not None else latest[0]
+            deltas = self._connection.execute('SELECT COUNT(*) FROM object WHERE base_id = ?',
+                                              (base_id,)).fetchone()[0]
+            if deltas >= KEYFRAME_EVERY:
+                base_id = None
+
+        dictionary_id = None
+        if base_id is not None:
+            compressed = compress_delta(data, self._base(base_id), self.codec)
+            if len(compressed) * 8 > len(data):
+                # Changed a lot: check whether it does better as a keyframe
+                keyframe_id = self._dictionary_id(kind)
+                full = self._codec(self.codec, keyframe_id).compress(data)
+                if len(full) < len(compressed):
+                    base_id, dictionary_id, compressed = None, keyframe_id, full
+        else:
+            dictionary_id = self._dictionary_id(kind)
+            compressed = self._codec(self.codec, dictionary_id).compress(data)
+
+        object_id = self._connection.execute(
+            'INSERT INTO object (digest, kind, codec, dictionary_id, base_id, size, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (digest, kind, self.codec, dictionary_id, base_id, len(data), compressed)).lastrowid
+        return object_id, base_id is None
+
+    def train(self, kind: str) -> int:
+        """
+        Trains a dictionary for a kind of page on its most recent keyframes, and
+        recompresses the keyframes of that kind still stored without a dictionary.
+        Deltas are left as they are: they refer to the keyframe's content, not its
+        compressed form.
+
+        Returns:
+            int: ID of the new dictionary, or None if the kind has no pages yet.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT codec, dictionary_id, data FROM object WHERE kind = ? AND base_id IS NULL '
+                'ORDER BY id DESC LIMIT ?', (kind, TRAINING_SAMPLES)).fetchall()
+            if not rows:
+                return None
+            samples = [self._codec(codec, dictionary_id).decompress(data)
+                       for codec, dictionary_id, data in rows]
+            dictionary = train_dictionary(samples, self.codec)
+
+            with self._connection:
+                dictionary_id = self._connection.execute(
+                    'INSERT INTO dictionary (kind, codec, created_at, data) VALUES (?, ?, ?, ?)',
+                    (kind, self.codec, int(time.time()), dictionary)).lastrowid
+                codec = self._codec(self.codec, dictionary_id)
+                untrained = self._connection.execute(
+                    'SELECT id, codec, data FROM object '
+                    'WHERE kind = ? AND dictionary_id IS NULL AND base_id IS NULL',
+                    (kind,)).fetchall()
+                self._connection.executemany(
+                    'UPDATE object SET codec = ?, dictionary_id = ?, data = ? WHERE id = ?',
+                    [(self.codec, dictionary_id,
+                      codec.compress(self._codec(old_codec).decompress(data)), object_id)
+                     for object_id, old_codec, data in untrained])
+            return dictionary_id
+
+    def _base(self, object_id: int) -> bytes:
+        if object_id in self._bases:
+            self._bases.move_to_end(object_id)
+        else:
+            self._bases[object_id] = self._load_bytes(object_id)
+            if len(self._bases) > BASE_CACHE_SIZE:
+                self._bases.popitem(last=False)
+        return self._bases[object_id]
+
+    def _load_bytes(self, object_id: int) -> bytes:
+        codec, dictionary_id, base_id, data = self._connection.execute(
+            'SELECT codec, dictionary_id, base_id, data FROM object WHERE id = ?',
+            (object_id,)).fetchone()
+        if base_id is not None:
+            return decompress_delta(data, self._base(base_id), codec)
+        return self._codec(codec, dictionary_id).decompress(data)
+
+    def _load(self, object_id: int) -> str:
+        return self._load_bytes(object_id).decode('utf-8')
+
+    def get(self, kind: str, key: str, at: float = None) -> str:
+        """
+        Returns the page of `key` as of time `at` (the latest snapshot taken at or
+        before it), or the latest page if `at` is None; None if there is none.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT object_id FROM snapshot WHERE kind = ? AND key = ? AND taken_at <= ? '
+                'ORDER BY taken_at DESC LIMIT 1',
+                (kind, str(key), int(at) if at is not None else 2 ** 62)).fetchone()
+            return self._load(row[0]) if row is not None else None
+
+    def history(self, kind: str, key: str = None, since: float = None, until: float = None):
+        """
+        Yields (key, taken_at, content) for the snapshots of a kind, optionally of one key
+        and within [since, until), ordered by key and time. A body shared by consecutive
+        snapshots is decompressed once.
+        """
+        conditions, params = ['kind = ?'], [kind]
+        if key is not None:
+            conditions.append('key = ?')
+            params.append(str(key))
+        if since is not None:
+            conditions.append('taken_at >= ?')
+            params.append(int(since))
+        if until is not None:
+            conditions.append('taken_at < ?')
+            params.append(int(until))
+
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT key, taken_at, object_id FROM snapshot WHERE {' AND '.join(conditions)} "
+                f"ORDER BY key, taken_at", params).fetchall()
+
+        last_id, content = None, None
+        for snapshot_key, taken_at, object_id in rows:
+            if object_id != last_id:
+                with self._lock:
+                    content = self._load(object_id)
+                last_id = object_id
+            yield snapshot_key, taken_at, content
+
+    def keys(self, kind: str) -> list:
+        """
+        Returns the keys of a kind that have at least one snapshot.
+        """
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                'SELECT DISTINCT key FROM snapshot WHERE kind = ? ORDER BY key', (kind,))]
+
+    def import_files(self, paths: list) -> int:
+        """
+        Archives saved pages (bus_stop_<sid>.html, bus_route_<rid>.html,
+        ebus_taipei_<id>.html, ...) with their modification time as taken_at. Files
+        with other names are skipped.
+
+        Returns:
+            int: Number of files archived.
+        """
+        archived = 0
+        for path in paths:
+            kind_key = snapshot_file_key(os.path.basename(path))
+            if kind_key is None:
+                continue
+            with open(path, encoding='utf-8') as file:
+                self.put(*kind_key, file.read(), taken_at=os.path.getmtime(path))
+            archived += 1
+        return archived
+
+    def stats(self) -> dict:
+        """
+        Returns snapshot, object and delta counts, the bytes the snapshots would take as files,
+        the bytes of the distinct bodies, and the bytes stored (compressed bodies and
+        dictionaries).
+        """
+        with self._lock:
+            snapshots, raw = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(object.size), 0) FROM snapshot '
+                'JOIN object ON object.id = snapshot.object_id').fetchone()
+            objects, deltas, distinct, compressed = self._connection.execute(
+                'SELECT COUNT(*), COUNT(base_id), COALESCE(SUM(size), 0), '
+                'COALESCE(SUM(LENGTH(data)), 0) FROM object').fetchone()
+            dictionaries, dictionary_bytes = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM dictionary').fetchone()
+        stored = compressed + dictionary_bytes
+        return {
+            "snapshots": snapshots,
+            "objects": objects,
+            "deltas": deltas,
+            "dictionaries": dictionaries,
+            "raw_bytes": raw,
+            "distinct_bytes": distinct,
+            "stored_bytes": stored,
+            "ratio": raw / stored if stored else 0.0,
+        }
+
+    def vacuum(self):
+        """
+        Rewrites the file without free pages, e.g. after recompression.
+        """
+        with self._lock:
+            self._connection.execute('VACUUM')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps rendered HTML pages on disk, content-addressed by SHA-256 and indexed
+by URL, so crawls can tell whether a page changed since the last run and parsers can
+work offline from stored snapshots.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+
+def content_hash(text: str) -> str:
+    """
+    Returns the hex SHA-256 of a text, used as its address in the store.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class snapshot_store:
+    """
+    On-disk snapshot store.
+
+    Layout under `<working_directory>/<name>/`:
+        objects/<first two hex digits>/<sha256>.html   page bodies, written once
+        index.json                                     url -> latest digest, fingerprint,
+                                                       timestamps and digest history
+
+    A page's fingerprint decides whether it changed. By default it is the content
+    hash itself; pass a `fingerprint` function to `put` to ignore volatile markup such
+    as live arrival times.
+
+    A crawl that derives data from a page should `check` it first and `put` it only
+    once that data is stored: a page recorded before a failed write would look
+    unchanged on the retry, and its data would never be written.
+    """
+
+    def __init__(self, working_directory: str = 'data', name: str = 'snapshots',
+                 flush_every: int = 50):
+        """
+        Opens (or creates) the store.
+
+        Args:
+            working_directory (str): Directory that holds the store.
+            name (str): Name of the store directory.
+            flush_every (int): Number of `put` calls between index writes. Page bodies
+                are always written immediately; call `flush` at the end of a crawl.
+        """
+        self.root = os.path.join(working_directory, name)
+        self.index_file = os.path.join(self.root, 'index.json')
+        self.flush_every = flush_every
+        self._pending = 0
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+
+        self.index = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, encoding="utf-8") as file:
+                self.index = json.load(file)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f'{digest}.html')
+
+    def flush(self):
+        """
+        Atomically writes the index to disk.
+        """
+        temporary = f'{self.index_file}.tmp'
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(self.index, file, ensure_ascii=False, indent=1)
+        os.replace(temporary, self.index_file)
+        self._pending = 0
+
+    def _touch_index(self):
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def check(self, url: str, content: str, fingerprint=None) -> str:
+        """
+        Compares a freshly fetched page with the last snapshot without recording it;
+        only the checked_at time of an unchanged page is updated.
+
+        Args:
+            url (str): Key of the page, usually its URL.
+            content (str): Rendered HTML.
+            fingerprint (callable): Maps content to the string whose hash decides whether
+                the page changed. Defaults to the content itself.
+
+        Returns:
+            str: The page's fingerprint hash if it is new or changed, to be passed to
+                `put` once the page is processed; None if it matches the last snapshot.
+        """
+        marker = content_hash(fingerprint(content) if fingerprint else content)
+
+        entry = self.index.get(url)
+        if entry is not None and entry["fingerprint"] == marker:
+            entry["checked_at"] = datetime.now().isoformat(timespec='seconds')
+            self._touch_index()
+            return None
+        return marker
+
+    def put(self, url: str, content: str, fingerprint=None, marker: str = None) -> bool:
+        """
+        Records a freshly fetched page.
+
+        Args:
+            url (str): Key of the page, usually its URL.
+            content (str): Rendered HTML.
+            fingerprint (callable): Maps content to the string whose hash decides whether
+                the page changed. Defaults to the content itself.
+            marker (str): The fingerprint hash returned by `check` for this content,
+                which is then recorded without comparing again.
+
+        Returns:
+            bool: True if the page is new or changed, False if it matches the last snapshot.
+        """
+        marker = marker or self.check(url, content, fingerprint)
+        if marker is None:
+            return False
+
+        now = datetime.now().isoformat(timespec='seconds')
+        entry = self.index.get(url)
+        # Hashing a whole rendered page costs more than its fingerprint, so only a
+        # changed page is hashed, and without a fingerprint the marker is that hash
+        digest = marker if fingerprint is None else content_hash(content)
+
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(content)
+
+        history = entry["history"] if entry is not None else []
+        history.append([now, digest])
+        self.index[url] = {
+            "digest": digest,
+            "fingerprint": marker,
+            "stored_at": now,
+            "checked_at": now,
+            "history": history,
+        }
+        self._touch_index()
+        return True
+
+    def get(self, digest: str) -> str:
+        """
+        Returns the page stored under a digest.
+
+        Raises:
+            KeyError: If no such object exists.
+        """
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            raise KeyError(digest)
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+
+    def latest(self, url: str) -> str:
+        """
+        Returns the most recent snapshot of a URL, or None if it was never stored.
+        """
+        entry = self.index.get(url)
+        return self.get(entry["digest"]) if entry is not None else None
+
+    def urls(self) -> list:
+        """
+        Returns every URL that has at least one snapshot.
+        """
+        return list(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
@@ -1,271 +1,21 @@
 # -*- coding: utf-8 -*-
 """
-This module retrieves bus stop data for a specific route and direction from the Taipei eBus website,
-saves the rendered HTML and CSV file, and stores the parsed data in a SQLite database.
+Homework 1: lists the stop IDs of a route's outbound direction, using the
+eBus classes from the cycu11022119 package (20250506/src).
 """
 
-import re
-import pandas as pd
-from playwright.sync_api import sync_playwright
-from sqlalchemy import create_engine, Column, String, Float, Integer, Boolean
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-
-
-class taipei_route_list:
-    """
-    Manages fetching, parsing, and storing route data for Taipei eBus.
-    """
-
-    def __init__(self, working_directory: str = 'data'):
-        """
-        Initializes the taipei_route_list, fetches webpage content,
-        configures the ORM, and sets up the SQLite database.
-
-        Args:
-            working_directory (str): Directory to store the HTML and database files.
-        """
-        self.working_directory = working_directory
-
-        #check if the working directory exists , if not create it
-        import os
-        if not os.path.exists(self.working_directory):
-            os.makedirs(self.working_directory)
-
-        self.url = 'https://ebus.gov.taipei/ebus?ct=all'
-        self.content = None
-
-        # Fetch webpage content
-        self._fetch_content()
-
-        # Setup ORM base and table
-        Base = declarative_base()
-
-        class bus_route_orm(Base):
-            __tablename__ = 'data_route_list'
-
-            route_id = Column(String, primary_key=True)
-            route_name = Column(String)
-            route_data_updated = Column(Integer, default=0)
-
-        self.orm = bus_route_orm
-
-        # Create and connect to the SQLite engine
-        self.engine = create_engine(f'sqlite:///{self.working_directory}/hermes_ebus_taipei.sqlite3')
-        self.engine.connect()
-        Base.metadata.create_all(self.engine)
-
-        # Create session
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
-
-    def _fetch_content(self):
-        """
-        Fetches the webpage content using Playwright and saves it as a local HTML file.
-        """
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(self.url)
-            page.wait_for_timeout(3000)  # Wait for the page to load
-            self.content = page.content()
-            browser.close()
-
-        # Save the rendered HTML to a file for inspection
-        html_file_path = f'{self.working_directory}/hermes_ebus_taipei_route_list.html'
-        with open(html_file_path, "w", encoding="utf-8") as file:
-            file.write(self.content)
-
-    def parse_route_list(self) -> pd.DataFrame:
-        """
-        Parses bus route data from the fetched HTML content.
-
-        Returns:
-            pd.DataFrame: DataFrame containing bus route IDs and names.
-
-        Raises:
-            ValueError: If no route data is found.
-        """
-        pattern = r'<li><a href="javascript:go\(\'(.*?)\'\)">(.*?)</a></li>'
-        matches = re.findall(pattern, self.content, re.DOTALL)
-
-        if not matches:
-            raise ValueError("No data found for route table")
-
-        bus_routes = [(route_id, route_name.strip()) for route_id, route_name in matches]
-        self.dataframe = pd.DataFrame(bus_routes, columns=["route_id", "route_name"])
-        return self.dataframe
-
-    def save_to_database(self):
-        """
-        Saves the parsed bus route data to the SQLite database via SQLAlchemy ORM.
-        """
-        for _, row in self.dataframe.iterrows():
-            self.session.merge(self.orm(route_id=row['route_id'], route_name=row['route_name']))
-
-        self.session.commit()
-
-    def read_from_database(self) -> pd.DataFrame:
-        """
-        Reads bus route data from the SQLite database.
-
-        Returns:
-            pd.DataFrame: DataFrame containing bus route data.
-        """
-        query = self.session.query(self.orm)
-        self.db_dataframe = pd.read_sql(query.statement, self.session.bind)
-        return self.db_dataframe
-
-    def set_route_data_updated(self, route_id: str, route_data_updated: int = 1):
-        """
-        Sets the route_data_updated flag in the database.
-
-        Args:
-            route_id (str): The ID of the bus route.
-            route_data_updated (bool): The value to set for the route_data_updated flag.
-        """
-        self.session.query(self.orm).filter_by(route_id=route_id).update({"route_data_updated": route_data_updated})
-        self.session.commit()
-
-
-    def set_route_data_unexcepted(self, route_id: str):
-        self.session.query(self.orm).filter_by(route_id=route_id).update({"route_data_updated": 2 })
-        self.session.commit()
-
-    def __del__(self):
-        """
-        Closes the session and engine when the object is deleted.
-        """
-        self.session.close()
-        self.engine.dispose()
-
-
-class taipei_route_info:
-    """
-    Manages fetching, parsing, and storing bus stop data for a specified route and direction.
-    """
-
-    def __init__(self, route_id: str, direction: str = 'go', working_directory: str = 'data'):
-        """
-        Initializes the taipei_route_info by setting parameters and fetching the webpage content.
-
-        Args:
-            route_id (str): The unique identifier of the bus route.
-            direction (str): The direction of the route; must be either 'go' or 'come'.
-        """
-        self.route_id = route_id
-        self.direction = direction
-        self.content = None
-        self.url = f'https://ebus.gov.taipei/Route/StopsOfRoute?routeid={route_id}'
-        self.working_directory = working_directory
-
-        if self.direction not in ['go', 'come']:
-            raise ValueError("Direction must be 'go' or 'come'")
-
-        self._fetch_content()
-
-    def _fetch_content(self):
-        """
-        Fetches the webpage content using Playwright and writes the rendered HTML to a local file.
-        """
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(self.url)
-
-            if self.direction == 'come':
-                page.click('a.stationlist-come-go-gray.stationlist-come')
-
-            page.wait_for_timeout(3000)  # Wait for page render
-            self.content = page.content()
-            browser.close()
-
-        # Save the rendered HTML to a file for inspection
-        self.html_file = f"{self.working_directory}/ebus_taipei_{self.route_id}.html"
-        
-        # with open(html_file, "w", encoding="utf-8") as file:
-        #     file.write(self.content)
-
-    def parse_route_info(self) -> pd.DataFrame:
-        """
-        Parses the fetched HTML content to extract bus stop data.
-
-        Returns:
-            pd.DataFrame: DataFrame containing bus stop information.
-
-        Raises:
-            ValueError: If no data is found for the route.
-        """
-        pattern = re.compile(
-            r'<li>.*?<span class="auto-list-stationlist-position.*?">(.*?)</span>\s*'
-            r'<span class="auto-list-stationlist-number">\s*(\d+)</span>\s*'
-            r'<span class="auto-list-stationlist-place">(.*?)</span>.*?'
-            r'<input[^>]+name="item\.UniStopId"[^>]+value="(\d+)"[^>]*>.*?'
-            r'<input[^>]+name="item\.Latitude"[^>]+value="([\d\.]+)"[^>]*>.*?'
-            r'<input[^>]+name="item\.Longitude"[^>]+value="([\d\.]+)"[^>]*>',
-            re.DOTALL
-        )
-
-        matches = pattern.findall(self.content)
-        if not matches:
-            raise ValueError(f"No data found for route ID {self.route_id}")
-
-        bus_routes = [m for m in matches]
-        self.dataframe = pd.DataFrame(
-            bus_routes,
-            columns=["arrival_info", "stop_number", "stop_name", "stop_id", "latitude", "longitude"]
-        )
-
-        self.dataframe["direction"] = self.direction
-        self.dataframe["route_id"] = self.route_id
-
-        return self.dataframe
-
-    def save_to_database(self):
-        """
-        Saves the parsed bus stop data to the SQLite database.
-        """
-        db_file = f"{self.working_directory}/hermes_ebus_taipei.sqlite3"
-        engine = create_engine(f"sqlite:///{db_file}")
-        Base = declarative_base()
-
-        class bus_stop_orm(Base):
-            __tablename__ = "data_route_info_busstop"
-            stop_id = Column(Integer)
-            arrival_info = Column(String)
-            stop_number = Column(Integer, primary_key=True)
-            stop_name = Column(String)
-            latitude = Column(Float)
-            longitude = Column(Float)
-            direction = Column(String, primary_key=True)
-            route_id = Column(String, primary_key=True)
-
-        Base.metadata.create_all(engine)
-        Session = sessionmaker(bind=engine)
-        session = Session()
-
-        for _, row in self.dataframe.iterrows():
-            session.merge(bus_stop_orm(
-                stop_id=row["stop_id"],
-                arrival_info=row["arrival_info"],
-                stop_number=row["stop_number"],
-                stop_name=row["stop_name"],
-                latitude=row["latitude"],
-                longitude=row["longitude"],
-                direction=row["direction"],
-                route_id=row["route_id"]
-            ))
-
-        session.commit()
-        session.close()
+import os
 
+from cycu11022119.ebus_taipei import taipei_route_info
 
 
 # homework 1 
-def get_bus_info_go(bus_id):
+def get_bus_info_go(bus_id, working_directory: str = 'data'):
     
+    #check if the working directory exists , if not create it
+    os.makedirs(working_directory, exist_ok=True)
 
-    route_info = taipei_route_info(bus_id, direction="go")
+    route_info = taipei_route_info(bus_id, direction="go", working_directory=working_directory)
     route_info.parse_route_info()
     route_info.save_to_database()
 
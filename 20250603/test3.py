@@ -3,11 +3,21 @@ from bs4 import BeautifulSoup
 import re
 import csv
 import os
+import io
+import gzip
+import json
+import argparse
 
-# 目標 URL
-base_url = "https://ebus.gov.taipei/ebus"
-route_detail_url = "https://ebus.gov.taipei/Route/StopsOfRoute?routeid={route_id}"
+from cycu11022119.endpoints import EBUS_BASE_URL
+from cycu11022119.route_parser import parse_stops
+
+# 目標 URL（EBUS_BASE_URL 可用環境變數改指向本地 replay server，見 cycu11022119.endpoints）
+base_url = f"{EBUS_BASE_URL}/ebus"
+route_detail_url = EBUS_BASE_URL + "/Route/StopsOfRoute?routeid={route_id}"
 output_csv_file = "20250603/taipei_bus_routes_with_stops.csv"  # 定義輸出 CSV 檔案的名稱
+fieldnames = ['路線名稱', '路線ID', '方向', '站名', '站序', '站ID', '緯度', '經度']
+# 壓縮格式 -> 副檔名；zstd 需要另外安裝 zstandard 套件
+compression_suffixes = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
 
 # 確保輸出目錄存在
 os.makedirs(os.path.dirname(output_csv_file), exist_ok=True)
@@ -36,58 +46,163 @@ def fetch_all_routes():
 def fetch_route_stops(route_id):
     """
     獲取指定公車路線的車站資訊（去程與回程）。
+
+    StopsOfRoute 回傳的是伺服器端產生的 HTML 而不是 JSON：兩個方向的站點列表都在頁面中，
+    由 cycu11022119.route_parser 切出各方向後解析。單向或環狀路線沒有回程。
+
+    Raises:
+        ValueError: 頁面上找不到任何站點。
     """
     print(f"正在獲取路線 ID {route_id} 的詳細車站資訊...")
     response = requests.get(route_detail_url.format(route_id=route_id))
     response.raise_for_status()
-    data = response.json()
+    response.encoding = 'utf-8'
 
     stops = []
-    for direction in ['GoBack', 'Back']:
-        direction_name = "去程" if direction == 'GoBack' else "回程"
-        for stop in data.get(direction, []):
+    for direction, direction_name in (('go', '去程'), ('come', '回程')):
+        for _, stop_number, stop_name, stop_id, latitude, longitude in parse_stops(response.text, direction):
             stops.append({
                 '方向': direction_name,
-                '站名': stop.get('StopName', {}).get('Zh_tw', '未知'),
-                '站序': stop.get('StopSequence', '未知'),
-                '站ID': stop.get('StopID', '未知'),
-                '緯度': stop.get('StopPosition', {}).get('PositionLat', '未知'),
-                '經度': stop.get('StopPosition', {}).get('PositionLon', '未知')
+                '站名': stop_name,
+                '站序': stop_number,
+                '站ID': stop_id,
+                '緯度': latitude,
+                '經度': longitude
             })
+    if not stops:
+        raise ValueError("頁面上找不到站點")
     return stops
 
-def main():
+class route_csv_writer:
+    """
+    逐路線把站點寫入 CSV，每寫完一條路線就 flush 到磁碟並記進 manifest，
+    記憶體只保留一條路線的資料，中途出錯也不會丟失已寫入的路線。
+
+    每條路線寫成一個獨立區塊（壓縮時是一個 gzip member 或 zstd frame，串接後仍是
+    合法的 .gz/.zst 檔）。manifest（輸出檔名加上 .manifest.jsonl）每行記錄一條
+    已完成的路線與寫完後的檔案長度；重新執行時會略過這些路線，並把輸出檔截斷到
+    最後記錄的長度，丟掉中斷時只寫了一半的路線。
+    """
+
+    def __init__(self, path, compression=None, fresh=False):
+        """
+        Args:
+            path (str): 輸出 CSV 檔案路徑（不含壓縮副檔名）。
+            compression (str): None、'gzip' 或 'zstd'。
+            fresh (bool): 忽略既有的 manifest，從頭寫起。
+        """
+        if compression not in compression_suffixes:
+            raise ValueError(f"不支援的壓縮格式: {compression}")
+        self.compression = compression
+        self.path = path + compression_suffixes[compression]
+        self.manifest_path = self.path + '.manifest.jsonl'
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError as e:
+                raise ImportError("zstd 輸出需要 zstandard 套件：pip install zstandard") from e
+            self._zstd = zstandard.ZstdCompressor()
+
+        self.done = {} if fresh else self._read_manifest()
+        offset = max((entry['offset'] for entry in self.done.values()), default=0)
+        if offset and (not os.path.exists(self.path) or os.path.getsize(self.path) < offset):
+            offset = 0  # 輸出檔不見了或比記錄的短，manifest 不可信
+        if offset == 0:
+            self.done = {}
+        self._file = open(self.path, 'r+b' if offset else 'wb')
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self._manifest = open(self.manifest_path, 'a' if offset else 'w', encoding='utf-8')
+        if offset == 0:
+            # BOM 只寫在檔案開頭，讓 Excel 正確辨識 UTF-8
+            self._write_block('\ufeff' + ','.join(fieldnames) + '\r\n')
+
+    def _read_manifest(self):
+        done = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as manifest:
+                for line in manifest:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # 寫到一半中斷的最後一行
+                    done[entry['route_id']] = entry
+        return done
+
+    def _write_block(self, text):
+        data = text.encode('utf-8')
+        if self.compression == 'gzip':
+            data = gzip.compress(data)
+        elif self.compression == 'zstd':
+            data = self._zstd.compress(data)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def write_route(self, route_name, route_id, stops):
+        """
+        寫入一條路線的所有站點並記進 manifest。
+
+        Returns:
+            int: 寫入的列數。
+        """
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        writer.writerows({'路線名稱': route_name, '路線ID': route_id, **stop} for stop in stops)
+        offset = self._write_block(buffer.getvalue())
+
+        entry = {'route_id': route_id, 'route_name': route_name, 'rows': len(stops), 'offset': offset}
+        self._manifest.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._manifest.flush()
+        self.done[route_id] = entry
+        return len(stops)
+
+    def close(self):
+        self._file.close()
+        self._manifest.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抓取所有公車路線的站點並寫入 CSV")
+    parser.add_argument('--output', default=output_csv_file, help="輸出 CSV 檔案路徑")
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help="壓縮輸出檔")
+    parser.add_argument('--fresh', action='store_true', help="忽略 manifest，重新抓取所有路線")
+    args = parser.parse_args(argv)
+
     try:
         # 獲取所有公車路線
         routes = fetch_all_routes()
 
-        # 收集所有路線的詳細資訊
-        all_data = []
-        for route in routes:
-            route_name = route['路線名稱']
-            route_id = route['路線ID']
-            stops = fetch_route_stops(route_id)
-            for stop in stops:
-                all_data.append({
-                    '路線名稱': route_name,
-                    '路線ID': route_id,
-                    '方向': stop['方向'],
-                    '站名': stop['站名'],
-                    '站序': stop['站序'],
-                    '站ID': stop['站ID'],
-                    '緯度': stop['緯度'],
-                    '經度': stop['經度']
-                })
-
-        # 將資料寫入 CSV
-        print(f"\n正在將資料寫入 {output_csv_file}...")
-        with open(output_csv_file, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            fieldnames = ['路線名稱', '路線ID', '方向', '站名', '站序', '站ID', '緯度', '經度']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(all_data)
-
-        print(f"資料已成功寫入 {output_csv_file} 檔案。")
+        with route_csv_writer(args.output, args.compress, args.fresh) as writer:
+            print(f"\n正在將資料寫入 {writer.path}...")
+            skipped = sum(1 for route in routes if route['路線ID'] in writer.done)
+            if skipped:
+                print(f"略過 manifest 中已寫入的 {skipped} 條路線")
+
+            rows, failed = 0, []
+            for route in routes:
+                route_name = route['路線名稱']
+                route_id = route['路線ID']
+                if route_id in writer.done:
+                    continue
+                try:
+                    stops = fetch_route_stops(route_id)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    # 這條路線不記進 manifest，下次執行會重抓
+                    print(f"獲取路線 ID {route_id} 時發生錯誤: {e}")
+                    failed.append(route_id)
+                    continue
+                rows += writer.write_route(route_name, route_id, stops)
+
+        print(f"資料已成功寫入 {writer.path} 檔案（本次 {rows} 筆站點）。")
+        if failed:
+            print(f"{len(failed)} 條路線失敗，重新執行即可補抓: {', '.join(failed)}")
 
     except requests.exceptions.RequestException as e:
         print(f"獲取資料時發生錯誤: {e}")